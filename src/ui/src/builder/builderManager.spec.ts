@@ -89,4 +89,56 @@ describe(generateBuilderManager.name, () => {
 			expect(isComponentIdSelected("2")).toBeFalsy();
 		});
 	});
+
+	describe("log entries", () => {
+		it("should merge the blocks of delta blueprint execution logs", async () => {
+			const { handleLogEntry, getLogEntries } = generateBuilderManager();
+			const block = (componentId: string, outcome?: string) => ({
+				componentId,
+				outcome,
+				executionTimeInSeconds: -1,
+				result: null,
+				returnValue: null,
+				executionEnvironment: {},
+			});
+
+			await handleLogEntry({
+				type: "info",
+				title: "Blueprint execution",
+				message: "Executing...",
+				id: "run",
+				blueprintExecution: {
+					summary: [{ componentId: "a" }, { componentId: "b" }],
+				} as never,
+			});
+			await handleLogEntry({
+				type: "info",
+				title: "Blueprint execution",
+				message: "Executing...",
+				id: "run",
+				blueprintExecution: {
+					summary: [block("b", "in_progress")],
+					isDelta: true,
+				},
+			});
+			await handleLogEntry({
+				type: "info",
+				title: "Blueprint execution",
+				message: "Execution completed.",
+				id: "run",
+				blueprintExecution: {
+					summary: [block("b", "success"), block("a", "success")],
+					isDelta: true,
+				},
+			});
+
+			expect(getLogEntries()).toHaveLength(1);
+			expect(getLogEntries()[0].message).toBe("Execution completed.");
+			expect(
+				getLogEntries()[0].blueprintExecution.summary.map(
+					(item) => `${item.componentId}:${item.outcome}`,
+				),
+			).toStrictEqual(["b:success", "a:success"]);
+		});
+	});
 });
@@ -33,6 +33,8 @@ export type BlueprintExecutionLog = {
 		// eslint-disable-next-line @typescript-eslint/no-explicit-any
 		executionEnvironment: Record<string, any>;
 	}[];
+	// The summary only holds the blocks changed since the previous entry
+	isDelta?: boolean;
 };
 
 type ComponentMutationTransaction = {
@@ -339,15 +341,41 @@ export function generateBuilderManager() {
 		return hashStr;
 	}
 
+	function mergeBlueprintExecution(
+		previous: BlueprintExecutionLog | undefined,
+		delta: BlueprintExecutionLog,
+	): BlueprintExecutionLog {
+		const summary = [...(previous?.summary ?? [])];
+		for (const item of delta.summary) {
+			const index = summary.findIndex(
+				(i) => i.componentId === item.componentId,
+			);
+			if (index !== -1 && summary[index].outcome !== undefined) {
+				summary[index] = item;
+				continue;
+			}
+			// Blocks are listed in the order they're scheduled, after the ones pending
+			if (index !== -1) summary.splice(index, 1);
+			summary.push(item);
+		}
+		return { summary };
+	}
+
 	const handleLogEntry = async (logEntryContents: LogEntryContents) => {
-		const { type, title, message, code, blueprintExecution, id } =
-			logEntryContents;
+		const { type, title, message, code, id } = logEntryContents;
+		let { blueprintExecution } = logEntryContents;
 		const fingerprint = await hashLogEntryContents(logEntryContents);
 
 		if (id) {
 			const index = state.value.logEntries.findIndex(
 				(entry) => entry.id === id,
 			);
+			if (blueprintExecution?.isDelta) {
+				blueprintExecution = mergeBlueprintExecution(
+					state.value.logEntries[index]?.blueprintExecution,
+					blueprintExecution,
+				);
+			}
 			if (index !== -1) {
 				state.value.logEntries.splice(index, 1);
 			}
@@ -32,6 +32,7 @@ import {
 
 const RECONNECT_DELAY_MS = 1000;
 const KEEP_ALIVE_DELAY_MS = 60000;
+const BINARY_FRAME_REFERENCE_PREFIX = "wf-binary:";
 
 export function generateCore() {
 	let sessionId: string = null;
@@ -56,6 +57,8 @@ export function generateCore() {
 	const userFunctions: Ref<UserFunction[]> = ref([]);
 	const userState: Ref<Record<string, any>> = ref({});
 	let webSocket: WebSocket;
+	// Binary payloads received ahead of the messages referencing them
+	const binaryFrames: Map<number, Blob> = new Map();
 	const syncHealth: Ref<"idle" | "connected" | "offline" | "suspended"> =
 		ref("idle");
 	let frontendMessageCounter = 0;
@@ -152,6 +155,84 @@ export function generateCore() {
 		}, KEEP_ALIVE_DELAY_MS);
 	}
 
+	/**
+	 * Applies a patch sent for a state value, as generated by the backend's
+	 * _diff_serialised_values. Paths are relative to the patched value.
+	 */
+	function applyPatch(
+		parentRef: Record<string, any>,
+		key: string,
+		patch: Record<string, any>[],
+	) {
+		patch.forEach((operation) => {
+			let containerRef = parentRef;
+			let targetKey: string | number = key;
+			operation.path.forEach((pathElement: string | number) => {
+				containerRef = containerRef[targetKey];
+				targetKey = pathElement;
+			});
+
+			if (operation.op == "set") {
+				containerRef[targetKey] = operation.value;
+			} else if (operation.op == "delete") {
+				delete containerRef[targetKey];
+			} else if (operation.op == "append") {
+				containerRef[targetKey] += operation.value;
+			} else if (operation.op == "splice") {
+				containerRef[targetKey].splice(
+					operation.start,
+					operation.deleteCount,
+					...operation.values,
+				);
+			}
+		});
+	}
+
+	function ingestBinaryFrame(buffer: ArrayBuffer) {
+		const view = new DataView(buffer);
+		const frameId = view.getUint32(0);
+		const mimeTypeLength = view.getUint16(4);
+		const mimeType = new TextDecoder().decode(
+			new Uint8Array(buffer, 6, mimeTypeLength),
+		);
+		const data = new Uint8Array(buffer, 6 + mimeTypeLength);
+		binaryFrames.set(frameId, new Blob([data], { type: mimeType }));
+	}
+
+	/**
+	 * Replaces the references to binary frames by object URLs of their data.
+	 */
+	function resolveBinaryFrames(value: any): any {
+		if (typeof value === "string") {
+			if (!value.startsWith(BINARY_FRAME_REFERENCE_PREFIX)) return value;
+			const frameId = Number(
+				value.substring(BINARY_FRAME_REFERENCE_PREFIX.length),
+			);
+			const blob = binaryFrames.get(frameId);
+			if (!blob) return value;
+			binaryFrames.delete(frameId);
+			return URL.createObjectURL(blob);
+		}
+		if (Array.isArray(value)) return value.map(resolveBinaryFrames);
+		if (typeof value === "object" && value !== null) {
+			return Object.fromEntries(
+				Object.entries(value).map(([k, v]) => [
+					k,
+					resolveBinaryFrames(v),
+				]),
+			);
+		}
+		return value;
+	}
+
+	function revokeObjectUrl(value: any) {
+		if (typeof value === "string" && value.startsWith("blob:")) {
+			URL.revokeObjectURL(value);
+		} else if (typeof value === "object" && value !== null) {
+			Object.values(value).forEach(revokeObjectUrl);
+		}
+	}
+
 	function ingestMutations(mutations: Record<string, any>) {
 		if (!mutations) return;
 		Object.entries(mutations).forEach(([key, value]) => {
@@ -181,17 +262,38 @@ export function generateCore() {
 
 			if (isDeletion) {
 				// If it's a deletion operation, delete the property.
+				revokeObjectUrl(stateRef[accessor.at(-1)]);
 				delete stateRef[accessor.at(-1)];
+			} else if (mutationFlag === "~") {
+				// A patch of the value previously sent
+				applyPatch(stateRef, accessor.at(-1), value);
 			} else {
 				// Otherwise, set the value as usual.
+				revokeObjectUrl(stateRef[accessor.at(-1)]);
 				stateRef[accessor.at(-1)] = value;
 			}
 		});
 	}
 
-	function ingestComponents(newComponents: Record<string, any>) {
+	/**
+	 * Ingests the components sent by the backend. When the IDs of removed
+	 * components are given, only the changed components have been sent.
+	 */
+	function ingestComponents(
+		newComponents: Record<string, any>,
+		removedComponentIds?: string[],
+	) {
 		if (!newComponents) return;
-		components.value = newComponents;
+		if (!removedComponentIds) {
+			components.value = newComponents;
+			return;
+		}
+		removedComponentIds.forEach((componentId) => {
+			delete components.value[componentId];
+		});
+		Object.entries(newComponents).forEach(([componentId, component]) => {
+			components.value[componentId] = component;
+		});
 	}
 
 	function clearFrontendMap() {
@@ -212,6 +314,7 @@ export function generateCore() {
 		url.protocol = url.protocol.replace("https", "wss");
 		url.protocol = url.protocol.replace("http", "ws");
 		webSocket = new WebSocket(url.href);
+		webSocket.binaryType = "arraybuffer";
 
 		webSocket.onopen = () => {
 			clearFrontendMap();
@@ -221,7 +324,15 @@ export function generateCore() {
 		};
 
 		webSocket.onmessage = (wsEvent) => {
-			const message = JSON.parse(wsEvent.data);
+			if (wsEvent.data instanceof ArrayBuffer) {
+				ingestBinaryFrame(wsEvent.data);
+				return;
+			}
+
+			let message = JSON.parse(wsEvent.data);
+			if (binaryFrames.size > 0) {
+				message = resolveBinaryFrames(message);
+			}
 
 			if (
 				message.messageType == "announcement" &&
@@ -268,13 +379,26 @@ export function generateCore() {
 				return;
 			}
 
+			if (
+				message.messageType == "announcement" &&
+				message.payload.type == "stateMutations"
+			) {
+				// Pushed by the backend while events run
+				ingestMutations(message.payload.payload?.mutations);
+				collateMail(message.payload.payload?.mail);
+				return;
+			}
+
 			if (
 				message.messageType == "eventResponse" ||
 				message.messageType == "stateEnquiryResponse"
 			) {
 				ingestMutations(message.payload?.mutations);
 				collateMail(message.payload?.mail);
-				ingestComponents(message.payload?.components);
+				ingestComponents(
+					message.payload?.components,
+					message.payload?.removedComponentIds,
+				);
 			}
 
 			const mapItem = frontendMessageMap.value.get(message.trackingId);
@@ -435,6 +559,41 @@ export function generateCore() {
 		});
 	}
 
+	/**
+	 * Requests a window of the rows of a dataframe kept in the backend,
+	 * sorted and searched by the backend.
+	 *
+	 * @param id Id of the windowed dataframe
+	 * @returns The number of rows matching the search, and the rows as an Arrow file URL
+	 */
+	async function queryDataframe(
+		id: string,
+		offset: number,
+		limit: number,
+		sort: { columnName: string; descending: boolean } | null,
+		search: string | null,
+	): Promise<{ rowCount: number; offset: number; data: string }> {
+		return new Promise((resolve, reject) => {
+			const messageCallback = (r: {
+				ok: boolean;
+				payload?: Record<string, any>;
+			}) => {
+				if (!r.ok || !r.payload) {
+					return reject("Couldn't query the dataframe.");
+				}
+				resolve(
+					r.payload as { rowCount: number; offset: number; data: string },
+				);
+			};
+
+			sendFrontendMessage(
+				"dataframeQuery",
+				{ id, offset, limit, sort, search },
+				messageCallback,
+			);
+		});
+	}
+
 	function updateSourceFile(content: string, path: string[]) {
 		const tree = structuredClone(toRaw(sourceFiles.value));
 		const node = findSourceFileFromPath(path, tree);
@@ -603,31 +762,6 @@ export function generateCore() {
 		});
 	}
 
-	async function sendStateEnquiry(callback: Function) {
-		sendFrontendMessage("stateEnquiry", {}, callback, true);
-	}
-
-	function setupMessageFollowUp(trackingId: number) {
-		const INITIAL_FOLLOWUP_MS = 150;
-		const SUBSEQUENT_FOLLOWUPS_MS = 150;
-
-		const checkIfStateEnquiryRequired = (iteration = 0) => {
-			const pending = frontendMessageMap.value.get(trackingId);
-			if (pending === undefined) return;
-			if (iteration == 0 && pending.type == "stateEnquiry") {
-				return;
-			}
-
-			sendStateEnquiry(() =>
-				setTimeout(
-					() => checkIfStateEnquiryRequired(iteration + 1),
-					SUBSEQUENT_FOLLOWUPS_MS,
-				),
-			);
-		};
-		setTimeout(() => checkIfStateEnquiryRequired(0), INITIAL_FOLLOWUP_MS);
-	}
-
 	async function sendFrontendMessage(
 		type: string,
 		payload: object | (() => Promise<object>),
@@ -647,9 +781,6 @@ export function generateCore() {
 					callback,
 				});
 			}
-			if (track) {
-				setupMessageFollowUp(trackingId);
-			}
 
 			let awaitedPayload: object;
 			if (typeof payload == "function") {
@@ -834,6 +965,7 @@ export function generateCore() {
 		init,
 		forwardEvent,
 		hashMessage,
+		queryDataframe,
 		runCode: readonly(runCode),
 		sourceFiles: readonly(sourceFiles),
 		sendCodeSaveRequest,
@@ -21,7 +21,7 @@ from writer.core import (
 from writer.core import (
     writerproperty as property,
 )
-from writer.core_df import EditableDataFrame
+from writer.core_df import EditableDataFrame, WindowedDataFrame
 
 try:
     from writer.ui import WriterUIManager
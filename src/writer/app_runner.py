@@ -1,19 +1,25 @@
 import asyncio
 import concurrent.futures
+import contextlib
 import importlib.util
 import logging
 import logging.handlers
 import multiprocessing
 import multiprocessing.connection
+import multiprocessing.context
+import multiprocessing.resource_tracker
+import multiprocessing.shared_memory
 import multiprocessing.synchronize
 import os
+import pickle
 import shutil
 import signal
 import subprocess
 import sys
 import threading
+import zlib
 from types import ModuleType
-from typing import Any, Callable, Dict, List, Optional, Union, cast
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union, cast
 
 import watchdog.events
 from pydantic import ValidationError
@@ -24,19 +30,28 @@ from writer.core import (
     Config,
     EventHandlerRegistry,
     MiddlewareRegistry,
+    SessionManager,
     WriterSession,
+    state_serialiser,
+    use_binary_payloads,
     use_request_context,
 )
 from writer.core_ui import ingest_bmc_component_tree
+from writer.evaluator import Evaluator
 from writer.logs import capture_logs
 from writer.ss_types import (
     AppProcessServerRequest,
     AppProcessServerRequestPacket,
     AppProcessServerResponse,
     AppProcessServerResponsePacket,
+    CancelRequest,
+    CancelRequestPayload,
     ComponentDefinition,
     ComponentUpdateRequest,
     ComponentUpdateRequestPayload,
+    DataframeQueryRequest,
+    DataframeQueryRequestPayload,
+    DataframeQueryResponsePayload,
     EventRequest,
     EventResponsePayload,
     HashRequest,
@@ -90,12 +105,210 @@ class SessionPruner(threading.Thread):
             writer.session_manager.prune_sessions()
 
 
+class MutationPusher(threading.Thread):
+    """
+    Pushes the state mutations of the sessions running events to the main process,
+    coalesced over short intervals, so the frontend doesn't need to poll for them.
+    """
+
+    def __init__(self, app_process: "AppProcess", is_mutation_pusher_terminated: threading.Event):
+        super().__init__(name="MutationPusherThread")
+        self.app_process = app_process
+        self.is_mutation_pusher_terminated = is_mutation_pusher_terminated
+        self.active_sessions: Dict[str, int] = {}
+        self.active_sessions_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def track(self, session_id: str):
+        """
+        Pushes the mutations of the session while the block runs.
+        """
+
+        with self.active_sessions_lock:
+            self.active_sessions[session_id] = self.active_sessions.get(session_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self.active_sessions_lock:
+                self.active_sessions[session_id] -= 1
+                if self.active_sessions[session_id] == 0:
+                    del self.active_sessions[session_id]
+
+    def run(self) -> None:
+        while True:
+            self.is_mutation_pusher_terminated.wait(timeout=AppProcess.MUTATION_PUSH_INTERVAL)
+            if self.is_mutation_pusher_terminated.is_set():
+                return
+            with self.active_sessions_lock:
+                session_ids = list(self.active_sessions)
+            for session_id in session_ids:
+                try:
+                    self.app_process._push_mutations(session_id)
+                except BaseException as e:
+                    self.app_process.logger.error(f"Couldn't push state mutations.\n{repr(e)}")
+
+
+class ExecutorLane(concurrent.futures.ThreadPoolExecutor):
+    """
+    Thread pool serving one kind of work in the AppProcess, with its own concurrency limit.
+    Keeps track of its queue depth, so starvation of a lane can be observed.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"AppProcess-{name}")
+        self.name = name
+        self.max_workers = max_workers
+        self.queued = 0
+        self.max_queued = 0
+        self.running = 0
+        self.completed = 0
+        self.metrics_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        with self.metrics_lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        try:
+            return super().submit(self._run_tracked, fn, *args, **kwargs)
+        except BaseException:
+            with self.metrics_lock:
+                self.queued -= 1
+            raise
+
+    def _run_tracked(self, fn, *args, **kwargs):
+        with self.metrics_lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self.metrics_lock:
+                self.running -= 1
+                self.completed += 1
+
+    def get_metrics(self) -> Dict[str, int]:
+        with self.metrics_lock:
+            return {
+                "maxWorkers": self.max_workers,
+                "queued": self.queued,
+                "maxQueued": self.max_queued,
+                "running": self.running,
+                "completed": self.completed,
+            }
+
+
+class SharedMemoryPacket:
+    """
+    Handle to a pickled packet stored in a shared memory block.
+
+    Large responses are written to shared memory by the AppProcess, and only this
+    handle goes through the pipe. The block is read and released by the receiver.
+    """
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+
+    @staticmethod
+    def write(data: bytes) -> "SharedMemoryPacket":
+        shm = multiprocessing.shared_memory.SharedMemory(create=True, size=len(data))
+        try:
+            assert shm.buf is not None
+            shm.buf[: len(data)] = data
+            # Ownership of the block is handed over to the receiver, which unlinks it
+            multiprocessing.resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore
+            return SharedMemoryPacket(shm.name, len(data))
+        finally:
+            shm.close()
+
+    def read(self) -> Any:
+        shm = multiprocessing.shared_memory.SharedMemory(name=self.name)
+        try:
+            assert shm.buf is not None
+            with shm.buf[: self.size] as data:
+                return pickle.loads(data)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def discard(self) -> None:
+        """
+        Releases the block without reading it, for packets which won't be received.
+        """
+
+        shm = multiprocessing.shared_memory.SharedMemory(name=self.name)
+        shm.close()
+        shm.unlink()
+
+
 class AppProcess(multiprocessing.Process):
     """
     Writer Framework runs the user's app code using an isolated process, based on this class.
     The main process is able to communicate with the user app process via app messages (e.g. event, componentUpdate).
     """
 
+    # Messages are handled in separate lanes, so long event handlers and blueprint runs
+    # can't starve the control messages the frontend relies on to check the session health
+    CONTROL_MESSAGE_TYPES = (
+        "checkSession",
+        "stateEnquiry",
+        "hashRequest",
+        "executorMetrics",
+        "cancel",
+    )
+    CONTROL_LANE_WORKERS = int(os.getenv("WRITER_CONTROL_LANE_WORKERS", "4"))
+    EVENT_LANE_WORKERS = int(
+        os.getenv("WRITER_EVENT_LANE_WORKERS", str((os.cpu_count() or 4) * 10))
+    )
+    BLUEPRINT_LANE_WORKERS = int(
+        os.getenv("WRITER_BLUEPRINT_LANE_WORKERS", str((os.cpu_count() or 4) * 10))
+    )
+
+    # Responses larger than this number of bytes are sent through shared memory, 0 disables it
+    SHARED_MEMORY_THRESHOLD = int(os.getenv("WRITER_SHARED_MEMORY_THRESHOLD", str(1024 * 1024)))
+
+    # Opt-in structural patches for state values, see StateProxy.get_mutations_as_dict
+    STATE_DIFFS = os.getenv("WRITER_STATE_DIFFS", "0") == "1"
+
+    # Opt-in binary websocket frames for binary data in mutations, rather than data URLs
+    BINARY_FRAMES = os.getenv("WRITER_BINARY_FRAMES", "0") == "1"
+
+    # Seconds over which state mutations of running events are coalesced before being pushed
+    MUTATION_PUSH_INTERVAL = float(os.getenv("WRITER_MUTATION_PUSH_INTERVAL", "0.1"))
+
+    # Start method of the AppProcess, the platform's default when unset.
+    # With "forkserver", the heavy dependencies are imported once by the fork server
+    # and every AppProcess is forked from it, sharing their pages copy-on-write.
+    START_METHOD = os.getenv("WRITER_APP_PROCESS_START_METHOD") or None
+    FORKSERVER_PRELOAD = [
+        "writer.core",
+        "writer.blueprints",
+        "pandas",
+        "pyarrow",
+        "plotly.graph_objects",
+        "writerai",
+    ]
+
+    @staticmethod
+    def get_context() -> multiprocessing.context.BaseContext:
+        """
+        Returns the multiprocessing context used to start AppProcesses.
+        Synchronisation primitives shared with an AppProcess must be created from it.
+        """
+
+        start_method = AppProcess.START_METHOD
+        if start_method is not None and start_method not in multiprocessing.get_all_start_methods():
+            raise ValueError(f'Start method "{start_method}" is not available on this platform.')
+        context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Only taken into account when the fork server starts, modules failing to import are skipped
+            context.set_forkserver_preload(AppProcess.FORKSERVER_PRELOAD)
+        return context
+
+    @staticmethod
+    def _Popen(process_obj):
+        return AppProcess.get_context().Process._Popen(process_obj)  # type: ignore
+
     def __init__(
         self,
         client_conn: multiprocessing.connection.Connection,
@@ -119,7 +332,13 @@ class AppProcess(multiprocessing.Process):
         self.logger = logging.getLogger("app")
         self.handler_registry = EventHandlerRegistry()
         self.middleware_registry = MiddlewareRegistry()
-        self.executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.executor_lanes: Dict[str, ExecutorLane] = {}
+        # Lane running blueprint block work, used by BlueprintRunner
+        self.executor: Optional[ExecutorLane] = None
+        self.mutation_pusher: Optional[MutationPusher] = None
+        # Cancellation signals of the messages being handled, by message id.
+        # Only accessed through single dict operations, which are atomic.
+        self.cancel_events: Dict[int, Tuple[str, threading.Event]] = {}
 
     def _load_module(self) -> ModuleType:
         """
@@ -205,7 +424,8 @@ class AppProcess(multiprocessing.Process):
         mutations = {}
 
         try:
-            mutations = session.session_state.user_state.get_mutations_as_dict()
+            with self._use_payload_serialisation(), session.mutations_lock:
+                mutations = session.session_state.user_state.get_mutations_as_dict()
         except BaseException:
             session.session_state.add_log_entry(
                 "error",
@@ -216,24 +436,42 @@ class AppProcess(multiprocessing.Process):
 
         mail = session.session_state.mail
 
-        ui_component_tree = core_ui.export_component_tree(
-            session.session_component_tree, mode=Config.mode, only_update=True
+        ui_component_tree = None
+        removed_component_ids = None
+        component_tree_changes = core_ui.export_component_tree_changes(
+            session.session_component_tree, mode=Config.mode
         )
+        if component_tree_changes is not None:
+            (ui_component_tree, removed_component_ids) = component_tree_changes
 
         res_payload = EventResponsePayload(
-            result=result, mutations=mutations, components=ui_component_tree, mail=mail
+            result=result,
+            mutations=mutations,
+            components=ui_component_tree,
+            removedComponentIds=removed_component_ids,
+            mail=mail,
         )
         session.session_state.clear_mail()
 
         return res_payload
 
+    def _use_payload_serialisation(self):
+        """
+        Context in which mutations sent over the websocket are serialised.
+        """
+
+        if AppProcess.BINARY_FRAMES:
+            return use_binary_payloads()
+        return contextlib.nullcontext()
+
     def _handle_state_enquiry(self, session: WriterSession) -> StateEnquiryResponsePayload:
         import traceback as tb
 
         mutations = {}
 
         try:
-            mutations = session.session_state.user_state.get_mutations_as_dict()
+            with self._use_payload_serialisation(), session.mutations_lock:
+                mutations = session.session_state.user_state.get_mutations_as_dict()
         except BaseException:
             session.session_state.add_log_entry(
                 "error",
@@ -250,6 +488,33 @@ class AppProcess(multiprocessing.Process):
 
         return res_payload
 
+    def _push_mutations(self, session_id: str) -> None:
+        """
+        Sends the pending mutations and mail of a session to the main process, unprompted.
+        Pushed packets have no message id.
+        """
+
+        import writer
+
+        session = writer.session_manager.get_session(session_id)
+        if session is None:
+            return
+        request = StateEnquiryRequest(type="stateEnquiry")
+        pusher = self.mutation_pusher
+        if pusher is None or pusher.is_mutation_pusher_terminated.is_set():
+            return
+        # The session's mutations are held until sent, so a push never overtakes
+        # a response carrying newer mutations. Other sessions aren't held up.
+        with use_request_context(session_id, request), session.mutations_lock:
+            payload = self._handle_state_enquiry(session)
+            if not payload.mutations and not payload.mail:
+                return
+            response = AppProcessServerResponse(status="ok", status_message=None, payload=payload)
+            with self.server_conn_lock:
+                if pusher.is_mutation_pusher_terminated.is_set():
+                    return  # Nothing is read after the terminating packet
+                self.server_conn.send((None, session_id, response))
+
     def _handle_state_content(self, session: WriterSession) -> StateContentResponsePayload:
         serialized_state = {}
         try:
@@ -266,6 +531,21 @@ class AppProcess(multiprocessing.Process):
 
         return StateContentResponsePayload(state=serialized_state)
 
+    def _handle_dataframe_query(
+        self, session: WriterSession, payload: DataframeQueryRequestPayload
+    ) -> DataframeQueryResponsePayload:
+        from writer.core_df import find_windowed_dataframe
+
+        windowed_df = find_windowed_dataframe(session.session_state.user_state, payload.id)
+        if windowed_df is None:
+            raise MessageHandlingException("Dataframe not found.")
+        (rows, row_count) = windowed_df.query(
+            payload.offset, payload.limit, payload.sort, payload.search
+        )
+        with self._use_payload_serialisation():
+            data = state_serialiser.serialise(rows)
+        return DataframeQueryResponsePayload(rowCount=row_count, offset=payload.offset, data=data)
+
     def _handle_hash_request(self, req_payload: HashRequestPayload) -> HashRequestResponsePayload:
         res_payload = HashRequestResponsePayload(message=crypto.get_hash(req_payload.message))
         return res_payload
@@ -277,6 +557,7 @@ class AppProcess(multiprocessing.Process):
 
         ingest_bmc_component_tree(writer.base_component_tree, payload.components)
         ingest_bmc_component_tree(session.session_component_tree, payload.components, True)
+        Evaluator.clear_template_cache()
 
     def _handle_list_resources(
         self, session: WriterSession, req: ListResourcesRequestPayload
@@ -357,14 +638,17 @@ class AppProcess(multiprocessing.Process):
         )
 
     def _handle_message(
-        self, session_id: str, request: AppProcessServerRequest
+        self,
+        session_id: str,
+        request: AppProcessServerRequest,
+        cancel_event: Optional[threading.Event] = None,
     ) -> AppProcessServerResponse:
         """
         Handles messages from the main process to the app's isolated process.
         """
         import writer
 
-        with use_request_context(session_id, request):
+        with use_request_context(session_id, request, cancel_event):
             session = None
             type = request.type
 
@@ -376,6 +660,29 @@ class AppProcess(multiprocessing.Process):
                     payload=self._handle_session_init(si_req_payload),
                 )
 
+            if session_id is None and type == "executorMetrics":
+                return AppProcessServerResponse(
+                    status="ok", status_message=None, payload=self._handle_executor_metrics()
+                )
+
+            if type == "cancel":
+                cancel_req_payload = CancelRequestPayload.model_validate(request.payload)
+                self._handle_cancel(session_id, cancel_req_payload)
+                return AppProcessServerResponse(status="ok", status_message=None, payload=None)
+
+            if session_id is None and self.mode == "edit":
+                # Process-wide messages, broadcast by AppRunner to every worker of the pool
+
+                if type == "componentUpdate":
+                    cu_req_payload = ComponentUpdateRequestPayload.model_validate(request.payload)
+                    ingest_bmc_component_tree(writer.base_component_tree, cu_req_payload.components)
+                    Evaluator.clear_template_cache()
+                    return AppProcessServerResponse(status="ok", status_message=None, payload=None)
+
+                if type == "writerVaultUpdate":
+                    vault.writer_vault.refresh()
+                    return AppProcessServerResponse(status="ok", status_message=None, payload=None)
+
             session = writer.session_manager.get_session(session_id)
             if not session:
                 raise MessageHandlingException("Session not found.")
@@ -386,10 +693,15 @@ class AppProcess(multiprocessing.Process):
 
             if type == "event":
                 ev_req_payload = WriterEvent.model_validate(request.payload)
+                if self.mutation_pusher is None:
+                    ev_res_payload = self._handle_event(session, ev_req_payload)
+                else:
+                    with self.mutation_pusher.track(session.session_id):
+                        ev_res_payload = self._handle_event(session, ev_req_payload)
                 return AppProcessServerResponse(
                     status="ok",
                     status_message=None,
-                    payload=self._handle_event(session, ev_req_payload),
+                    payload=ev_res_payload,
                 )
 
             if type == "stateEnquiry":
@@ -402,6 +714,14 @@ class AppProcess(multiprocessing.Process):
                     status="ok", status_message=None, payload=self._handle_state_content(session)
                 )
 
+            if type == "dataframeQuery":
+                df_query_payload = DataframeQueryRequestPayload.model_validate(request.payload)
+                return AppProcessServerResponse(
+                    status="ok",
+                    status_message=None,
+                    payload=self._handle_dataframe_query(session, df_query_payload),
+                )
+
             if type == "setUserinfo":
                 session.userinfo = request.payload
                 return AppProcessServerResponse(status="ok", status_message=None, payload=None)
@@ -433,6 +753,18 @@ class AppProcess(multiprocessing.Process):
 
             raise MessageHandlingException("Invalid event.")
 
+    def _handle_cancel(self, session_id: str, payload: CancelRequestPayload) -> None:
+        entry = self.cancel_events.get(payload.messageId)
+        if entry is None:
+            return
+        (target_session_id, cancel_event) = entry
+        if target_session_id != session_id:
+            return
+        cancel_event.set()
+
+    def _handle_executor_metrics(self) -> Dict[str, Dict[str, int]]:
+        return {name: lane.get_metrics() for name, lane in self.executor_lanes.items()}
+
     def _execute_user_code(self) -> None:
         """
         Executes the user code and captures standard output.
@@ -484,6 +816,8 @@ class AppProcess(multiprocessing.Process):
         elif self.mode == "run":
             writer.Config.is_mail_enabled_for_log = False
 
+        writer.Config.is_state_diff_enabled = AppProcess.STATE_DIFFS
+
     def _terminate_early(self) -> None:
         self.is_app_process_server_failed.set()
         self.is_app_process_server_ready.set()
@@ -544,35 +878,60 @@ class AppProcess(multiprocessing.Process):
         self, message_id: int, session_id: str, request: AppProcessServerRequest
     ) -> AppProcessServerResponsePacket:
         response = None
+        entry = self.cancel_events.get(message_id)
+        cancel_event = entry[1] if entry else None
         try:
-            response = self._handle_message(session_id, request)
+            if cancel_event and cancel_event.is_set():
+                # Abandoned while queued
+                raise MessageHandlingException("Request cancelled.")
+            response = self._handle_message(session_id, request, cancel_event)
         except (MessageHandlingException, ValidationError) as e:
             response = AppProcessServerResponse(
                 status="error", status_message=repr(e), payload=None
             )
+        finally:
+            self.cancel_events.pop(message_id, None)
 
         packet: AppProcessServerResponsePacket = (message_id, session_id, response)
         return packet
 
     def _send_packet(self, packet_future: concurrent.futures.Future) -> None:
         result = packet_future.result()
+        data = pickle.dumps(result)
+
+        # Named shared memory blocks don't outlive their creator on Windows
+        threshold = AppProcess.SHARED_MEMORY_THRESHOLD
+        if os.name != "nt" and 0 < threshold < len(data):
+            shm_packet = SharedMemoryPacket.write(data)
+            try:
+                with self.server_conn_lock:
+                    self.server_conn.send(shm_packet)
+            except BaseException:
+                shm_packet.discard()
+                raise
+            return
 
         with self.server_conn_lock:
-            self.server_conn.send(result)
+            self.server_conn.send_bytes(data)
 
     def _run_app_process_server(self) -> None:
         is_app_process_server_terminated = threading.Event()
         session_pruner = SessionPruner(is_app_process_server_terminated)
         session_pruner.start()
+        self.mutation_pusher = MutationPusher(self, is_app_process_server_terminated)
+        self.mutation_pusher.start()
 
         def terminate_server():
             if is_app_process_server_terminated.is_set():
                 return
-            self.executor.shutdown(wait=False)
+            for lane in self.executor_lanes.values():
+                lane.shutdown(wait=False)
             with self.server_conn_lock:
                 self.server_conn.send(None)
                 is_app_process_server_terminated.set()
                 session_pruner.join()
+            if self.mutation_pusher is not None:
+                self.mutation_pusher.join()
 
         def signal_handler(sig, frame):
             terminate_server()
@@ -587,8 +946,6 @@ class AppProcess(multiprocessing.Process):
         self.is_app_process_server_ready.set()
         while True:  # Starts app message server
             try:
-                if not self.server_conn.poll(1):
-                    continue
                 packet = self.server_conn.recv()
                 if packet is None:  # An empty packet terminates the process
                     # Send empty packet to client for it to close
@@ -604,18 +961,27 @@ class AppProcess(multiprocessing.Process):
                 return
 
     def _handle_app_process_server_packet(self, packet: AppProcessServerRequestPacket) -> None:
-        if not self.executor:
+        if not self.executor_lanes:
             return
         (message_id, session_id, request) = packet
-        thread_pool_future = self.executor.submit(
+        if request.type in AppProcess.CONTROL_MESSAGE_TYPES:
+            lane = self.executor_lanes["control"]
+        else:
+            lane = self.executor_lanes["events"]
+            # Registered before queueing, so a cancellation can't arrive ahead of it
+            self.cancel_events[message_id] = (session_id, threading.Event())
+        thread_pool_future = lane.submit(
             self._handle_message_and_get_packet, message_id, session_id, request
         )
         thread_pool_future.add_done_callback(self._send_packet)
 
     def run(self) -> None:
-        self.executor = concurrent.futures.ThreadPoolExecutor(
-            max_workers=(os.cpu_count() or 4) * 10
-        )
+        self.executor_lanes = {
+            "control": ExecutorLane("control", AppProcess.CONTROL_LANE_WORKERS),
+            "events": ExecutorLane("events", AppProcess.EVENT_LANE_WORKERS),
+            "blueprints": ExecutorLane("blueprints", AppProcess.BLUEPRINT_LANE_WORKERS),
+        }
+        self.executor = self.executor_lanes["blueprints"]
         self.server_conn_lock = threading.Lock()
         self.client_conn.close()
         self._main()
@@ -641,57 +1007,202 @@ class FileEventHandler(watchdog.events.PatternMatchingEventHandler):
         self.update_callback()
 
 
-class ThreadSafeAsyncEvent(asyncio.Event):
-    """Asyncio event adapted to be thread-safe."""
-
-    def __init__(self):
-        super().__init__()
-        if self._loop is None:
-            self._loop = asyncio.get_event_loop()
+ResponseFuture = Union[asyncio.Future, concurrent.futures.Future]
 
-    def set(self) -> None:
-        self._loop.call_soon_threadsafe(super().set)
 
-
-class AppProcessListener(threading.Thread):
+class AppProcessListener:
     """
     Listens to messages from the AppProcess server.
-    Notifies receipt via events in response_events and makes the responses available in response_packets.
+    Watches the pipe from the event loop it's bound to, and resolves the future
+    registered for each message.
+
+    Messages dispatched from the bound loop are awaited with asyncio futures. Those dispatched
+    from other loops or threads use concurrent futures, which can be resolved from the bound loop.
+    Packets pushed by the AppProcess, which have no message id, are handed to on_push on the bound loop.
     """
 
     def __init__(
         self,
         client_conn: multiprocessing.connection.Connection,
-        is_app_process_server_ready: multiprocessing.synchronize.Event,
-        response_packets: Dict,
-        response_events: Dict,
+        on_push: Optional[Callable[[AppProcessServerResponsePacket], None]] = None,
     ):
-        super().__init__(name="AppProcessListenerThread")
         self.client_conn = client_conn
-        self.is_app_process_server_ready = is_app_process_server_ready
-        self.response_packets = response_packets
-        self.response_events = response_events
+        self.on_push = on_push
+        self.response_futures: Dict[int, ResponseFuture] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.reader_thread: Optional[threading.Thread] = None
+        self.is_closed = False
         self.logger = logging.getLogger("writer")
 
-    def run(self) -> None:
-        self.is_app_process_server_ready.wait()
-        while True:
-            if not self.client_conn.poll(1):
-                continue
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Binds the listener to an event loop. Can be called from any thread.
+        """
+
+        if self.loop is not None:
+            raise ValueError("AppProcess listener is already bound to an event loop.")
+        self.loop = loop
+        fd = self.client_conn.fileno()
+
+        def add_reader():
             try:
-                packet = self.client_conn.recv()
-            except OSError:
-                self.logger.error("Connection to AppProcess closed.")
+                loop.add_reader(fd, self._handle_readable)
+            except NotImplementedError:
+                # Proactor event loops (Windows) can't watch pipes, a thread reads them instead
+                self.reader_thread = threading.Thread(
+                    target=self._read_in_thread, name="AppProcessListenerThread"
+                )
+                self.reader_thread.start()
+
+        if self.is_in_loop_thread() or not loop.is_running():
+            add_reader()
+        else:
+            loop.call_soon_threadsafe(add_reader)
+
+    def detach(self) -> None:
+        """
+        Stops watching the pipe. Can be called from any thread.
+        """
+
+        loop = self.loop
+        self.is_closed = True
+        if loop is None or loop.is_closed() or self.reader_thread is not None:
+            return
+        fd = self.client_conn.fileno()
+        if self.is_in_loop_thread() or not loop.is_running():
+            loop.remove_reader(fd)
+        else:
+            loop.call_soon_threadsafe(loop.remove_reader, fd)
+
+    def register(self, message_id: int, blocking: bool = False) -> ResponseFuture:
+        """
+        Returns a future that will be resolved with the response to the message.
+        Blocking callers get a concurrent future, to be awaited with wait_blocking.
+        """
+
+        if self.is_closed:
+            raise ConnectionError("Connection to AppProcess closed.")
+        response_future: ResponseFuture
+        if not blocking and self.is_in_loop_thread():
+            response_future = cast(asyncio.AbstractEventLoop, self.loop).create_future()
+        else:
+            response_future = concurrent.futures.Future()
+        self.response_futures[message_id] = response_future
+        return response_future
+
+    def unregister(self, message_id: int) -> None:
+        self.response_futures.pop(message_id, None)
+
+    def wait_blocking(self, response_future: concurrent.futures.Future) -> None:
+        """
+        Waits for a response while the bound loop is blocked by the caller,
+        by reading the pipe from the loop thread.
+        """
+
+        while not response_future.done():
+            if self.reader_thread is not None:
+                concurrent.futures.wait([response_future])
+                return
+            if self.is_closed:
+                return
+            if self.client_conn.poll(1):
+                self._handle_readable()
+
+    def fail_pending(self) -> None:
+        """
+        Fails the futures still waiting for a response. Can be called from any thread.
+        """
+
+        error = ConnectionError("Connection to AppProcess closed.")
+        response_futures = list(self.response_futures.values())
+        self.response_futures.clear()
+        for response_future in response_futures:
+            self._set_exception(response_future, error)
+
+    def is_in_loop_thread(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _set_result(self, response_future: ResponseFuture, packet: AppProcessServerResponsePacket):
+        if not response_future.done():
+            response_future.set_result(packet)
+
+    def _set_exception(self, response_future: ResponseFuture, error: BaseException):
+        if isinstance(response_future, concurrent.futures.Future):
+            if not response_future.done():
+                response_future.set_exception(error)
+            return
+        future_loop = response_future.get_loop()
+        if future_loop.is_closed():
+            return
+
+        def set_exception():
+            if not response_future.done():
+                response_future.set_exception(error)
+
+        future_loop.call_soon_threadsafe(set_exception)
+
+    def _receive(self) -> Optional[AppProcessServerResponsePacket]:
+        try:
+            packet = self.client_conn.recv()
+        except (OSError, EOFError):
+            self.logger.error("Connection to AppProcess closed.")
+            return None
+        if isinstance(packet, SharedMemoryPacket):
+            return packet.read()
+        return packet
+
+    def _push(self, packet: AppProcessServerResponsePacket) -> None:
+        if self.on_push is None:
+            return
+        try:
+            self.on_push(packet)
+        except BaseException as e:
+            self.logger.error(f"Couldn't handle packet pushed by AppProcess.\n{repr(e)}")
+
+    def _pop_future(self, packet: AppProcessServerResponsePacket) -> Optional[ResponseFuture]:
+        message_id = packet[0]
+        assert message_id is not None  # Pushed packets have no future
+        response_future = self.response_futures.pop(message_id, None)
+        if response_future is None:
+            # The dispatching side gave up on the message, e.g. it was cancelled
+            self.logger.debug(f"Dropping response to message {message_id}, nobody awaits it.")
+        return response_future
+
+    def _handle_readable(self) -> None:
+        while not self.is_closed and self.client_conn.poll():
+            packet = self._receive()
+            if packet is None:  # The AppProcess server terminated
+                self.detach()
+                self.fail_pending()
                 return
+            if packet[0] is None:
+                self._push(packet)
+                continue
+            response_future = self._pop_future(packet)
+            if response_future is not None:
+                self._set_result(response_future, packet)
+
+    def _read_in_thread(self) -> None:
+        loop = cast(asyncio.AbstractEventLoop, self.loop)
+        while not self.is_closed:
+            if not self.client_conn.poll(1):
+                continue
+            packet = self._receive()
             if packet is None:
+                self.is_closed = True
+                self.fail_pending()
                 return
-            message_id = packet[0]
-            self.response_packets[message_id] = packet
-            response_event = self.response_events.get(message_id)
-            if response_event:
-                response_event.set()
-            else:
-                raise ValueError(f"No response event found for message {message_id}.")
+            if packet[0] is None:
+                loop.call_soon_threadsafe(self._push, packet)
+                continue
+            response_future = self._pop_future(packet)
+            if isinstance(response_future, concurrent.futures.Future):
+                self._set_result(response_future, packet)
+            elif response_future is not None:
+                loop.call_soon_threadsafe(self._set_result, response_future, packet)
 
 
 class LogListener(threading.Thread):
@@ -715,31 +1226,167 @@ class LogListener(threading.Thread):
             self.logger.handle(message)
 
 
+class AppProcessWorker:
+    """
+    Owns one AppProcess of the pool, the pipe used to communicate with it
+    and the listener resolving its responses.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        on_push: Optional[Callable[[AppProcessServerResponsePacket], None]] = None,
+    ):
+        self.index = index
+        self.on_push = on_push
+        self.client_conn: Optional[multiprocessing.connection.Connection] = None
+        self.app_process: Optional[AppProcess] = None
+        self.app_process_listener: Optional[AppProcessListener] = None
+        context = AppProcess.get_context()
+        self.is_app_process_server_ready = context.Event()
+        self.is_app_process_server_failed = context.Event()
+
+    def start(
+        self,
+        app_path: str,
+        mode: ServeMode,
+        run_code: str,
+        bmc_components: Dict,
+        loop: Optional[asyncio.AbstractEventLoop],
+    ) -> None:
+        """
+        Starts the AppProcess without waiting for it to be ready.
+        Its responses are read from the given loop, or from the first loop dispatching a message.
+        """
+
+        self.is_app_process_server_ready.clear()
+        self.is_app_process_server_failed.clear()
+        client_conn, server_conn = multiprocessing.Pipe(duplex=True)
+        self.client_conn = cast(
+            multiprocessing.connection.Connection, client_conn
+        )  # for mypy type checking on windows
+        server_conn = cast(
+            multiprocessing.connection.Connection, server_conn
+        )  # for mypy type checking on windows
+
+        self.app_process = AppProcess(
+            client_conn=self.client_conn,
+            server_conn=server_conn,
+            app_path=app_path,
+            mode=mode,
+            run_code=run_code,
+            bmc_components=bmc_components,
+            is_app_process_server_ready=self.is_app_process_server_ready,
+            is_app_process_server_failed=self.is_app_process_server_failed,
+        )
+        self.app_process.start()
+        # The AppProcess owns the server end from now on, its exit shows as EOF on the client end
+        server_conn.close()
+        self.app_process_listener = AppProcessListener(self.client_conn, self.on_push)
+        if loop is not None:
+            self.app_process_listener.attach(loop)
+
+    def wait_until_ready(self) -> bool:
+        """
+        Blocks until the AppProcess server is ready. Returns False if it failed to start.
+        """
+
+        self.is_app_process_server_ready.wait()
+        return not self.is_app_process_server_failed.is_set()
+
+    def get_listener(self) -> AppProcessListener:
+        if self.app_process_listener is None:
+            raise ValueError("Cannot dispatch message. No connection to AppProcess server is set.")
+        if self.app_process_listener.loop is None:
+            self.app_process_listener.attach(asyncio.get_running_loop())
+        return self.app_process_listener
+
+    def send(self, packet: AppProcessServerRequestPacket) -> None:
+        if self.client_conn is None:
+            raise ValueError("Cannot dispatch message. No connection to AppProcess server is set.")
+        self.client_conn.send(packet)
+
+    def clean(self) -> None:
+        # Terminate the AppProcess server by sending an empty message
+        # The empty message will bounce an empty message and terminate the client too
+        if self.app_process_listener is not None:
+            self.app_process_listener.detach()
+            self.app_process_listener.fail_pending()
+        if self.client_conn is not None:
+            try:
+                self.client_conn.send(None)
+            except OSError:
+                pass  # The AppProcess is already gone
+        self.is_app_process_server_ready.clear()
+        self.is_app_process_server_failed.clear()
+        if self.app_process is not None:
+            self._discard_pending_packets()
+            self.app_process.join()
+            self.app_process.close()
+        if self.client_conn is not None:
+            self.client_conn.close()
+        self.app_process = None
+        self.app_process_listener = None
+        self.client_conn = None
+
+    def _discard_pending_packets(self) -> None:
+        """
+        Reads the responses nobody awaits anymore until the AppProcess exits,
+        releasing the shared memory blocks they refer to.
+        """
+
+        if self.client_conn is None or self.app_process is None:
+            return
+        while True:
+            is_alive = self.app_process.is_alive()
+            try:
+                while self.client_conn.poll(0 if not is_alive else 0.1):
+                    packet = self.client_conn.recv()
+                    if isinstance(packet, SharedMemoryPacket):
+                        packet.discard()
+            except (OSError, EOFError):
+                return
+            if not is_alive:
+                return
+
+
 class AppRunner:
     """
-    Starts a given user app in a separate process.
+    Starts a given user app in separate processes.
     Manages changes to the app.
     Allows for communication with the app via messages.
+
+    The app can be served by a pool of AppProcess workers. Each session is pinned
+    to one worker, picked by hashing its session id.
+
+    >>> app_runner = AppRunner("app1", "run", workers=4)
     """
 
     UPDATE_CHECK_INTERVAL_SECONDS = 0.2
     WF_PROJECT_SAVE_INTERVAL = float(os.getenv("WRITER_SAVE_INTERVAL", "0.2"))
+    APP_PROCESS_WORKERS = int(os.getenv("WRITER_APP_PROCESS_WORKERS", "1"))
     MAX_WAIT_NOTIFY_SECONDS = 30
 
-    def __init__(self, app_path: str, mode: str):
-        self.server_conn: Optional[multiprocessing.connection.Connection] = None
-        self.client_conn: Optional[multiprocessing.connection.Connection] = None
-        self.app_process: Optional[AppProcess] = None
+    def __init__(self, app_path: str, mode: str, workers: Optional[int] = None):
         self.run_code: Optional[str] = None
         self.source_files: SourceFilesDirectory = {"children": {}, "type": "directory"}
         self.bmc_components: Optional[Dict] = None
+        # Index of the blueprints, rebuilt when bmc_components is replaced
+        self._blueprint_index_source: Optional[Dict] = None
+        self._blueprint_ids_by_key: Dict[str, str] = {}
+        self._api_blueprint_ids: Set[str] = set()
         self.is_app_process_server_ready = multiprocessing.Event()
         self.is_app_process_server_failed = multiprocessing.Event()
-        self.app_process_listener: Optional[AppProcessListener] = None
         self.observer: Optional[PollingObserver] = None
         self.app_path: str = app_path
-        self.response_events: Dict[int, ThreadSafeAsyncEvent] = {}
-        self.response_packets: Dict[int, AppProcessServerResponsePacket] = {}
+        self.listener_loop: Optional[asyncio.AbstractEventLoop] = None
+        workers = workers if workers is not None else AppRunner.APP_PROCESS_WORKERS
+        if workers < 1:
+            raise ValueError("At least one AppProcess worker is required.")
+        self.workers: List[AppProcessWorker] = [
+            AppProcessWorker(i, self._handle_push) for i in range(workers)
+        ]
+        self.reload_lock = threading.Lock()
         self.message_counter = 0
         self.log_queue: multiprocessing.Queue = multiprocessing.Queue()
         self.log_listener: Optional[LogListener] = None
@@ -763,7 +1410,8 @@ class AppRunner:
 
     def _set_logger(self):
         logger = logging.getLogger("app")
-        logger.addHandler(logging.handlers.QueueHandler(self.log_queue))
+        self.log_handler = logging.handlers.QueueHandler(self.log_queue)
+        logger.addHandler(self.log_handler)
         self.log_listener = LogListener(self.log_queue)
         self.log_listener.start()
 
@@ -837,31 +1485,119 @@ class AppRunner:
         # parent pid and pid.
         self._subscribe_terminal_signal()
 
+    def _get_session_worker(
+        self, session_id: Optional[str], request: AppProcessServerRequest
+    ) -> AppProcessWorker:
+        """
+        Returns the worker a session is pinned to.
+
+        Session initialisation is routed using the proposed session id, which
+        becomes the id of the session.
+        """
+
+        shard_key = session_id
+        if isinstance(request.payload, InitSessionRequestPayload):
+            shard_key = request.payload.proposedSessionId
+        if shard_key is None or len(self.workers) == 1:
+            return self.workers[0]
+        return self.workers[zlib.crc32(shard_key.encode("utf-8")) % len(self.workers)]
+
     async def dispatch_message(
         self, session_id: str, request: AppProcessServerRequest
     ) -> AppProcessServerResponse:
         """
-        Sends a message to the AppProcess server, waits for the listener to obtain a response and returns it.
+        Sends a message to the AppProcess server the session is pinned to,
+        waits for the listener to obtain a response and returns it.
         """
 
+        worker = self._get_session_worker(session_id, request)
+        return await self._dispatch_message_to_worker(worker, session_id, request)
+
+    async def _broadcast_message(
+        self, request: AppProcessServerRequest, exclude_session_id: Optional[str] = None
+    ) -> None:
+        """
+        Sends a process-wide message to every worker,
+        except the one the excluded session is pinned to.
+        """
+
+        excluded_worker = None
+        if exclude_session_id is not None:
+            excluded_worker = self._get_session_worker(exclude_session_id, request)
+        for worker in self.workers:
+            if worker is excluded_worker:
+                continue
+            await self._dispatch_message_to_worker(worker, cast(str, None), request)
+
+    async def _dispatch_message_to_worker(
+        self, worker: AppProcessWorker, session_id: str, request: AppProcessServerRequest
+    ) -> AppProcessServerResponse:
         message_id = self.message_counter
         self.message_counter += 1
-        is_response_ready = ThreadSafeAsyncEvent()
-        self.response_events[message_id] = is_response_ready
+        listener = worker.get_listener()
+        response_future = listener.register(message_id)
         packet: AppProcessServerRequestPacket = (message_id, session_id, request)
 
-        if self.client_conn is None:
-            raise ValueError("Cannot dispatch message. No connection to AppProcess server is set.")
-        self.client_conn.send(packet)
+        try:
+            worker.send(packet)
+            # Resolved by the listener, from its loop
+            if isinstance(response_future, asyncio.Future):
+                response_packet = await response_future
+            else:
+                response_packet = await asyncio.wrap_future(response_future)
+        except asyncio.CancelledError:
+            self._cancel_message(worker, message_id, session_id)
+            raise
+        finally:
+            listener.unregister(message_id)
+
+        return self._get_response(message_id, session_id, response_packet)
+
+    def _cancel_message(self, worker: AppProcessWorker, message_id: int, session_id: str) -> None:
+        """
+        Signals the AppProcess that the response to a message is no longer awaited,
+        so the work behind it can stop. The response to the cancellation itself is dropped.
+        """
+
+        cancel_message_id = self.message_counter
+        self.message_counter += 1
+        request = CancelRequest(type="cancel", payload=CancelRequestPayload(messageId=message_id))
+        try:
+            worker.send((cancel_message_id, session_id, request))
+        except (OSError, ValueError):
+            pass
 
-        await is_response_ready.wait()  # Set by the listener thread
+    def _dispatch_message_blocking(
+        self, worker: AppProcessWorker, session_id: str, request: AppProcessServerRequest
+    ) -> AppProcessServerResponse:
+        """
+        Dispatches a message from the listener's loop thread, blocking the loop until
+        the response is read.
+        """
+
+        message_id = self.message_counter
+        self.message_counter += 1
+        listener = worker.get_listener()
+        response_future = cast(
+            concurrent.futures.Future, listener.register(message_id, blocking=True)
+        )
+        packet: AppProcessServerRequestPacket = (message_id, session_id, request)
+
+        try:
+            worker.send(packet)
+            listener.wait_blocking(response_future)
+            response_packet = response_future.result(timeout=0)
+        finally:
+            listener.unregister(message_id)
 
-        response_packet = self.response_packets.get(message_id)
+        return self._get_response(message_id, session_id, response_packet)
+
+    def _get_response(
+        self, message_id: int, session_id: str, response_packet: AppProcessServerResponsePacket
+    ) -> AppProcessServerResponse:
         if response_packet is None:
             raise ValueError(f"Empty packet received in response to message {message_id}.")
         response_message_id, response_session_id, response = response_packet
-        del self.response_packets[message_id]
-        del self.response_events[message_id]
         if session_id != response_session_id:
             raise PermissionError("Session mismatch.")
         if message_id != response_message_id:
@@ -945,6 +1681,35 @@ class AppRunner:
         if not os.path.abspath(path).startswith(os.path.abspath((self.app_path))):
             raise PermissionError(f"{path} is outside of application ({self.app_path})")
 
+    def find_blueprint_id(self, blueprint_key: str) -> Optional[str]:
+        """
+        Returns the ID of the blueprint with the given key, if any.
+        """
+        self._ensure_blueprint_index()
+        return self._blueprint_ids_by_key.get(blueprint_key)
+
+    def has_api_trigger(self, blueprint_id: str) -> bool:
+        """
+        Checks whether the blueprint has at least one API trigger.
+        """
+        self._ensure_blueprint_index()
+        return blueprint_id in self._api_blueprint_ids
+
+    def _ensure_blueprint_index(self) -> None:
+        if self._blueprint_index_source is self.bmc_components:
+            return
+        blueprint_ids_by_key: Dict[str, str] = {}
+        api_blueprint_ids: Set[str] = set()
+        for component in (self.bmc_components or {}).values():
+            if component["type"] == "blueprints_blueprint":
+                blueprint_key = component.get("content", {}).get("key")
+                blueprint_ids_by_key.setdefault(blueprint_key, component["id"])
+            elif component["type"] == "blueprints_apitrigger":
+                api_blueprint_ids.add(component.get("parentId"))
+        self._blueprint_ids_by_key = blueprint_ids_by_key
+        self._api_blueprint_ids = api_blueprint_ids
+        self._blueprint_index_source = self.bmc_components
+
     def _load_persisted_components(self) -> Dict[str, ComponentDefinition]:
         logger = logging.getLogger("writer")
 
@@ -969,6 +1734,11 @@ class AppRunner:
         return is_ok
 
     async def init_session(self, payload: InitSessionRequestPayload) -> AppProcessServerResponse:
+        if payload.proposedSessionId is None:
+            # The id is decided here so the session can be pinned to a worker
+            payload = payload.model_copy(
+                update={"proposedSessionId": SessionManager.generate_session_id()}
+            )
         return await self.dispatch_message(
             "anonymous", InitSessionRequest(type="sessionInit", payload=payload)
         )
@@ -986,9 +1756,10 @@ class AppRunner:
             components=payload.components,
         )
 
-        return await self.dispatch_message(
-            session_id, ComponentUpdateRequest(type="componentUpdate", payload=payload)
-        )
+        request = ComponentUpdateRequest(type="componentUpdate", payload=payload)
+        response = await self.dispatch_message(session_id, request)
+        await self._broadcast_message(request, exclude_session_id=session_id)
+        return response
 
     async def list_resources(self, session_id: str, resource_type: str) -> AppProcessServerResponse:
         if self.mode != "edit":
@@ -999,11 +1770,49 @@ class AppRunner:
 
     async def writer_vault_refresh(self, session_id: str) -> AppProcessServerResponse:
         message = WriterVaultUpdateRequest(type="writerVaultUpdate")
-        return await self.dispatch_message(session_id, message)
+        response = await self.dispatch_message(session_id, message)
+        if self.mode == "edit":
+            await self._broadcast_message(message, exclude_session_id=session_id)
+        return response
+
+    def _handle_push(self, packet: AppProcessServerResponsePacket) -> None:
+        """
+        Forwards the state mutations pushed by the AppProcess to the announcement queue
+        of their session. Runs on the listener's loop.
+        """
+
+        (_, session_id, response) = packet
+        if session_id is None or response is None or response.payload is None:
+            return
+        announcement_queue = self.announcement_queues.get(session_id)
+        if announcement_queue is None:
+            return
+        payload = cast(StateEnquiryResponsePayload, response.payload).model_dump()
+        announcement_queue.put_nowait({"type": "stateMutations", "payload": payload})
+
+    async def get_executor_metrics(self) -> List[Optional[Dict[str, Dict[str, int]]]]:
+        """
+        Returns the queue depth and activity of the executor lanes, for every worker of the pool.
+        Workers which couldn't report them are listed as None.
+        """
+
+        request = AppProcessServerRequest(type="executorMetrics", payload=None)
+        metrics: List[Optional[Dict[str, Dict[str, int]]]] = []
+        for worker in self.workers:
+            response = await self._dispatch_message_to_worker(worker, cast(str, None), request)
+            metrics.append(response.payload)
+        return metrics
 
     async def handle_event(self, session_id: str, event: WriterEvent) -> AppProcessServerResponse:
         return await self.dispatch_message(session_id, EventRequest(type="event", payload=event))
 
+    async def handle_dataframe_query(
+        self, session_id: str, payload: DataframeQueryRequestPayload
+    ) -> AppProcessServerResponse:
+        return await self.dispatch_message(
+            session_id, DataframeQueryRequest(type="dataframeQuery", payload=payload)
+        )
+
     async def handle_hash_request(
         self, session_id: str, payload: HashRequestPayload
     ) -> AppProcessServerResponse:
@@ -1040,33 +1849,18 @@ class AppRunner:
         self.source_files = wf_project.build_source_files(self.app_path)
 
     def _clean_process(self) -> None:
-        # Terminate the AppProcess server by sending an empty message
-        # The empty message will bounce an empty message and terminate the client too
-        if self.client_conn is not None:
-            self.client_conn.send(None)
+        for worker in self.workers:
+            worker.clean()
         self.is_app_process_server_ready.clear()
         self.is_app_process_server_failed.clear()
-        if self.app_process is not None:
-            self.app_process.join()
-            self.app_process.close()
-        if self.app_process_listener is not None:
-            self.app_process_listener.join()
-        if self.client_conn is not None:
-            self.client_conn.close()
-        if self.server_conn is not None:
-            self.server_conn.close()
-        self.response_events = {}
-        self.response_packets = {}
-        self.app_process = None
-        self.app_process_listener = None
-        self.client_conn = None
-        self.server_conn = None
 
     def shut_down(self) -> None:
         if self.observer is not None:
             self.observer.unschedule_all()
             self.observer.stop()
             self.observer.join()
+        # Nothing reads the queue once the listener is stopped, records would pile up in its pipe
+        logging.getLogger("app").removeHandler(self.log_handler)
         self.log_queue.put(None)
         if self.log_listener is not None:
             self.log_listener.join()
@@ -1081,37 +1875,70 @@ class AppRunner:
         if self.bmc_components is None:
             raise ValueError("Cannot start app process. Components haven't been set.")
         self.is_app_process_server_ready.clear()
-        client_conn, server_conn = multiprocessing.Pipe(duplex=True)
-        self.client_conn = cast(
-            multiprocessing.connection.Connection, client_conn
-        )  # for mypy type checking on windows
-        self.server_conn = cast(
-            multiprocessing.connection.Connection, server_conn
-        )  # for mypy type checking on windows
+        self.is_app_process_server_failed.clear()
+        self._update_listener_loop()
+
+        # Workers are started together so they import and run the user code in parallel
+        for worker in self.workers:
+            worker.start(
+                self.app_path, self.mode, self.run_code, self.bmc_components, self.listener_loop
+            )
+        for worker in self.workers:
+            if not worker.wait_until_ready():
+                self.is_app_process_server_failed.set()
+        self.is_app_process_server_ready.set()
 
-        self.app_process = AppProcess(
-            client_conn=self.client_conn,
-            server_conn=self.server_conn,
-            app_path=self.app_path,
-            mode=self.mode,
-            run_code=self.run_code,
-            bmc_components=self.bmc_components,
-            is_app_process_server_ready=self.is_app_process_server_ready,
-            is_app_process_server_failed=self.is_app_process_server_failed,
-        )
-        self.app_process.start()
-        self.app_process_listener = AppProcessListener(
-            self.client_conn,
-            self.is_app_process_server_ready,
-            self.response_packets,
-            self.response_events,
-        )
-        self.app_process_listener.start()
-        self.is_app_process_server_ready.wait()
         if self.mode == "run" and self.is_app_process_server_failed.is_set():
             self.shut_down()
             sys.exit(1)
 
+    def _update_listener_loop(self) -> None:
+        # Responses are read from the serve loop. Runners which aren't hooked to it
+        # use the loop they're loaded from, or the first one dispatching a message.
+        if self.serve_loop is not None:
+            self.listener_loop = self.serve_loop
+        elif self.listener_loop is None or self.listener_loop.is_closed():
+            try:
+                self.listener_loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.listener_loop = None
+
+    def _replace_app_process(self) -> None:
+        """
+        Starts a standby pool of AppProcess workers running the current code while the
+        running pool keeps serving, and switches over once the standby pool is ready.
+        Messages dispatched after the switch reach the new pool; the ones still awaiting
+        a response from the retired pool fail with ConnectionError.
+        """
+
+        if self.run_code is None:
+            raise ValueError("Cannot start app process. Code hasn't been set.")
+        if self.bmc_components is None:
+            raise ValueError("Cannot start app process. Components haven't been set.")
+        self._update_listener_loop()
+
+        standby_workers = [
+            AppProcessWorker(i, self._handle_push) for i in range(len(self.workers))
+        ]
+        for worker in standby_workers:
+            worker.start(
+                self.app_path, self.mode, self.run_code, self.bmc_components, self.listener_loop
+            )
+        is_failed = False
+        for worker in standby_workers:
+            if not worker.wait_until_ready():
+                is_failed = True
+
+        retired_workers = self.workers
+        self.workers = standby_workers
+        if is_failed:
+            self.is_app_process_server_failed.set()
+        else:
+            self.is_app_process_server_failed.clear()
+
+        for worker in retired_workers:
+            worker.clean()
+
     def reload_code_from_saved(self) -> None:
         if not self.is_app_process_server_ready.is_set():
             return
@@ -1122,17 +1949,20 @@ class AppRunner:
         Updates the running code and notifies the update.
         In order to notify of the update, the event loop and asyncio.Condition need
         to be aligned with the server's.
+
+        The current AppProcess keeps serving while its replacement starts, so this
+        shouldn't be called from the serve loop, which would be blocked meanwhile.
+        Sessions are told to re-initialise once the replacement is ready.
         """
 
         if self.mode != "edit":
             raise PermissionError("Cannot update code in non-edit mode.")
         if not self.is_app_process_server_ready.is_set():
             return
-        self.run_code = run_code
-        self.source_files = wf_project.build_source_files(self.app_path)
-        self._clean_process()
-        self._start_app_process()
-        self.is_app_process_server_ready.wait()
+        with self.reload_lock:
+            self.run_code = run_code
+            self.source_files = wf_project.build_source_files(self.app_path)
+            self._replace_app_process()
         self.queue_announcement("codeUpdate", None)
 
     async def queue_announcement_async(
@@ -1161,9 +1991,15 @@ class AppRunner:
                 pass
 
     def set_userinfo(self, session_id: str, userinfo: dict) -> None:
-        def run_async_in_thread():
-            message = AppProcessServerRequest(type="setUserinfo", payload=userinfo)
+        message = AppProcessServerRequest(type="setUserinfo", payload=userinfo)
+        worker = self._get_session_worker(session_id, message)
+        listener = worker.app_process_listener
+        if listener is not None and listener.is_in_loop_thread():
+            # The loop reading the responses is blocked by this call
+            self._dispatch_message_blocking(worker, session_id, message)
+            return
 
+        def run_async_in_thread():
             asyncio.run(self.dispatch_message(session_id, message))
 
         thread = threading.Thread(target=run_async_in_thread)
@@ -1,8 +1,9 @@
-from typing import TYPE_CHECKING, Any, Dict, Optional, Type
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Type
 
 import httpx
 from writerai import DefaultHttpxClient, Writer
 
+import writer.core
 import writer.core_ui
 import writer.evaluator
 from writer.ss_types import WriterConfigurationError
@@ -17,8 +18,24 @@ block_map: Dict[str, BlueprintBlock_T] = {}
 
 
 class BlueprintBlock:
+    """
+    Base class for blueprint blocks.
+
+    Blocks bound by I/O can implement ``run_async`` alongside ``run``. The
+    blueprint runner then runs them on its event loop instead of holding a
+    thread, while ``run`` keeps working for direct callers.
+
+    >>> class MyBlock(BlueprintBlock):
+    >>>     async def run_async(self):
+    >>>         async with self.acquire_async_httpx_client() as client:
+    >>>             self.result = (await client.get(self._get_field("url"))).text
+    >>>         self.outcome = "success"
+    """
+
     _parent_client_class = httpx.Client
+    _parent_async_client_class = httpx.AsyncClient
     _custom_httpx_client: Optional[httpx.Client] = None
+    _custom_async_httpx_client: Optional[httpx.AsyncClient] = None
     _log_requests: bool = True
 
     @classmethod
@@ -28,11 +45,13 @@ class BlueprintBlock:
     def __init_subclass__(
         cls,
         custom_httpx_client: Optional['httpx.Client'] = None,
+        custom_async_httpx_client: Optional['httpx.AsyncClient'] = None,
         log_requests: bool = True,
         **kwargs
     ):
         super().__init_subclass__(**kwargs)
         cls._custom_httpx_client = custom_httpx_client
+        cls._custom_async_httpx_client = custom_async_httpx_client
         cls._log_requests = log_requests
 
     def __init__(
@@ -92,6 +111,39 @@ class BlueprintBlock:
     def run(self):
         pass
 
+    async def run_async(self):
+        """
+        Asynchronous counterpart of run, used by the blueprint runner when
+        the block implements it.
+        """
+        self.run()
+
+    @property
+    def is_async(self) -> bool:
+        """
+        Whether the block runs as a coroutine. That's the case when run_async
+        is implemented by the same class as run, or by a subclass of it, so
+        that subclasses overriding run only keep running it.
+        """
+        if self._custom_httpx_client and not self._custom_async_httpx_client:
+            # The custom client can only be used by run
+            return False
+        mro = type(self).__mro__
+        run_class = next(c for c in mro if "run" in c.__dict__)
+        run_async_class = next(c for c in mro if "run_async" in c.__dict__)
+        return run_async_class is not BlueprintBlock and issubclass(run_async_class, run_class)
+
+    @staticmethod
+    def _log_response_content(response: httpx.Response) -> None:
+        log_entry = response.extensions.get("log_entry")
+        if log_entry:
+            try:
+                log_entry["response"]["content"] = (
+                    response.text if response.is_closed or response.is_stream_consumed else "<stream>"
+                )
+            except Exception as e:
+                log_entry["response"]["content"] = f"<error reading response: {e}>"
+
     def create_httpx_client(self, *args, **kwargs) -> httpx.Client:
         """
         Create a custom HTTPX client with request and response logging.
@@ -104,15 +156,11 @@ class BlueprintBlock:
         }
 
         def send(self_inner, request, **kw):
+            # Don't start calls on behalf of an abandoned request
+            if writer.core.is_request_cancelled():
+                raise httpx.RequestError("The request running the block was cancelled.", request=request)
             response = self._parent_client_class.send(self_inner, request, **kw)
-            log_entry = response.extensions.get("log_entry")
-            if log_entry:
-                try:
-                    log_entry["response"]["content"] = (
-                        response.text if response.is_closed or response.is_stream_consumed else "<stream>"
-                    )
-                except Exception as e:
-                    log_entry["response"]["content"] = f"<error reading response: {e}>"
+            self._log_response_content(response)
             return response
 
         # Create a new class that inherits from the parent client class
@@ -139,6 +187,54 @@ class BlueprintBlock:
         # Create a new HTTPX client with request and response logging
         return self.create_httpx_client()
 
+    def create_async_httpx_client(self, *args, **kwargs) -> httpx.AsyncClient:
+        """
+        Create a custom asynchronous HTTPX client with request and response logging.
+        """
+        logger = self.create_logger() if self._log_requests else None
+
+        event_hooks: Dict[str, List[Callable]] = {"request": [], "response": []}
+        if logger:
+            request_hook, response_hook = logger.request_hook, logger.response_hook
+
+            # Hooks of asynchronous clients must be coroutines
+            async def log_request(request: httpx.Request):
+                request_hook(request)
+
+            async def log_response(response: httpx.Response):
+                response_hook(response)
+
+            event_hooks = {"request": [log_request], "response": [log_response]}
+
+        async def send(self_inner, request, **kw):
+            # Don't start calls on behalf of an abandoned request
+            if writer.core.is_request_cancelled():
+                raise httpx.RequestError("The request running the block was cancelled.", request=request)
+            response = await self._parent_async_client_class.send(self_inner, request, **kw)
+            self._log_response_content(response)
+            return response
+
+        LoggingAsyncHttpxClient = type(
+            "LoggingAsyncHttpxClient",
+            (self._parent_async_client_class,),
+            {"send": send}
+        )
+
+        return LoggingAsyncHttpxClient(
+            *args,
+            event_hooks=kwargs.pop("event_hooks", {}) | event_hooks,
+            **kwargs
+        )
+
+    def acquire_async_httpx_client(self) -> httpx.AsyncClient:
+        """
+        Acquire an asynchronous HTTPX client for making requests from coroutines.
+        """
+        if self._custom_async_httpx_client:
+            return self._custom_async_httpx_client
+
+        return self.create_async_httpx_client()
+
     def create_logger(
             self,
             env_storage_key: Optional[str] = None
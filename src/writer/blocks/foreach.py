@@ -29,6 +29,25 @@ class ForEach(BlueprintBlock):
                             "type": "Text",
                             "desc": "If set, the item will be available at @{prefix_item} and the item id at @{prefix_itemId}.",
                         },
+                        "maxConcurrency": {
+                            "name": "Max concurrency",
+                            "type": "Number",
+                            "desc": "The maximum number of items processed at once. Leave empty for no limit.",
+                            "validator": {
+                                "type": "number",
+                                "minimum": 1,
+                            },
+                        },
+                        "chunkSize": {
+                            "name": "Chunk size",
+                            "type": "Number",
+                            "desc": "The number of items processed one after the other by each worker. Larger chunks reduce the overhead of quick branches.",
+                            "default": "1",
+                            "validator": {
+                                "type": "number",
+                                "minimum": 1,
+                            },
+                        },
                     },
                     "outs": {
                         "loop": {
@@ -57,6 +76,9 @@ class ForEach(BlueprintBlock):
             prefix = str(self._get_field("prefix", as_json=False, default_field_value="")).strip()
             if prefix:
                 prefix += "_"
+            max_concurrency_field = str(self._get_field("maxConcurrency", False, "")).strip()
+            max_concurrency = int(max_concurrency_field) if max_concurrency_field else None
+            chunk_size = int(self._get_field("chunkSize", False, "1"))
             base_execution_environment = self.execution_environment
 
             if not isinstance(items, (list, dict)):
@@ -69,7 +91,7 @@ class ForEach(BlueprintBlock):
                 ]
 
                 results = self.runner.run_branch_pool(
-                    self.component.id, "loop", blueprint_environments
+                    self.component.id, "loop", blueprint_environments, max_concurrency, chunk_size
                 )
                 self.result = results  # Return as a list
 
@@ -80,7 +102,11 @@ class ForEach(BlueprintBlock):
                     for item_id, item in items.items()
                 }
                 results = self.runner.run_branch_pool(
-                    self.component.id, "loop", list(blueprint_environments.values())
+                    self.component.id,
+                    "loop",
+                    list(blueprint_environments.values()),
+                    max_concurrency,
+                    chunk_size,
                 )
                 self.result = {
                     item_id: results[i] for i, item_id in enumerate(blueprint_environments.keys())
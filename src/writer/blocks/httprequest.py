@@ -1,4 +1,7 @@
 import json
+from typing import Dict, Optional, Tuple
+
+import httpx
 
 from writer.abstract import register_abstract_template
 from writer.blocks.base_block import BlueprintBlock
@@ -92,61 +95,72 @@ class HTTPRequest(BlueprintBlock):
 
     def run(self):
         try:
-            method = self._get_field("method", False, "GET")
-            url = self._get_field("url")
-            headers = self._get_field(
-                "headers", True, default_field_value="{}"
-                )
-            body_type = self._get_field("bodyType")
-            body = None
-            raw_body = None
+            method, url, headers, body = self._get_request()
+            with self.acquire_httpx_client() as client:
+                res = client.request(method, url, headers=headers, content=body, timeout=180)
+                self._handle_response(res)
+        except Exception as e:
+            self._handle_error(e)
+            raise e
 
-            if body_type == "JSON":
-                body = self._get_field("body", as_json=True)
-                raw_body = json.dumps(body)
-                headers.setdefault("Content-Type", "application/json")
-            else:
-                body = self._get_field("body", as_json=False)
-                raw_body = body
+    async def run_async(self):
+        try:
+            method, url, headers, body = self._get_request()
+            async with self.acquire_async_httpx_client() as client:
+                res = await client.request(method, url, headers=headers, content=body, timeout=180)
+                self._handle_response(res)
+        except Exception as e:
+            self._handle_error(e)
+            raise e
 
-            with self.acquire_httpx_client() as client:
-                res = client.request(
-                    method,
-                    url,
-                    headers=headers,
-                    content=raw_body,
-                    timeout=180
-                    )
+    def _get_request(self) -> Tuple[str, str, Dict, Optional[str]]:
+        method = self._get_field("method", False, "GET")
+        url = self._get_field("url")
+        headers = self._get_field(
+            "headers", True, default_field_value="{}"
+            )
+        body_type = self._get_field("bodyType")
+        body = None
+        raw_body = None
 
-                content_type = res.headers.get("Content-Type", "")
-                is_response_json = "application/json" in content_type
+        if body_type == "JSON":
+            body = self._get_field("body", as_json=True)
+            raw_body = json.dumps(body)
+            headers.setdefault("Content-Type", "application/json")
+        else:
+            body = self._get_field("body", as_json=False)
+            raw_body = body
 
-                self.result = {
-                    "request": {
-                        "url": str(res.request.url),
-                        "headers": dict(res.request.headers),
-                        "body": res.request.content.decode(
-                            "utf-8", errors="replace"
-                            ),
-                    },
-                    "headers": dict(res.headers),
-                    "status_code": res.status_code,
-                    "body": res.json() if is_response_json else res.text,
-                }
+        return method, url, headers, raw_body
+
+    def _handle_response(self, res: httpx.Response):
+        content_type = res.headers.get("Content-Type", "")
+        is_response_json = "application/json" in content_type
 
-                if res.is_success:
-                    self.outcome = "success"
-                else:
-                    self.outcome = "responseError"
-                    raise RuntimeError(
-                        f"HTTP response with code {res.status_code}"
-                        f" and message {res.text}"
-                        )
+        self.result = {
+            "request": {
+                "url": str(res.request.url),
+                "headers": dict(res.request.headers),
+                "body": res.request.content.decode(
+                    "utf-8", errors="replace"
+                    ),
+            },
+            "headers": dict(res.headers),
+            "status_code": res.status_code,
+            "body": res.json() if is_response_json else res.text,
+        }
 
-        except json.JSONDecodeError as e:
+        if res.is_success:
+            self.outcome = "success"
+        else:
             self.outcome = "responseError"
-            raise e
-        except Exception as e:
-            if self.outcome is None or self.outcome not in ("responseError",):
-                self.outcome = "connectionError"
-            raise e
+            raise RuntimeError(
+                f"HTTP response with code {res.status_code}"
+                f" and message {res.text}"
+                )
+
+    def _handle_error(self, e: Exception):
+        if isinstance(e, json.JSONDecodeError):
+            self.outcome = "responseError"
+        elif self.outcome is None or self.outcome not in ("responseError",):
+            self.outcome = "connectionError"
@@ -1,5 +1,8 @@
+import asyncio
 import copy
+import dataclasses
 import hashlib
+import itertools
 import json
 import logging
 import os
@@ -9,7 +12,7 @@ from collections import OrderedDict, deque
 from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from contextlib import contextmanager
 from contextvars import copy_context
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Callable, Dict, Iterable, List, Literal, Mapping, Optional, Tuple, Type
 
 import writer.blocks
 import writer.blocks.base_block
@@ -18,24 +21,180 @@ import writer.core_ui
 from writer.ss_types import BlueprintExecutionError, BlueprintExecutionLog, WriterConfigurationError
 
 
+@dataclasses.dataclass(frozen=True)
+class BlueprintPlan:
+    """
+    Execution plan of a blueprint, or of a branch of a blueprint.
+
+    The plan captures the topology of the nodes so that it's computed once
+    and shared by all the executions. It mustn't be modified once built.
+
+    >>> plan = BlueprintPlan.build(nodes)
+    >>> blueprint_runner.execute_plan(plan, execution_environment)
+    """
+
+    node_ids: Tuple[str, ...]
+    graph: Mapping[str, writer.core_ui.Component]
+    # Incoming edges of each node, as (from node id, out id)
+    inputs: Mapping[str, Tuple[Tuple[str, Optional[str]], ...]]
+    # Outgoing edges of each node, as (to node id, out id)
+    outputs: Mapping[str, Tuple[Tuple[str, Optional[str]], ...]]
+    # Number of distinct nodes each node is connected from
+    in_degree: Mapping[str, int]
+    # Nodes not connected from any other node, which start the execution
+    root_ids: Tuple[str, ...]
+    block_classes: Mapping[str, Optional[Type[writer.blocks.base_block.BlueprintBlock]]]
+
+    @classmethod
+    def build(cls, nodes: List[writer.core_ui.Component]) -> "BlueprintPlan":
+        inputs: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+        outputs: Dict[str, Tuple[Tuple[str, Optional[str]], ...]] = {}
+        in_degree = {node.id: 0 for node in nodes}
+        for node in nodes:
+            outs = tuple((out.get("toNodeId"), out.get("outId")) for out in (node.outs or []))
+            outputs[node.id] = outs
+            for to_node_id, out_id in outs:
+                inputs.setdefault(to_node_id, []).append((node.id, out_id))
+            for to_node_id in {to_node_id for to_node_id, _ in outs}:
+                in_degree[to_node_id] += 1
+
+        return cls(
+            node_ids=tuple(node.id for node in nodes),
+            graph={node.id: node for node in nodes},
+            inputs={node_id: tuple(edges) for node_id, edges in inputs.items()},
+            outputs=outputs,
+            in_degree=in_degree,
+            root_ids=tuple(node.id for node in nodes if in_degree[node.id] == 0),
+            block_classes={
+                node.id: writer.blocks.base_block.block_map.get(node.type) for node in nodes
+            },
+        )
+
+
+class _HelpableTask:
+    """
+    Task submitted to an executor, which is run either by a worker or by the
+    thread waiting for it, whichever gets to it first.
+    """
+
+    def __init__(self, fn: Callable, *args):
+        self.fn = fn
+        self.args = args
+        self.future: Future = Future()
+        self._is_claimed = False
+        self._lock = threading.Lock()
+
+    def run(self):
+        with self._lock:
+            if self._is_claimed:
+                return
+            self._is_claimed = True
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(*self.args)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class _RunLog:
+    """
+    Log of a blueprint run, sent as log entries sharing the id of the run.
+
+    The first entry summarises every block, the following ones only the blocks
+    which changed since, so that each block is summarised once per change.
+    Updates are throttled, except the final one.
+    """
+
+    def __init__(
+        self,
+        runner: "BlueprintRunner",
+        tools: OrderedDict[str, Optional[writer.blocks.base_block.BlueprintBlock]],
+        title: str,
+        run_id: str,
+    ):
+        self.runner = runner
+        self.tools = tools
+        self.title = title
+        self.run_id = run_id
+        self.is_started = False
+        self.updated_at = 0.0
+        self.last_entry: Optional[Tuple[str, str]] = None
+        # State of the blocks when they were last summarised
+        self.signatures: Dict[str, Tuple] = {}
+
+    def update(self, message: str, entry_type: Literal["info", "error"] = "info", is_final: bool = False):
+        if not writer.core.Config.is_mail_enabled_for_log:
+            return
+        now = time.monotonic()
+        if not is_final and self.is_started and now - self.updated_at < BlueprintRunner.LOG_UPDATE_INTERVAL:
+            return
+
+        summary = []
+        for component_id, tool in self.tools.items():
+            signature = self._get_signature(tool)
+            if self.signatures.get(component_id) == signature:
+                continue
+            self.signatures[component_id] = signature
+            summary.append(self.runner._summarize_tool(component_id, tool))
+        if self.is_started and not summary and self.last_entry == (message, entry_type):
+            return
+
+        exec_log = BlueprintExecutionLog(summary=summary, isDelta=self.is_started)
+        self.is_started = True
+        self.updated_at = now
+        self.last_entry = (message, entry_type)
+        self.runner.session.session_state.add_log_entry(
+            entry_type, self.title, message, blueprint_execution=exec_log, id=self.run_id
+        )
+
+    @staticmethod
+    def _get_signature(tool: Optional[writer.blocks.base_block.BlueprintBlock]) -> Tuple:
+        if tool is None:
+            return ()
+        # The snapshot of the environment is taken last, when the block has finished
+        return (
+            id(tool),
+            tool.outcome,
+            tool.execution_time_in_seconds,
+            tool.execution_environment_snapshot is not None,
+        )
+
+
 class BlueprintRunner:
     MAX_DAG_DEPTH = 32
+    # Seconds between checks for the cancellation of the request running the blueprint
+    CANCELLATION_CHECK_INTERVAL = 0.5
+
+    # Seconds between the updates of the log of a running blueprint, the final update is always sent
+    LOG_UPDATE_INTERVAL = float(os.getenv("WRITER_BLUEPRINT_LOG_UPDATE_INTERVAL", "0.2"))
+
+    # Event loop running async blocks, owned by the process which started it
+    _async_loop: Optional[asyncio.AbstractEventLoop] = None
+    _async_loop_pid: Optional[int] = None
+    _async_loop_lock = threading.Lock()
 
     def __init__(self, session: writer.core.WriterSession):
         self.session = session
         self.executor_lock = threading.Lock()
+        # Plans and lookups derived from the component tree, valid for its version
+        self._plans: Dict[Tuple, Any] = {}
+        self._plans_version: Optional[Tuple[int, ...]] = None
 
     @property
     def api_blueprints(self):
-        return self._gather_api_blueprints()
+        return self._get_cached(("api_blueprints",), self._gather_api_blueprints)
 
     @contextmanager
     def _get_executor(self):
         """Return the application's thread pool executor.
 
-        In normal operation we reuse the main executor provided by the running
-        application process. In situations where that process is unavailable
-        (for example during tests) a temporary executor is created.
+        In normal operation we reuse the blueprint lane of the running
+        application process, separate from the lanes handling messages.
+        In situations where that process is unavailable (for example during
+        tests) a temporary executor is created.
         """
 
         new_executor = None
@@ -55,33 +214,89 @@ class BlueprintRunner:
             if new_executor:
                 new_executor.shutdown()
 
+    def has_ui_triggers(self, ref_component_id: str, ref_event_type: str) -> bool:
+        """
+        Checks whether any UI trigger refers to the event of the component.
+        """
+        ui_triggers = self._get_cached(("ui_triggers",), self._index_ui_triggers)
+        return (ref_component_id, ref_event_type) in ui_triggers
+
     def execute_ui_trigger(
         self, ref_component_id: str, ref_event_type: str, execution_environment: Dict = {}
     ):
+        ui_triggers = self._get_cached(("ui_triggers",), self._index_ui_triggers)
+        for trigger_id in ui_triggers.get((ref_component_id, ref_event_type), []):
+            self.run_branch(trigger_id, None, execution_environment, "UI trigger execution")
+
+    def _index_ui_triggers(self) -> Dict[Tuple[Any, Any], List[str]]:
+        """
+        Indexes the UI triggers by the component and the event type they refer to.
+        """
         components = self.session.session_component_tree.get_descendents("blueprints_root")
-        ui_triggers = list(filter(lambda c: c.type == "blueprints_uieventtrigger", components))
-        for trigger in ui_triggers:
-            if trigger.content.get("refComponentId") != ref_component_id:
-                continue
-            if trigger.content.get("refEventType") != ref_event_type:
+        ui_triggers: Dict[Tuple[Any, Any], List[str]] = {}
+        for trigger in components:
+            if trigger.type != "blueprints_uieventtrigger":
                 continue
-            self.run_branch(trigger.id, None, execution_environment, "UI trigger execution")
+            ref = (trigger.content.get("refComponentId"), trigger.content.get("refEventType"))
+            ui_triggers.setdefault(ref, []).append(trigger.id)
+        return ui_triggers
 
     def run_blueprint_by_key(self, blueprint_key: str, execution_environment: Dict = {}):
-        all_components = self.session.session_component_tree.components.values()
-        blueprints = list(
-            filter(
-                lambda c: c.type == "blueprints_blueprint" and c.content.get("key") == blueprint_key,
-                all_components,
-            )
-        )
-        if len(blueprints) == 0:
+        blueprint_ids = self._get_cached(("blueprint_keys",), self._index_blueprint_keys)
+        blueprint_id = blueprint_ids.get(blueprint_key)
+        if blueprint_id is None:
             raise ValueError(f'Blueprint with key "{blueprint_key}" not found.')
-        blueprint = blueprints[0]
         return self.run_blueprint(
-            blueprint.id, execution_environment, f"Blueprint execution ({blueprint_key})"
+            blueprint_id, execution_environment, f"Blueprint execution ({blueprint_key})"
         )
 
+    def _index_blueprint_keys(self) -> Dict[Any, str]:
+        """
+        Indexes the blueprints by key, the first blueprint taking precedence.
+        """
+        blueprint_ids: Dict[Any, str] = {}
+        for component in self.session.session_component_tree.components.values():
+            if component.type == "blueprints_blueprint":
+                blueprint_ids.setdefault(component.content.get("key"), component.id)
+        return blueprint_ids
+
+    def _get_cached(self, key: Tuple, build: Callable[[], Any]) -> Any:
+        """
+        Returns the value cached for the key, building it if the component
+        tree has been modified since it was cached, e.g. by a componentUpdate.
+        """
+        version = self.session.session_component_tree.version
+        plans = self._plans
+        if self._plans_version != version:
+            plans = {}
+            self._plans = plans
+            self._plans_version = version
+        if key not in plans:
+            plans[key] = build()
+        return plans[key]
+
+    def get_blueprint_plan(self, component_id: str) -> BlueprintPlan:
+        """
+        Returns the execution plan of the blueprint containing the component.
+        """
+        return self._get_cached(
+            ("blueprint", component_id),
+            lambda: BlueprintPlan.build(self._get_blueprint_nodes(component_id)),
+        )
+
+    def get_branch_plan(self, start_node_id: str, branch_out_id: Optional[str]) -> BlueprintPlan:
+        """
+        Returns the execution plan of the branch starting at the node, or at
+        the given outcome of the node.
+        """
+
+        def build():
+            blueprint_nodes = self._get_blueprint_nodes(start_node_id)
+            nodes = self.filter_branch(blueprint_nodes, start_node_id, branch_out_id)
+            return BlueprintPlan.build(nodes)
+
+        return self._get_cached(("branch", start_node_id, branch_out_id), build)
+
     def is_blueprint_api_available(
         self, blueprint_key: str
     ):
@@ -173,20 +388,75 @@ class BlueprintRunner:
         :return: A list of results in the same order as execution_environments.
         """
 
-        with self._get_executor() as executor:
-            futures = [
-                executor.submit(self.run_blueprint_by_key, blueprint_key, env)
-                for env in execution_environments
-            ]
+        return self._run_pool(
+            lambda env: self.run_blueprint_by_key(blueprint_key, env), execution_environments
+        )
 
-        wait(futures)  # Important to preserve order, don't switch to as_completed
+    def _run_pool(
+        self,
+        fn: Callable[[Dict], Any],
+        execution_environments: List[Dict],
+        max_concurrency: Optional[int] = None,
+        chunk_size: int = 1,
+    ) -> List:
+        """
+        Calls the function for each execution environment, in parallel, and
+        returns the results in the same order. If any call fails, the exception
+        of the first failed call is raised once all calls have finished.
+
+        The environments are split in chunks of chunk_size, run by at most
+        max_concurrency tasks. The calling thread takes part in running the
+        tasks, so that nested pools can't exhaust the executor.
+        """
+
+        chunk_size = max(1, chunk_size)
+        chunks = [
+            range(i, min(i + chunk_size, len(execution_environments)))
+            for i in range(0, len(execution_environments), chunk_size)
+        ]
+        task_count = len(chunks) if not max_concurrency else min(max_concurrency, len(chunks))
+        pending_chunks = iter(chunks)
+        pending_lock = threading.Lock()
+        outcomes: List[Tuple[bool, Any]] = [(True, None)] * len(execution_environments)
+
+        def run_chunks():
+            while True:
+                with pending_lock:
+                    chunk = next(pending_chunks, None)
+                if chunk is None:
+                    return
+                for i in chunk:
+                    try:
+                        outcomes[i] = (True, fn(execution_environments[i]))
+                    except BaseException as e:
+                        outcomes[i] = (False, e)
+
+        with self._get_executor() as executor:
+            tasks = [self._submit_task(executor, run_chunks) for _ in range(task_count)]
+            self._help_with_tasks(tasks)
+            wait([task.future for task in tasks])
 
         results = []
-        for future in futures:
-            results.append(future.result())
+        for is_ok, value in outcomes:
+            if not is_ok:
+                raise value
+            results.append(value)
 
         return results
 
+    def _submit_task(self, executor: ThreadPoolExecutor, fn: Callable, *args) -> "_HelpableTask":
+        task = _HelpableTask(copy_context().run, fn, *args)
+        executor.submit(task.run)
+        return task
+
+    def _help_with_tasks(self, tasks: Iterable["_HelpableTask"]):
+        """
+        Runs in the calling thread the tasks which haven't been started by a
+        worker yet. Threads waiting for tasks then only wait for running ones.
+        """
+        for task in tasks:
+            task.run()
+
     def _get_blueprint_nodes(self, component_id):
         current_node_id = component_id
         while current_node_id is not None:
@@ -204,36 +474,37 @@ class BlueprintRunner:
         execution_environment: Dict,
         title: str = "Branch execution",
     ):
-        blueprint_nodes = self._get_blueprint_nodes(start_node_id)
-        nodes = self.filter_branch(blueprint_nodes, start_node_id, branch_out_id)
-        return self.execute_dag(nodes, execution_environment, title)
+        plan = self.get_branch_plan(start_node_id, branch_out_id)
+        return self.execute_plan(plan, execution_environment, title)
 
     def run_branch_pool(
-        self, base_component_id: str, base_outcome: str, execution_environments: List[Dict]
+        self,
+        base_component_id: str,
+        base_outcome: str,
+        execution_environments: List[Dict],
+        max_concurrency: Optional[int] = None,
+        chunk_size: int = 1,
     ):
         """
         Executes the same branch multiple times in parallel with different execution environments.
-        """
-
-        with self._get_executor() as executor:
-            futures = [
-                executor.submit(self.run_branch, base_component_id, base_outcome, env)
-                for env in execution_environments
-            ]
-
-        wait(futures)  # Important to preserve order, don't switch to as_completed
 
-        results = []
-        for future in futures:
-            results.append(future.result())
+        :param max_concurrency: The maximum number of executions running at once, unlimited if None.
+        :param chunk_size: The number of executions run in sequence by each task.
+        :return: A list of results in the same order as execution_environments.
+        """
 
-        return results
+        return self._run_pool(
+            lambda env: self.run_branch(base_component_id, base_outcome, env),
+            execution_environments,
+            max_concurrency,
+            chunk_size,
+        )
 
     def run_blueprint(
         self, component_id: str, execution_environment: Dict, title="Blueprint execution"
     ):
-        nodes = self._get_blueprint_nodes(component_id)
-        return self.execute_dag(nodes, execution_environment, title)
+        plan = self.get_blueprint_plan(component_id)
+        return self.execute_plan(plan, execution_environment, title)
 
     def _generate_run_id(self):
         timestamp = str(int(time.time() * 1000))
@@ -242,71 +513,58 @@ class BlueprintRunner:
         hashed_id = hashlib.sha256(raw_id.encode()).hexdigest()[:24]
         return hashed_id
 
-    def _summarize_data_for_log(self, data):
-        """Convert arbitrary data into a log friendly representation."""
+    def _summarize_data_for_log(self, data, depth: int = 0):
+        """Convert arbitrary data into a bounded, log friendly representation."""
 
         if data is None:
             return None
 
         MAX_ROWS = 100
-        if isinstance(data, list):
-            return [self._summarize_data_for_log(item) for item in data[:MAX_ROWS]]
+        MAX_STRING_LENGTH = 5000
+        MAX_DEPTH = 10
+        if isinstance(data, str):
+            if len(data) > MAX_STRING_LENGTH:
+                return data[:MAX_STRING_LENGTH] + "..."
+            return data
+        if isinstance(data, (int, float, bool)):
+            return data
+        if depth >= MAX_DEPTH:
+            return "Can't be displayed in the log. Value nested too deeply."
+        if isinstance(data, (list, tuple)):
+            return [self._summarize_data_for_log(item, depth + 1) for item in data[:MAX_ROWS]]
         if isinstance(data, dict):
             return {
-                k: self._summarize_data_for_log(v)
-                for i, (k, v) in enumerate(data.items())
-                if i < MAX_ROWS
+                k: self._summarize_data_for_log(v, depth + 1)
+                for k, v in itertools.islice(data.items(), MAX_ROWS)
             }
-        if isinstance(data, (str, int, float, bool, type(None))):
-            return data
 
         try:
             return json.loads(json.dumps(data))
-        except (TypeError, OverflowError):
+        except (TypeError, OverflowError, ValueError):
             return f"Can't be displayed in the log. Value of type: {str(type(data))}."
 
-    def _generate_run_log(
-        self,
-        tools: OrderedDict[str, Optional[writer.blocks.base_block.BlueprintBlock]],
-        title: str,
-        entry_type: Literal["info", "error"],
-        msg: str = "",
-        run_id: Optional[str] = None,
-    ):
-        if not writer.core.Config.is_mail_enabled_for_log:
-            return
-        if run_id is None:
-            run_id = self._generate_run_id()
-        exec_log: BlueprintExecutionLog = BlueprintExecutionLog(summary=[])
-        for component_id, tool in tools.items():
-            if tool is None:
-                exec_log.summary.append({"componentId": component_id})
-                continue
-            if tool.outcome == "in_progress":
-                exec_log.summary.append(
-                    {
-                        "componentId": component_id,
-                        "outcome": tool.outcome,
-                        "message": tool.message,
-                        "executionTimeInSeconds": tool.execution_time_in_seconds,
-                    }
-                )
-                continue
+    def _summarize_tool(
+        self, component_id: str, tool: Optional[writer.blocks.base_block.BlueprintBlock]
+    ) -> Dict:
+        if tool is None:
+            return {"componentId": component_id}
+        if tool.outcome == "in_progress":
+            return {
+                "componentId": component_id,
+                "outcome": tool.outcome,
+                "message": tool.message,
+                "executionTimeInSeconds": tool.execution_time_in_seconds,
+            }
 
-            exec_log.summary.append(
-                {
-                    "componentId": component_id,
-                    "outcome": tool.outcome,
-                    "message": tool.message,
-                    "result": self._summarize_data_for_log(tool.result),
-                    "returnValue": self._summarize_data_for_log(tool.return_value),
-                    "executionEnvironment": self._summarize_data_for_log(getattr(tool, "execution_environment_snapshot", None)),
-                    "executionTimeInSeconds": tool.execution_time_in_seconds,
-                }
-            )
-        self.session.session_state.add_log_entry(
-            entry_type, title, msg, blueprint_execution=exec_log, id=run_id
-        )
+        return {
+            "componentId": component_id,
+            "outcome": tool.outcome,
+            "message": tool.message,
+            "result": self._summarize_data_for_log(tool.result),
+            "returnValue": self._summarize_data_for_log(tool.return_value),
+            "executionEnvironment": self._summarize_data_for_log(getattr(tool, "execution_environment_snapshot", None)),
+            "executionTimeInSeconds": tool.execution_time_in_seconds,
+        }
 
     def filter_branch(
         self,
@@ -348,22 +606,22 @@ class BlueprintRunner:
         nodes: List[writer.core_ui.Component],
         execution_environment: Dict,
         title: str = "Blueprint execution",
+    ):
+        return self.execute_plan(BlueprintPlan.build(nodes), execution_environment, title)
+
+    def execute_plan(
+        self,
+        plan: "BlueprintPlan",
+        execution_environment: Dict,
+        title: str = "Blueprint execution",
     ):
         run_id = self._generate_run_id()
-        tools: OrderedDict[str, Optional[writer.blocks.base_block.BlueprintBlock]] = OrderedDict()
-        graph = {}
-        in_degree = {node.id: 0 for node in nodes}
+        tools: OrderedDict[str, Optional[writer.blocks.base_block.BlueprintBlock]] = OrderedDict.fromkeys(plan.node_ids)
+        graph = plan.graph
+        inputs = plan.inputs
+        in_degree = dict(plan.in_degree)
         is_cancelled = False
 
-        inputs: Dict[str, List] = {}
-        for node in nodes:
-            outs = node.outs or []
-            for out in outs:
-                to_node_id = out.get("toNodeId")
-                if to_node_id not in inputs:
-                    inputs[to_node_id] = []
-                inputs[to_node_id].append({"nodeId": node.id, "outId": out.get("outId")})
-
         def check_requirements(tool):
             if is_cancelled:
                 return False
@@ -371,37 +629,31 @@ class BlueprintRunner:
             if node_id not in inputs:
                 return True
             at_least_one = False
-            for input in inputs[node_id]:
-                in_tool = tools.get(input.get("nodeId"))
+            for from_node_id, out_id in inputs[node_id]:
+                in_tool = tools.get(from_node_id)
                 if not in_tool:
                     continue
-                if in_tool.outcome != input.get("outId"):
+                if in_tool.outcome != out_id:
                     continue
                 at_least_one = True
 
             return at_least_one
 
-        def update_log(message: str, entry_type="info"):
-            self._generate_run_log(tools, title, entry_type, msg=message, run_id=run_id)
+        run_log = _RunLog(self, tools, title, run_id)
 
-        for node in nodes:
-            graph[node.id] = node
-            tools[node.id] = None
-            out_node_ids = {out.get("toNodeId") for out in (node.outs or [])}
-            for node_id in out_node_ids:
-                in_degree[node_id] += 1
+        def update_log(message: str, entry_type="info", is_final=False):
+            run_log.update(message, entry_type, is_final)
 
         ready: deque = deque()
-        for node in nodes:
-            if in_degree[node.id] > 0:
-                continue
-            tool = self._get_tool(node, execution_environment)
+        for node_id in plan.root_ids:
+            tool = self._get_tool(graph[node_id], execution_environment, plan.block_classes[node_id])
             ready.append(tool)
-            tools.move_to_end(node.id)
-            tools[node.id] = tool
+            tools.move_to_end(node_id)
+            tools[node_id] = tool
 
         with self._get_executor() as executor:
             futures: set[Future] = set()
+            tasks: deque = deque()
             first_exception: Optional[BaseException] = None
             while ready or futures:
                 while ready:
@@ -409,12 +661,22 @@ class BlueprintRunner:
                     if not check_requirements(tool):
                         break
                     tool.outcome = "in_progress"
-                    ctx = copy_context()
-                    future = executor.submit(ctx.run, self.run_tool, tool)
-                    futures.add(future)
+                    if tool.is_async:
+                        futures.add(self._submit_async_tool(tool))
+                    else:
+                        task = self._submit_task(executor, self.run_tool, tool)
+                        futures.add(task.future)
+                        tasks.append(task)
 
                 update_log("Executing...")
-                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                done = self._wait_for_blocks(futures, tasks)
+                if done is None:
+                    # Running blocks are left to finish, they can check is_request_cancelled()
+                    # Blocks not started yet are dropped and async blocks are cancelled
+                    for future in futures:
+                        future.cancel()
+                    update_log("Execution cancelled.", entry_type="error", is_final=True)
+                    raise BlueprintExecutionError("Blueprint execution was cancelled by the caller.")
                 for future in done:
                     futures.remove(future)
                     try:
@@ -427,11 +689,10 @@ class BlueprintRunner:
                     else:
                         update_log("Executing...")
                     if tool.return_value is not None:
+                        update_log("Execution completed.", is_final=True)
                         return tool.return_value
                     node = tool.component
-                    for out in node.outs or []:
-                        to_node_id = out.get("toNodeId")
-                        out_id = out.get("outId")
+                    for to_node_id, out_id in plan.outputs[node.id]:
                         in_degree[to_node_id] -= 1
                         if tool.outcome != out_id:
                             continue
@@ -449,12 +710,14 @@ class BlueprintRunner:
                             to_node = graph.get(to_node_id)
                             if not to_node:
                                 continue
-                            to_tool = self._get_tool(to_node, expanded_environment)
+                            to_tool = self._get_tool(
+                                to_node, expanded_environment, plan.block_classes[to_node_id]
+                            )
                             tools.move_to_end(to_node_id)
                             tools[to_node_id] = to_tool
                             ready.append(to_tool)
             if is_cancelled:
-                update_log("Execution failed.", entry_type="error")
+                update_log("Execution failed.", entry_type="error", is_final=True)
                 if first_exception is not None:
                     raise BlueprintExecutionError(
                         f"Blueprint execution was cancelled due to an error - {first_exception.__class__.__name__}: {first_exception}"
@@ -462,10 +725,70 @@ class BlueprintRunner:
                 else:
                     raise BlueprintExecutionError("Blueprint execution was cancelled.")
             else:
-                update_log("Execution completed.")
+                update_log("Execution completed.", is_final=True)
+
+    def _submit_async_tool(self, tool: writer.blocks.base_block.BlueprintBlock) -> Future:
+        # The coroutine runs on the async loop, in a copy of the current context
+        return asyncio.run_coroutine_threadsafe(
+            self.run_tool_async(tool), BlueprintRunner.get_async_loop()
+        )
+
+    @classmethod
+    def get_async_loop(cls) -> asyncio.AbstractEventLoop:
+        """
+        Returns the event loop running async blocks, shared by all the runners
+        of the process. It's started on first use, in a daemon thread.
+        """
+        with cls._async_loop_lock:
+            loop = cls._async_loop
+            if loop is None or cls._async_loop_pid != os.getpid() or loop.is_closed():
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="blueprints-async-loop", daemon=True
+                ).start()
+                cls._async_loop = loop
+                cls._async_loop_pid = os.getpid()
+            return loop
+
+    def _wait_for_blocks(
+        self, futures: set[Future], tasks: Optional[deque] = None
+    ) -> Optional[set[Future]]:
+        """
+        Waits for at least one block to finish. Returns None if the request
+        running the blueprint is cancelled in the meantime.
+
+        While no block has finished, the waiting thread runs the submitted
+        tasks which no worker has started yet, one at a time, returning as
+        soon as one is done so that the caller can schedule the next blocks.
+        """
+
+        if not futures:
+            return set()
+        while True:
+            if writer.core.is_request_cancelled():
+                return None
+            done = {future for future in futures if future.done()}
+            if done:
+                return done
+            if tasks:
+                tasks.popleft().run()
+                continue
+            done, _ = wait(
+                futures,
+                timeout=BlueprintRunner.CANCELLATION_CHECK_INTERVAL,
+                return_when=FIRST_COMPLETED,
+            )
+            if done:
+                return done
 
-    def _get_tool(self, node: writer.core_ui.Component, execution_environment: Dict):
-        tool_class = writer.blocks.base_block.block_map.get(node.type)
+    def _get_tool(
+        self,
+        node: writer.core_ui.Component,
+        execution_environment: Dict,
+        tool_class: Optional[Type[writer.blocks.base_block.BlueprintBlock]] = None,
+    ):
+        if tool_class is None:
+            tool_class = writer.blocks.base_block.block_map.get(node.type)
         if not tool_class:
             raise RuntimeError(f'Could not find tool for "{node.type}".')
         tool = tool_class(node, self, execution_environment)
@@ -481,7 +804,29 @@ class BlueprintRunner:
 
     def run_tool(self, tool: writer.blocks.base_block.BlueprintBlock):
         start_time = time.time()
+        self._start_tool(tool)
+        try:
+            tool.run()
+        except BaseException as e:
+            return self._handle_tool_error(tool, e)
+        finally:
+            self._end_tool(tool, start_time)
+
+        return tool
+
+    async def run_tool_async(self, tool: writer.blocks.base_block.BlueprintBlock):
+        start_time = time.time()
+        self._start_tool(tool)
+        try:
+            await tool.run_async()
+        except BaseException as e:
+            return self._handle_tool_error(tool, e)
+        finally:
+            self._end_tool(tool, start_time)
 
+        return tool
+
+    def _start_tool(self, tool: writer.blocks.base_block.BlueprintBlock):
         call_stack = tool.execution_environment.get("call_stack", []) + [tool.component.id]
         call_depth = call_stack.count(tool.component.id)
         if call_depth > BlueprintRunner.MAX_DAG_DEPTH:
@@ -492,28 +837,30 @@ class BlueprintRunner:
         tool.execution_environment["call_stack"] = call_stack
         tool.execution_environment["trace"] = []
 
-        try:
-            tool.run()
-        except BaseException as e:
-            if not tool.outcome or tool.outcome == "in_progress":
-                tool.outcome = "error"
-            if self._is_outcome_managed(tool.component, tool.outcome):
-                return tool
-            if isinstance(e, WriterConfigurationError):
-                tool.message = str(e)
-            else:
-                tool.message = tool.message or repr(e)
-            raise e
-        finally:
-            tool.execution_time_in_seconds = time.time() - start_time
-            try:
-                tool.execution_environment_snapshot = {
-                    k: v for k, v in tool.execution_environment.items() if k != "vault"
-                }
-            except Exception:
-                # pragma: no cover - best effort defensive code
-                logging.debug(
-                    "Couldn't snapshot execution environment", exc_info=True
-                )
+        if writer.core.is_request_cancelled():
+            tool.outcome = "error"
+            tool.message = "Blueprint execution was cancelled by the caller."
+            raise BlueprintExecutionError(tool.message)
 
-        return tool
+    def _handle_tool_error(self, tool: writer.blocks.base_block.BlueprintBlock, e: BaseException):
+        if not tool.outcome or tool.outcome == "in_progress":
+            tool.outcome = "error"
+        if self._is_outcome_managed(tool.component, tool.outcome):
+            return tool
+        if isinstance(e, WriterConfigurationError):
+            tool.message = str(e)
+        else:
+            tool.message = tool.message or repr(e)
+        raise e
+
+    def _end_tool(self, tool: writer.blocks.base_block.BlueprintBlock, start_time: float):
+        tool.execution_time_in_seconds = time.time() - start_time
+        try:
+            tool.execution_environment_snapshot = {
+                k: v for k, v in tool.execution_environment.items() if k != "vault"
+            }
+        except Exception:
+            # pragma: no cover - best effort defensive code
+            logging.debug(
+                "Couldn't snapshot execution environment", exc_info=True
+            )
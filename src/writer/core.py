@@ -5,18 +5,23 @@ import copy
 import dataclasses
 import datetime
 import functools
+import hashlib
 import inspect
 import io
+import json
 import logging
 import math
 import multiprocessing
 import numbers
+import os
 import re
 import secrets
+import threading
 import time
 import traceback
 import typing
 import urllib.request
+from collections import OrderedDict
 from contextvars import ContextVar
 from multiprocessing.process import BaseProcess
 from types import ModuleType
@@ -27,11 +32,13 @@ from typing import (
     Callable,
     Dict,
     Generator,
+    Iterable,
     List,
     Literal,
     Optional,
     Sequence,
     Set,
+    SupportsIndex,
     Tuple,
     Type,
     TypedDict,
@@ -70,13 +77,18 @@ if TYPE_CHECKING:
 class CurrentRequest:
     session_id: str
     request: "AppProcessServerRequest"
+    cancel_event: Optional[threading.Event] = None
 
 
 _current_request: ContextVar[Optional[CurrentRequest]] = ContextVar("current_request", default=None)
 
 
 @contextlib.contextmanager
-def use_request_context(session_id: str, request: "AppProcessServerRequest"):
+def use_request_context(
+    session_id: str,
+    request: "AppProcessServerRequest",
+    cancel_event: Optional[threading.Event] = None,
+):
     """
     Context manager to set the current request context.
 
@@ -86,12 +98,25 @@ def use_request_context(session_id: str, request: "AppProcessServerRequest"):
     >>>     pass
     """
     try:
-        _current_request.set(CurrentRequest(session_id, request))
+        _current_request.set(CurrentRequest(session_id, request, cancel_event))
         yield
     finally:
         _current_request.set(None)
 
 
+def is_request_cancelled() -> bool:
+    """
+    Whether the request being handled has been abandoned by the web server,
+    e.g. because the websocket disconnected or the request timed out.
+
+    Long-running handlers and blocks can check it to stop cooperatively.
+    """
+    req = _current_request.get()
+    if req is None or req.cancel_event is None:
+        return False
+    return req.cancel_event.is_set()
+
+
 def get_app_process() -> "AppProcess":
     """
     Retrieves the Writer Framework process context.
@@ -137,6 +162,8 @@ def import_failure(rvalue: Any = None):
 
 class Config:
     is_mail_enabled_for_log: bool = False
+    # Sends structural patches instead of whole values when state values change slightly
+    is_state_diff_enabled: bool = False
     mode: ServeMode = "run"
     logger: Optional[logging.Logger] = None
     feature_flags: list[str] = []
@@ -160,6 +187,8 @@ class WriterSession:
         self.session_component_tree = core_ui.build_session_component_tree(base_component_tree)
         self.event_handler = EventHandler(self)
         self.userinfo: Optional[dict] = None
+        # Held while mutations are collected, and until pushed mutations are sent
+        self.mutations_lock = threading.RLock()
 
     def update_last_active_timestamp(self) -> None:
         self.last_active_timestamp = int(time.time())
@@ -268,6 +297,15 @@ class FileWrapper:
         else:
             raise ValueError("Invalid file.")
 
+    def get_as_bytes(self) -> bytes:
+        if isinstance(self.file, str):
+            with open(self.file, "rb") as f_stream:
+                return f_stream.read()
+        elif callable(getattr(self.file, "read", None)):
+            return self.file.read()
+        else:
+            raise ValueError("Invalid file.")
+
 
 class BytesWrapper:
     """
@@ -285,23 +323,116 @@ class BytesWrapper:
         durl = f"data:{self.mime_type if self.mime_type is not None else ''};base64,{ b64_data }"
         return durl
 
+    def get_as_bytes(self) -> bytes:
+        return bytes(self.raw_data)
+
+
+class BinaryPayload:
+    """
+    Binary data produced by the serialiser instead of a data URL, when binary
+    payloads are enabled. The web server sends it as a binary websocket frame,
+    referenced from the JSON message, which spares the base64 encoding.
+    """
+
+    def __init__(self, data: bytes, mime_type: Optional[str] = None):
+        self.data = data
+        self.mime_type = mime_type
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __eq__(self, other: Any) -> bool:
+        return (
+            isinstance(other, BinaryPayload)
+            and self.mime_type == other.mime_type
+            and self.data == other.data
+        )
+
+    def __repr__(self) -> str:
+        return f"<BinaryPayload {self.mime_type} ({len(self.data)} bytes)>"
+
+    def get_as_dataurl(self) -> str:
+        return BytesWrapper(self.data, self.mime_type).get_as_dataurl()
+
+
+_binary_payloads_enabled: ContextVar[bool] = ContextVar("binary_payloads_enabled", default=False)
+
+
+@contextlib.contextmanager
+def use_binary_payloads():
+    """
+    Makes the state serialiser produce BinaryPayload instances rather than
+    data URLs, for values serialised within the context.
+
+    >>> with use_binary_payloads():
+    >>>     mutations = state.user_state.get_mutations_as_dict()
+    """
+    token = _binary_payloads_enabled.set(True)
+    try:
+        yield
+    finally:
+        _binary_payloads_enabled.reset(token)
+
 
 class StateSerialiserException(ValueError):
     pass
 
 
+class SerialisationCache:
+    """
+    Keeps the serialised form of heavy values, such as dataframes, keyed on a
+    fingerprint of their content. Sessions cloned from the initial state
+    hold equal copies, which are therefore only serialised once.
+
+    The least recently used entries are evicted when the total length of
+    the serialised values exceeds MAX_SIZE.
+    """
+
+    MAX_SIZE = int(os.getenv("WRITER_SERIALISATION_CACHE_SIZE", str(64 * 1024 * 1024)))
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = max_size if max_size is not None else SerialisationCache.MAX_SIZE
+        self.size = 0
+        self.entries: OrderedDict[str, Union[str, BinaryPayload]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Union[str, BinaryPayload]]:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Union[str, BinaryPayload]) -> None:
+        if len(value) > self.max_size:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_size:
+                (_, evicted_value) = self.entries.popitem(last=False)
+                self.size -= len(evicted_value)
+
+
 class StateSerialiser:
     """
     Serialises user state values before sending them to the front end.
     Provides JSON-compatible values, including data URLs for binary data.
     """
 
-    def serialise(self, v: Any) -> Union[Dict, List, str, bool, int, float, None]:
+    def __init__(self):
+        self.cache = SerialisationCache()
+
+    def serialise(self, v: Any) -> Union[Dict, List, str, bool, int, float, BinaryPayload, None]:
         from writer.ai import Conversation
-        from writer.core_df import EditableDataFrame
+        from writer.core_df import EditableDataFrame, WindowedDataFrame
 
         if isinstance(v, State):
             return self._serialise_dict_recursively(v.to_dict())
+        if isinstance(v, _SharedValue):
+            return self.serialise(v.value)
         if isinstance(v, Conversation):
             return v.serialized_messages
         if isinstance(v, (FileWrapper, BytesWrapper)):
@@ -316,9 +447,17 @@ class StateSerialiser:
             return self._serialise_list_recursively(v)
         if isinstance(v, (str, bool)):
             return v
+        if isinstance(v, WindowedDataFrame):
+            return v.to_dict()
         if isinstance(v, EditableDataFrame):
             table = v.pyarrow_table()
-            return self._serialise_pyarrow_table(table)
+            return {
+                "type": "editableDataframe",
+                "table": self._serialise_cached(table, self._fingerprint_pyarrow_table, self._serialise_pyarrow_table),
+                # Row deltas numbered up to the version are included in the table
+                "version": v.version,
+                "deltas": [],
+            }
         if v is None:
             return v
 
@@ -335,7 +474,7 @@ class StateSerialiser:
             return v
 
         if "pandas.core.frame.DataFrame" in v_mro:
-            return self._serialise_pandas_dataframe(v)
+            return self._serialise_cached(v, self._fingerprint_pandas_dataframe, self._serialise_pandas_dataframe)
         if hasattr(v, "__dataframe__"):
             return self._serialize_dataframe(v)
 
@@ -348,7 +487,7 @@ class StateSerialiser:
         if "numpy.ndarray" in v_mro:
             return self._serialise_list_recursively(v.tolist())
         if "pyarrow.lib.Table" in v_mro:
-            return self._serialise_pyarrow_table(v)
+            return self._serialise_cached(v, self._fingerprint_pyarrow_table, self._serialise_pyarrow_table)
 
         if hasattr(v, "to_dict") and callable(v.to_dict):
             # Covers Altair charts, Plotly graphs
@@ -364,10 +503,12 @@ class StateSerialiser:
     def _serialise_list_recursively(self, l: List) -> List:  # noqa: E741
         return [self.serialise(v) for v in l]
 
-    def _serialise_ss_wrapper(self, v: Union[FileWrapper, BytesWrapper]) -> str:
+    def _serialise_ss_wrapper(self, v: Union[FileWrapper, BytesWrapper]) -> Union[str, BinaryPayload]:
+        if _binary_payloads_enabled.get():
+            return BinaryPayload(v.get_as_bytes(), v.mime_type)
         return v.get_as_dataurl()
 
-    def _serialise_matplotlib_fig(self, fig) -> str:
+    def _serialise_matplotlib_fig(self, fig) -> Union[str, BinaryPayload]:
         # It's safe to import matplotlib here without listing it as a dependency.
         # If this method is called, it's because a matplotlib figure existed.
         # Note: matplotlib type needs to be ignored since it doesn't provide types
@@ -377,9 +518,9 @@ class StateSerialiser:
         fig.savefig(iobytes, format="png")
         iobytes.seek(0)
         plt.close(fig)
-        return FileWrapper(iobytes, "image/png").get_as_dataurl()
+        return self._serialise_ss_wrapper(FileWrapper(iobytes, "image/png"))
 
-    def _serialize_dataframe(self, df) -> str:
+    def _serialize_dataframe(self, df) -> Union[str, BinaryPayload]:
         """
         Serialize a dataframe with pyarrow a dataframe that implements
         the Dataframe Interchange Protocol i.e. the __dataframe__() method
@@ -390,7 +531,49 @@ class StateSerialiser:
         import pyarrow.interchange  # type: ignore
 
         table = pyarrow.interchange.from_dataframe(df)
-        return self._serialise_pyarrow_table(table)
+        return self._serialise_cached(table, self._fingerprint_pyarrow_table, self._serialise_pyarrow_table)
+
+    def _serialise_cached(
+        self, v: Any, fingerprint: Callable[[Any], str], serialise: Callable[[Any], Any]
+    ) -> Union[str, BinaryPayload]:
+        """
+        Serialises the value, reusing a previous result if a value
+        with the same fingerprint has already been serialised.
+        """
+
+        try:
+            key = f"{'binary' if _binary_payloads_enabled.get() else 'dataurl'}:{fingerprint(v)}"
+        except BaseException:
+            # Not hashable, e.g. object columns holding lists
+            return serialise(v)
+        serialised_value = self.cache.get(key)
+        if serialised_value is None:
+            serialised_value = serialise(v)
+            self.cache.put(key, serialised_value)
+        return serialised_value
+
+    def _fingerprint_pandas_dataframe(self, df) -> str:
+        import pandas  # type: ignore
+
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(repr((list(df.columns), df.dtypes.tolist(), df.index.names)).encode())
+        digest.update(pandas.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        return f"pandas:{digest.hexdigest()}"
+
+    def _fingerprint_pyarrow_table(self, table) -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(table.schema.to_string(show_schema_metadata=True).encode())
+        for column in table.columns:
+            for chunk in column.chunks:
+                self._update_digest_with_array(digest, chunk)
+        return f"arrow:{digest.hexdigest()}"
+
+    def _update_digest_with_array(self, digest, array) -> None:
+        digest.update(f"{array.offset}:{len(array)};".encode())
+        for buffer in array.buffers():
+            digest.update(b"-" if buffer is None else buffer)
+        if pyarrow.types.is_dictionary(array.type):
+            self._update_digest_with_array(digest, array.dictionary)
 
     def _serialise_pandas_dataframe(self, df):
         import pyarrow as pa  # type: ignore
@@ -444,6 +627,14 @@ class MutableValue:
         """
         self._mutated = True
 
+    def get_patch(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the operations to apply to the value last sent to the front end,
+        or None if the value must be sent whole.
+        :return:
+        """
+        return None
+
     def reset_mutation(self) -> None:
         """
         Resets the mutation flag to False.
@@ -452,17 +643,326 @@ class MutableValue:
         self._mutated = False
 
 
+class MutableList(list, MutableValue):
+    """
+    List followed by the state. In-place changes are recorded as operations,
+    which are sent to the front end instead of the whole list.
+
+    Plain lists assigned to the state are kept as they are, so that
+    references held elsewhere stay valid; assign a MutableList to opt in.
+
+    >>> state["items"] = MutableList(["a"])
+    >>> state["items"].append("b")  # Sends only the appended item
+    """
+
+    def __init__(self, iterable=()):
+        list.__init__(self, iterable)
+        MutableValue.__init__(self)
+        self._operations: List[Dict[str, Any]] = []
+        self._is_replaced = False
+
+    def __copy__(self) -> "MutableList":
+        return MutableList(self)
+
+    def __deepcopy__(self, memo) -> "MutableList":
+        return MutableList(copy.deepcopy(list(self), memo))
+
+    def __reduce_ex__(self, protocol):
+        return (MutableList, (list(self),))
+
+    def _normalise_index(self, index: int) -> int:
+        return index + len(self) if index < 0 else index
+
+    def _splice(self, start: int, delete_count: int, values: List) -> None:
+        self._operations.append(
+            {"op": "splice", "path": [], "start": start, "deleteCount": delete_count, "values": values}
+        )
+        self.mutate()
+
+    def _replace(self) -> None:
+        self._is_replaced = True
+        self._operations = []
+        self.mutate()
+
+    def append(self, value: Any) -> None:
+        self._splice(len(self), 0, [value])
+        list.append(self, value)
+
+    def extend(self, values) -> None:
+        values = list(values)
+        self._splice(len(self), 0, values)
+        list.extend(self, values)
+
+    def __add__(self, values: List[Any]) -> List[Any]:
+        return list.__add__(self, values)
+
+    def __iadd__(self, values: Iterable[Any]) -> "MutableList":
+        self.extend(values)
+        return self
+
+    def insert(self, index, value: Any) -> None:
+        position = min(max(self._normalise_index(index), 0), len(self))
+        list.insert(self, index, value)
+        self._splice(position, 0, [value])
+
+    def pop(self, index=-1) -> Any:
+        position = self._normalise_index(index)
+        value = list.pop(self, index)
+        self._splice(position, 1, [])
+        return value
+
+    def remove(self, value: Any) -> None:
+        position = self.index(value)
+        list.remove(self, value)
+        self._splice(position, 1, [])
+
+    def __setitem__(self, index, value) -> None:
+        list.__setitem__(self, index, value)
+        if isinstance(index, slice):
+            self._replace()
+            return
+        self._operations.append(
+            {"op": "set", "path": [self._normalise_index(index)], "value": value}
+        )
+        self.mutate()
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice):
+            list.__delitem__(self, index)
+            self._replace()
+            return
+        position = self._normalise_index(index)
+        list.__delitem__(self, index)
+        self._splice(position, 1, [])
+
+    def __imul__(self, times: SupportsIndex) -> "MutableList":
+        list.__imul__(self, times)
+        self._replace()
+        return self
+
+    def clear(self) -> None:
+        list.clear(self)
+        self._replace()
+
+    def sort(self, *args, **kwargs) -> None:
+        list.sort(self, *args, **kwargs)
+        self._replace()
+
+    def reverse(self) -> None:
+        list.reverse(self)
+        self._replace()
+
+    def get_patch(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the serialised operations recorded since the last reset,
+        or None if sending the whole list is preferable.
+        """
+
+        if self._is_replaced or len(self._operations) > max(len(self), 1):
+            return None
+        return [_serialise_operation(operation) for operation in self._operations]
+
+    def reset_mutation(self) -> None:
+        super().reset_mutation()
+        self._operations = []
+        self._is_replaced = False
+
+
+class MutableDict(dict, MutableValue):
+    """
+    Dictionary followed by the state. In-place changes are recorded as operations,
+    which are sent to the front end instead of the whole dictionary.
+
+    Useful for dictionaries which aren't turned into nested states,
+    e.g. because the schema expects a dict.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        MutableValue.__init__(self)
+        self._operations: List[Dict[str, Any]] = []
+        self._is_replaced = False
+
+    def __copy__(self) -> "MutableDict":
+        return MutableDict(self)
+
+    def __deepcopy__(self, memo) -> "MutableDict":
+        return MutableDict(copy.deepcopy(dict(self), memo))
+
+    def __reduce_ex__(self, protocol):
+        return (MutableDict, (dict(self),))
+
+    def _replace(self) -> None:
+        self._is_replaced = True
+        self._operations = []
+        self.mutate()
+
+    def __setitem__(self, key, value) -> None:
+        dict.__setitem__(self, key, value)
+        self._operations.append({"op": "set", "path": [str(key)], "value": value})
+        self.mutate()
+
+    def __delitem__(self, key) -> None:
+        dict.__delitem__(self, key)
+        self._operations.append({"op": "delete", "path": [str(key)]})
+        self.mutate()
+
+    def pop(self, key, *args) -> Any:
+        is_present = key in self
+        value = dict.pop(self, key, *args)
+        if is_present:
+            self._operations.append({"op": "delete", "path": [str(key)]})
+            self.mutate()
+        return value
+
+    def popitem(self) -> Tuple[Any, Any]:
+        (key, value) = dict.popitem(self)
+        self._operations.append({"op": "delete", "path": [str(key)]})
+        self.mutate()
+        return (key, value)
+
+    def setdefault(self, key, default=None) -> Any:
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __or__(self, other: Any) -> Dict[Any, Any]:
+        return dict.__or__(self, other)
+
+    def __ior__(self, other: Any) -> "MutableDict":
+        self.update(other)
+        return self
+
+    def clear(self) -> None:
+        dict.clear(self)
+        self._replace()
+
+    def get_patch(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the serialised operations recorded since the last reset,
+        or None if sending the whole dictionary is preferable.
+        """
+
+        if self._is_replaced or len(self._operations) > max(len(self), 1):
+            return None
+        return [_serialise_operation(operation) for operation in self._operations]
+
+    def reset_mutation(self) -> None:
+        super().reset_mutation()
+        self._operations = []
+        self._is_replaced = False
+
+
+def _serialise_operation(operation: Dict[str, Any]) -> Dict[str, Any]:
+    serialised_operation = dict(operation)
+    if "value" in operation:
+        serialised_operation["value"] = state_serialiser.serialise(operation["value"])
+    if "values" in operation:
+        serialised_operation["values"] = [state_serialiser.serialise(v) for v in operation["values"]]
+    return serialised_operation
+
+
+def _diff_serialised_values(previous: Any, current: Any, path: List, patch: List[Dict]) -> None:
+    """
+    Appends to the patch the operations turning the previous serialised value into the current one.
+
+    Operations target the value at a path, relative to the diffed value:
+    "set" replaces it, "delete" removes a key, "append" extends a string
+    and "splice" replaces a range of items of a list.
+    """
+
+    if isinstance(previous, dict) and isinstance(current, dict):
+        for key in previous:
+            if key not in current:
+                patch.append({"op": "delete", "path": path + [key]})
+        for key, value in current.items():
+            if key not in previous:
+                patch.append({"op": "set", "path": path + [key], "value": value})
+            elif previous[key] != value:
+                _diff_serialised_values(previous[key], value, path + [key], patch)
+        return
+
+    if isinstance(previous, list) and isinstance(current, list):
+        common_length = min(len(previous), len(current))
+        start = 0
+        while start < common_length and previous[start] == current[start]:
+            start += 1
+        end_offset = 0
+        while end_offset < common_length - start and previous[-1 - end_offset] == current[-1 - end_offset]:
+            end_offset += 1
+        delete_count = len(previous) - start - end_offset
+        inserted = current[start : len(current) - end_offset]
+        if delete_count == 1 and len(inserted) == 1:
+            # A single item changed, e.g. the last message of a chat being streamed
+            _diff_serialised_values(previous[start], inserted[0], path + [start], patch)
+            return
+        patch.append(
+            {"op": "splice", "path": path, "start": start, "deleteCount": delete_count, "values": inserted}
+        )
+        return
+
+    if isinstance(previous, str) and isinstance(current, str) and current.startswith(previous):
+        patch.append({"op": "append", "path": path, "value": current[len(previous) :]})
+        return
+
+    patch.append({"op": "set", "path": path, "value": current})
+
+
+class _SharedValue:
+    """
+    Value of a cloned state which is still shared with the state it was cloned
+    from. It's copied the first time the clone accesses it, as the access may
+    lead to changes in place.
+    """
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __repr__(self) -> str:
+        return repr(self.value)
+
+
+def _is_immutable(value: Any) -> bool:
+    if isinstance(value, (str, bytes, bool, int, float, complex, datetime.date, pyarrow.Table)) or value is None:
+        return True
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_immutable(item) for item in value)
+    return False
+
+
+def _check_copyable(value: Any) -> None:
+    """
+    Raises early if the value can't be copied, without copying it.
+    Only the value itself is checked, not its content.
+    """
+
+    if type(value) in copy._deepcopy_dispatch or hasattr(value, "__deepcopy__"):  # type: ignore
+        return
+    value.__reduce_ex__(4)
+
+
 class StateProxy:
     """
     The root user state and its children (nested states) are instances of this class.
     Provides proxy functionality to detect state mutations via assignment.
     """
 
+    # When diffs are enabled, patches are sent instead of whole values when they're
+    # at most this fraction of the size of the value
+    MAX_PATCH_SIZE_RATIO = 0.25
+
     def __init__(self, raw_state: Dict = {}):
         self.state: Dict[str, Any] = {}
         self.local_mutation_subscriptions: List[MutationSubscription] = []
         self.initial_assignment = True
         self.mutated: Set[str] = set()
+        # Last serialised value sent for each key, and its approximate size, when diffs are enabled
+        self.sent_values: Dict[str, Tuple[Any, int]] = {}
+        self.unshare_lock = threading.Lock()
         self.ingest(raw_state)
 
     def __repr__(self) -> str:
@@ -476,19 +976,36 @@ class StateProxy:
             self.__setitem__(key, raw_value)
 
     def items(self) -> Sequence[Tuple[str, Any]]:
+        for key, value in list(self.state.items()):
+            if isinstance(value, _SharedValue):
+                self._unshare(key)
         return cast(Sequence[Tuple[str, Any]], self.state.items())
 
     def get(self, key: str) -> Any:
-        return self.state.get(key)
+        return self.__getitem__(key)
 
     def __getitem__(self, key: str) -> Any:
-        return self.state.get(key)
+        value = self.state.get(key)
+        if isinstance(value, _SharedValue):
+            return self._unshare(key)
+        return value
+
+    def _unshare(self, key: str) -> Any:
+        # Threads accessing the value at the same time must get the same copy
+        with self.unshare_lock:
+            value = self.state.get(key)
+            if isinstance(value, _SharedValue):
+                value = copy.deepcopy(value.value)
+                self.state[key] = value
+            return value
 
     def __setitem__(self, key: str, raw_value: Any) -> None:
         with state_recursion_new(key):
             if not isinstance(key, str):
                 raise ValueError(f"State keys must be strings. Received {str(key)} ({type(key)}).")
             old_value = self.state.get(key)
+            if isinstance(old_value, _SharedValue):
+                old_value = old_value.value
             self.state[key] = raw_value
 
             for local_mutation in self.local_mutation_subscriptions:
@@ -553,8 +1070,31 @@ class StateProxy:
     def escape_key(key):
         return key.replace(".", r"\.")
 
+    def _get_value_mutation(self, key: str, serialised_value: Any) -> Tuple[str, Any]:
+        """
+        Returns the mutation flag and the value to send for a key whose value changed.
+        "+" carries the whole value; "~" carries a patch of the value last sent.
+        """
+
+        if not Config.is_state_diff_enabled:
+            return "+", serialised_value
+
+        sent = self.sent_values.get(key)
+        if sent is not None:
+            (sent_value, sent_size) = sent
+            patch: List[Dict] = []
+            _diff_serialised_values(sent_value, serialised_value, [], patch)
+            patch_size = len(json.dumps(patch, default=str))
+            if patch_size <= sent_size * StateProxy.MAX_PATCH_SIZE_RATIO:
+                self.sent_values[key] = (serialised_value, sent_size + patch_size)
+                return "~", patch
+
+        size = len(json.dumps(serialised_value, default=str))
+        self.sent_values[key] = (serialised_value, size)
+        return "+", serialised_value
+
     def get_mutations_as_dict(self) -> Dict[str, Any]:
-        serialised_mutations: Dict[str, Union[Dict, List, str, bool, int, float, None]] = {}
+        serialised_mutations: Dict[str, Any] = {}
 
         def carry_mutation_flag(base_key, child_key):
             child_mutation_flag, child_key = child_key[0], child_key[1:]
@@ -569,6 +1109,7 @@ class StateProxy:
 
             if isinstance(value, StateProxy):
                 if f"+{key}" in self.mutated:
+                    self.sent_values.pop(key, None)
                     serialised_mutations[f"+{escaped_key}"] = serialised_value
                 value.initial_assignment = False
                 child_mutations = value.get_mutations_as_dict()
@@ -580,21 +1121,35 @@ class StateProxy:
             elif f"+{key}" in self.mutated:
                 try:
                     serialised_value = state_serialiser.serialise(value)
+                    if isinstance(value, MutableValue):
+                        # Sent whole, the changes made in place are included
+                        value.reset_mutation()
                 except BaseException:
                     raise ValueError(
                         f"""Couldn't serialise value of type "{ type(value) }" for key "{ key }"."""
                     )
-                serialised_mutations[f"+{escaped_key}"] = serialised_value
-            elif isinstance(value, MutableValue) is True and value.mutated():
+                (flag, serialised_value) = self._get_value_mutation(key, serialised_value)
+                serialised_mutations[f"{flag}{escaped_key}"] = serialised_value
+            elif isinstance(value, MutableValue) and value.mutated():
                 try:
-                    serialised_value = state_serialiser.serialise(value)
+                    patch = value.get_patch()
+                    serialised_value = patch if patch is not None else state_serialiser.serialise(value)
                     value.reset_mutation()
                 except BaseException:
                     raise ValueError(
                         f"""Couldn't serialise value of type "{ type(value) }" for key "{ key }"."""
                     )
-                serialised_mutations[f"+{escaped_key}"] = serialised_value
+                if patch is not None:
+                    # The value last sent is outdated for diffs, the next one is sent whole
+                    self.sent_values.pop(key, None)
+                    serialised_mutations[f"~{escaped_key}"] = serialised_value
+                else:
+                    (flag, serialised_value) = self._get_value_mutation(key, serialised_value)
+                    serialised_mutations[f"{flag}{escaped_key}"] = serialised_value
 
+        for key in self.mutated:
+            if key.startswith("-"):
+                self.sent_values.pop(key[1:], None)
         deleted_keys = {self.escape_key(key) for key in self.mutated if key.startswith("-")}
         for key in deleted_keys:
             serialised_mutations[f"{key}"] = None
@@ -603,6 +1158,8 @@ class StateProxy:
         return serialised_mutations
 
     def to_dict(self) -> Dict[str, Any]:
+        # Whole values are sent, following mutations can't be patches of older values
+        self.sent_values = {}
         serialised = {}
         for key, value in self.state.items():
             if key.startswith("_"):
@@ -628,13 +1185,32 @@ class StateProxy:
         :return: a python dictionary that represents the raw state
         """
         raw_state = {}
-        for key, value in self.state.items():
+        for key, value in self.items():
             if isinstance(value, StateProxy):
                 value = value.to_raw_state()
             raw_state[key] = value
 
         return raw_state
 
+    def to_shared_raw_state(self) -> Dict[str, Any]:
+        """
+        Converts a StateProxy and its children into a python dictionary which shares
+        its values with the proxy. Immutable values are shared as they are, other values
+        are copied by the state ingesting the dictionary, when first accessed.
+
+        :return: a python dictionary that represents the raw state
+        """
+        raw_state: Dict[str, Any] = {}
+        for key, value in self.state.items():
+            if isinstance(value, StateProxy):
+                raw_state[key] = value.to_shared_raw_state()
+            elif isinstance(value, _SharedValue) or _is_immutable(value):
+                raw_state[key] = value
+            else:
+                _check_copyable(value)
+                raw_state[key] = _SharedValue(value)
+        return raw_state
+
 
 def get_annotations(instance) -> Dict[str, Any]:
     """
@@ -979,7 +1555,8 @@ class WriterState(State):
         >>> clone_state = root_state.get_clone() # instance of AppSchema
         """
         try:
-            cloned_user_state = copy.deepcopy(self.user_state.to_raw_state())
+            # Values are shared with this state, and copied when the clone accesses them
+            cloned_user_state = self.user_state.to_shared_raw_state()
             cloned_mail = copy.deepcopy(self.mail)
         except BaseException:
             substitute_state = WriterState()
@@ -1844,16 +2421,18 @@ class EventHandler:
             target_id = instance_path[-1]["componentId"]
             target_component = cast(Component, self.session_component_tree.get_component(target_id))
             self._handle_binding(ev.type, target_component, instance_path, ev.payload)
-            calling_arguments = self._get_calling_arguments(ev, instance_path)
-            execution_environment = self._get_blueprint_execution_environment(
-                calling_arguments.get("payload"),
-                calling_arguments.get("context"),
-                calling_arguments.get("session"),
-                calling_arguments.get("vault"))
-            self.blueprint_runner.execute_ui_trigger(target_id, ev.type, execution_environment)
-            if not target_component.handlers:
+            handler = target_component.handlers.get(ev.type) if target_component.handlers else None
+            has_ui_triggers = self.blueprint_runner.has_ui_triggers(target_id, ev.type)
+            if not handler and not has_ui_triggers:
                 return None
-            handler = target_component.handlers.get(ev.type)
+            calling_arguments = self._get_calling_arguments(ev, instance_path)
+            if has_ui_triggers:
+                execution_environment = self._get_blueprint_execution_environment(
+                    calling_arguments.get("payload"),
+                    calling_arguments.get("context"),
+                    calling_arguments.get("session"),
+                    calling_arguments.get("vault"))
+                self.blueprint_runner.execute_ui_trigger(target_id, ev.type, execution_environment)
             if not handler:
                 return None
             handler_callable = self._get_handler_callable(handler)
@@ -1,14 +1,23 @@
 """
 `core_df` contains classes and functions that allow you to manipulate editable dataframes.
 """
+import bisect
 import copy
+import inspect
+import uuid
 from abc import ABCMeta
-from typing import TYPE_CHECKING, Any, Dict, List, Tuple, Type, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type, Union
 
 import pyarrow  # type: ignore
+import pyarrow.compute  # type: ignore
 
-from .core import MutableValue, import_failure
-from .ss_types import DataFrameRecordAdded, DataFrameRecordRemoved, DataFrameRecordUpdated
+from .core import MutableValue, StateProxy, _SharedValue, import_failure, state_serialiser
+from .ss_types import (
+    DataframeQuerySort,
+    DataFrameRecordAdded,
+    DataFrameRecordRemoved,
+    DataFrameRecordUpdated,
+)
 
 if TYPE_CHECKING:
     import pandas
@@ -73,6 +82,31 @@ class DataframeRecordProcessor():
         """
         raise NotImplementedError
 
+    @staticmethod
+    def assert_record(df: Any, record: Dict[str, Any]) -> None:
+        """
+        Raises a ValueError if the record doesn't match the columns of the dataframe
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def records_add(df: Any, records: List[Dict[str, Any]]) -> Any:
+        """
+        Appends records at once, used by EditableDataframe to flush its buffer of added records
+
+        >>> df = processor.records_add(df, [{"a": 1, "b": 2}, {"a": 3, "b": 4}])
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def records_remove(df: Any, record_indexes: List[int]) -> Any:
+        """
+        Removes records at once, used by EditableDataframe to apply its removed records
+
+        >>> df = processor.records_remove(df, [0, 12])
+        """
+        raise NotImplementedError
+
     @staticmethod
     def pyarrow_table(df: Any) -> pyarrow.Table:
         """
@@ -173,6 +207,28 @@ class PandasRecordProcessor(DataframeRecordProcessor):
 
         return df
 
+    @staticmethod
+    def assert_record(df: 'pandas.DataFrame', record: Dict[str, Any]) -> None:
+        _assert_record_match_pandas_df(df, record)
+
+    @staticmethod
+    def records_add(df: 'pandas.DataFrame', records: List[Dict[str, Any]]) -> 'pandas.DataFrame':
+        import pandas
+
+        split_records = [_split_record_as_pandas_record_and_index(r, df.index.names) for r in records]
+        new_records = [record for record, _ in split_records]
+
+        if isinstance(df.index, pandas.RangeIndex):
+            new_df = pandas.DataFrame(new_records)
+            return pandas.concat([df, new_df], ignore_index=True)
+        else:
+            new_df = pandas.DataFrame(new_records, index=[index for _, index in split_records])
+            return pandas.concat([df, new_df])
+
+    @staticmethod
+    def records_remove(df: 'pandas.DataFrame', record_indexes: List[int]) -> 'pandas.DataFrame':
+        return df.drop(df.index[record_indexes])
+
     @staticmethod
     def pyarrow_table(df: 'pandas.DataFrame') -> pyarrow.Table:
         """
@@ -243,6 +299,24 @@ class PolarRecordProcessor(DataframeRecordProcessor):
         df_filtered = polars.concat([df[:record_index], df[record_index + 1:]])
         return df_filtered
 
+    @staticmethod
+    def assert_record(df: 'polars.DataFrame', record: Dict[str, Any]) -> None:
+        _assert_record_match_polar_df(df, record)
+
+    @staticmethod
+    def records_add(df: 'polars.DataFrame', records: List[Dict[str, Any]]) -> 'polars.DataFrame':
+        import polars
+        new_df = polars.DataFrame(records)
+        return polars.concat([df, new_df])
+
+    @staticmethod
+    def records_remove(df: 'polars.DataFrame', record_indexes: List[int]) -> 'polars.DataFrame':
+        import polars
+
+        removed = set(record_indexes)
+        mask = polars.Series([i not in removed for i in range(len(df))])
+        return df.filter(mask)
+
     @staticmethod
     def pyarrow_table(df: 'polars.DataFrame') -> pyarrow.Table:
         """
@@ -297,6 +371,21 @@ class RecordListRecordProcessor(DataframeRecordProcessor):
         del(df[payload['record_index']])
         return df
 
+    @staticmethod
+    def assert_record(df: List[Dict[str, Any]], record: Dict[str, Any]) -> None:
+        _assert_record_match_list_of_records(df, record)
+
+    @staticmethod
+    def records_add(df: List[Dict[str, Any]], records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        df.extend(records)
+        return df
+
+    @staticmethod
+    def records_remove(df: List[Dict[str, Any]], record_indexes: List[int]) -> List[Dict[str, Any]]:
+        removed = set(record_indexes)
+        df[:] = [r for i, r in enumerate(df) if i not in removed]
+        return df
+
     @staticmethod
     def pyarrow_table(df: List[Dict[str, Any]]) -> pyarrow.Table:
         """
@@ -324,12 +413,23 @@ class EditableDataFrame(MutableValue):
     >>> })
 
     Editable Dataframe is compatible with a pandas, thrillers or record list dataframe
+
+    Added records are buffered and removed records are marked, both are applied
+    to the dataframe at once when it's read. The changes are sent to the frontend
+    as row deltas, the whole table is sent again after MAX_DELTAS of them.
     """
     processors = [PandasRecordProcessor, PolarRecordProcessor, RecordListRecordProcessor]
+    MAX_DELTAS = 100
 
     def __init__(self, df: Union['pandas.DataFrame', 'polars.DataFrame', List[dict]]):
         super().__init__()
         self._df = df
+        self._added_records: List[Dict[str, Any]] = []
+        self._removed_indexes: List[int] = []
+        self._deltas: List[Dict[str, Any]] = []
+        self._sent_deltas = 0
+        self._is_replaced = False
+        self.version = 0
         self.processor: Type[DataframeRecordProcessor]
         for processor in self.processors:
             if processor.match(self.df):
@@ -341,11 +441,15 @@ class EditableDataFrame(MutableValue):
 
     @property
     def df(self) -> Union['pandas.DataFrame', 'polars.DataFrame', List[dict]]:
+        self._apply_pending_records()
         return self._df
 
     @df.setter
     def df(self, value: Union['pandas.DataFrame', 'polars.DataFrame', List[dict]]) -> None:
         self._df = value
+        self._added_records = []
+        self._removed_indexes = []
+        self._is_replaced = True
         self.mutate()
 
     def record_add(self, payload: DataFrameRecordAdded) -> None:
@@ -358,8 +462,10 @@ class EditableDataFrame(MutableValue):
         """
         assert self.processor is not None
 
-        self._df = self.processor.record_add(self.df, payload)
-        self.mutate()
+        record = payload['record']
+        self.processor.assert_record(self._df, record)
+        self._added_records.append(record)
+        self._add_delta({"op": "add", "record": record})
 
     def record_update(self, payload: DataFrameRecordUpdated) -> None:
         """
@@ -374,8 +480,14 @@ class EditableDataFrame(MutableValue):
         """
         assert self.processor is not None
 
-        self._df = self.processor.record_update(self.df, payload)
-        self.mutate()
+        record = payload['record']
+        is_added, position = self._locate_record(payload['record_index'])
+        if is_added:
+            self.processor.assert_record(self._df, record)
+            self._added_records[position] = record
+        else:
+            self._df = self.processor.record_update(self._df, {"record_index": position, "record": record})
+        self._add_delta({"op": "update", "index": payload['record_index'], "record": record})
 
     def record_remove(self, payload: DataFrameRecordRemoved) -> None:
         """
@@ -387,8 +499,12 @@ class EditableDataFrame(MutableValue):
         """
         assert self.processor is not None
 
-        self._df = self.processor.record_remove(self.df, payload)
-        self.mutate()
+        is_added, position = self._locate_record(payload['record_index'])
+        if is_added:
+            del self._added_records[position]
+        else:
+            bisect.insort(self._removed_indexes, position)
+        self._add_delta({"op": "remove", "index": payload['record_index']})
 
     def pyarrow_table(self) -> pyarrow.Table:
         """
@@ -414,9 +530,197 @@ class EditableDataFrame(MutableValue):
         """
         assert self.processor is not None
 
-        record = self.processor.record(self.df, record_index)
+        is_added, position = self._locate_record(record_index)
+        if is_added:
+            return copy.copy(self._added_records[position])
+        record = self.processor.record(self._df, position)
         return record
 
+    def get_patch(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the row deltas recorded since the last reset, appended to
+        the deltas of the value sent to the frontend. Returns None if the
+        whole table must be sent.
+        """
+        if self._is_replaced or self._sent_deltas + len(self._deltas) > EditableDataFrame.MAX_DELTAS:
+            self._sent_deltas = 0
+            return None
+
+        deltas = [state_serialiser.serialise(delta) for delta in self._deltas]
+        patch = [{"op": "splice", "path": ["deltas"], "start": self._sent_deltas, "deleteCount": 0, "values": deltas}]
+        self._sent_deltas += len(deltas)
+        return patch
+
+    def reset_mutation(self) -> None:
+        super().reset_mutation()
+        self._deltas = []
+        self._is_replaced = False
+
+    def _add_delta(self, delta: Dict[str, Any]) -> None:
+        self.version += 1
+        self._deltas.append({"version": self.version, **delta})
+        self.mutate()
+
+    def _locate_record(self, record_index: int) -> Tuple[bool, int]:
+        """
+        Returns whether the record is in the buffer of added records, and its
+        position in this buffer or in the dataframe.
+        """
+        kept_count = len(self._df) - len(self._removed_indexes)
+        if record_index < 0 or record_index >= kept_count + len(self._added_records):
+            raise IndexError(f"Record index {record_index} is out of range.")
+        if record_index >= kept_count:
+            return True, record_index - kept_count
+
+        position = record_index
+        for removed_index in self._removed_indexes:
+            if removed_index > position:
+                break
+            position += 1
+        return False, position
+
+    def _apply_pending_records(self) -> None:
+        if self._removed_indexes:
+            self._df = self.processor.records_remove(self._df, self._removed_indexes)
+            self._removed_indexes = []
+        if self._added_records:
+            self._df = self.processor.records_add(self._df, self._added_records)
+            self._added_records = []
+
+
+class WindowedDataFrame(MutableValue):
+    """
+    Windowed Dataframe keeps a dataframe in the backend. The dataframe component
+    requests the rows it displays, sorted and searched with pyarrow compute, so
+    tables of millions of rows are never sent whole to the browser.
+
+    >>> initial_state = wf.init_state({
+    >>>    "df": wf.WindowedDataFrame(df)
+    >>> })
+
+    Windowed Dataframe is compatible with pandas and polars dataframes, pyarrow tables and
+    dataframes implementing the interchange protocol. Rows can't be edited from the component.
+    """
+
+    def __init__(self, df: Any):
+        super().__init__()
+        self.id = uuid.uuid4().hex
+        self.version = 0
+        self.df = df
+
+    @property
+    def df(self) -> Any:
+        return self._df
+
+    @df.setter
+    def df(self, value: Any) -> None:
+        self._df = value
+        self._table = _to_pyarrow_table(value)
+        # Last sorted and searched table, reused while the component scrolls
+        self._view: Optional[Tuple[Tuple, pyarrow.Table]] = None
+        self.version += 1
+        self.mutate()
+
+    def __deepcopy__(self, memo) -> "WindowedDataFrame":
+        clone = copy.copy(self)
+        clone._df = copy.deepcopy(self._df, memo)
+        # Arrow tables are immutable, the clone can share it
+        clone._view = None
+        return clone
+
+    def pyarrow_table(self) -> pyarrow.Table:
+        return self._table
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Describes the dataframe to the component, which then queries its rows.
+        """
+        return {
+            "type": "windowedDataframe",
+            "id": self.id,
+            "version": self.version,
+            "rowCount": self._table.num_rows,
+            "columns": self._table.column_names,
+        }
+
+    def query(
+        self,
+        offset: int,
+        limit: int,
+        sort: Optional[DataframeQuerySort] = None,
+        search: Optional[str] = None,
+    ) -> Tuple[pyarrow.Table, int]:
+        """
+        Returns a window of the sorted and searched rows, and the number of rows matching the search.
+
+        >>> edf = WindowedDataFrame(df)
+        >>> (rows, row_count) = edf.query(0, 100, DataframeQuerySort(columnName="a"), "search")
+        """
+        view_key = ((sort.columnName, sort.descending) if sort else None, search or None)
+        view = self._view
+        if view is None or view[0] != view_key:
+            table = self._table
+            if search:
+                table = table.filter(_search_mask(table, search))
+            if sort:
+                if sort.columnName not in table.column_names:
+                    raise ValueError(f'Column "{sort.columnName}" doesn\'t exist.')
+                order = "descending" if sort.descending else "ascending"
+                table = table.take(pyarrow.compute.sort_indices(table, sort_keys=[(sort.columnName, order)]))
+            view = (view_key, table)
+            self._view = view
+        table = view[1]
+        return table.slice(max(offset, 0), max(limit, 0)), table.num_rows
+
+
+def find_windowed_dataframe(state_proxy: StateProxy, dataframe_id: str) -> Optional[WindowedDataFrame]:
+    """
+    Finds the windowed dataframe with the given id among the values of a state and its children.
+    """
+    for value in state_proxy.state.values():
+        if isinstance(value, _SharedValue):
+            value = value.value
+        if isinstance(value, StateProxy):
+            windowed_df = find_windowed_dataframe(value, dataframe_id)
+            if windowed_df is not None:
+                return windowed_df
+        elif isinstance(value, WindowedDataFrame) and value.id == dataframe_id:
+            return value
+    return None
+
+
+def _to_pyarrow_table(df: Any) -> pyarrow.Table:
+    df_mro = [f"{x.__module__}.{x.__name__}" for x in inspect.getmro(type(df))]
+    if isinstance(df, pyarrow.Table):
+        return df
+    if "pandas.core.frame.DataFrame" in df_mro:
+        return pyarrow.Table.from_pandas(df, preserve_index=True)
+    if "polars.dataframe.frame.DataFrame" in df_mro:
+        return df.to_arrow()
+    if hasattr(df, "__dataframe__"):
+        from pyarrow.interchange import from_dataframe  # type: ignore
+
+        return from_dataframe(df)
+    raise ValueError("The dataframe must be a pandas or polars dataframe, a pyarrow table, or implement the dataframe interchange protocol")
+
+
+def _search_mask(table: pyarrow.Table, search: str) -> pyarrow.ChunkedArray:
+    """
+    Matches the rows where any column, as text, matches the search pattern, ignoring case.
+    Patterns which aren't valid regular expressions are matched literally.
+    """
+    mask = pyarrow.repeat(False, table.num_rows)
+    for column in table.columns:
+        try:
+            text = pyarrow.compute.cast(column, pyarrow.string())
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowNotImplementedError):
+            continue  # e.g. nested values
+        try:
+            matches = pyarrow.compute.match_substring_regex(text, search, ignore_case=True)
+        except pyarrow.ArrowInvalid:
+            matches = pyarrow.compute.match_substring(text, search, ignore_case=True)
+        mask = pyarrow.compute.or_(mask, pyarrow.compute.fill_null(matches, False))
+    return mask
 
 
 def _assert_record_match_pandas_df(df: 'pandas.DataFrame', record: Dict[str, Any]) -> None:
@@ -1,12 +1,12 @@
+import collections.abc
 import contextlib
-import copy
 import logging
 import uuid
 from contextvars import ContextVar
 from enum import Enum
-from typing import Any, Dict, List, Literal, Optional, Union, cast
+from typing import Any, Dict, Iterable, List, Literal, Mapping, Optional, Set, Tuple, Union, cast
 
-from pydantic import BaseModel, Field, field_validator, validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator, validator
 from typing_extensions import TypedDict
 
 from writer.ss_types import ComponentDefinition, ServeMode
@@ -56,6 +56,8 @@ class Component(BaseModel):
     outs: Optional[Any] = None
     x: Optional[int] = None
     y: Optional[int] = None
+    # Serialised form, shared by the sessions whose trees contain the component
+    _serialised: Optional[Dict] = PrivateAttr(default=None)
 
     @field_validator("x", "y", mode="before")
     def cast_float_to_int(cls, v):
@@ -66,8 +68,26 @@ class Component(BaseModel):
     def to_dict(self) -> Dict:
         """
         Wrapper for model_dump to ensure backward compatibility.
+
+        The dictionary is cached until a field is assigned. A shallow copy is
+        returned, the values it contains mustn't be modified.
         """
-        return self.model_dump(exclude_none=True)
+        # Private attributes are read from their dictionary, faster than through __getattr__
+        private = cast(Dict[str, Any], self.__pydantic_private__)
+        if private["_serialised"] is None:
+            private["_serialised"] = self.model_dump(exclude_none=True)
+        return dict(private["_serialised"])
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in Component.model_fields:
+            self._serialised = None
+
+    def __eq__(self, other: Any) -> bool:
+        # The cached serialised form isn't compared
+        if not isinstance(other, Component):
+            return NotImplemented
+        return self.__dict__ == other.__dict__
 
     def __enter__(self) -> "Component":
         self._token = current_parent_container.set(self)
@@ -80,20 +100,54 @@ class Component(BaseModel):
 class ComponentTreeBranch:
     """
     >>> bmc_tree = ComponentTreeBranch(Branch.bmc, False)
+
+    A branch can overlay a base branch. It then stores only the components added,
+    replaced or removed, and the changes of the base branch show through.
+
+    >>> session_bmc_tree = bmc_tree.overlay()
     """
 
-    def __init__(self, id: Branch, freeze: bool = False) -> None:
+    def __init__(self, id: Branch, freeze: bool = False, base: Optional['ComponentTreeBranch'] = None) -> None:
         """
 
         :param id: the id of the component tree branch (bmc, cmc, session)
         :param freeze: the component list can not be modified
+        :param base: the branch overlaid, which is read only
         """
-        self.components: Dict[str, Component] = {}
+        self._components: Dict[str, Component] = {}
+        # Components of the base branch removed from this branch
+        self._removed_ids: Set[str] = set()
+        self.base = base
         # Page counter is required to set
         # predefined IDs & keys for code-managed pages
-        self.page_counter = 0
+        self._page_counter = 0
         self.component_tree_id = id
         self.freeze = freeze
+        # Incremented on each modification, to detect the indexes which are outdated
+        self._version = 0
+        # IDs of the components added, changed or removed since the last export
+        self.changed_ids: Dict[str, None] = {}
+
+    @property
+    def components(self) -> Mapping[str, Component]:
+        if self.base is None:
+            return self._components
+        return _OverlayComponents(self)
+
+    @property
+    def page_counter(self) -> int:
+        if self.base is None:
+            return self._page_counter
+        return self._page_counter + self.base.page_counter
+
+    @property
+    def version(self) -> int:
+        """
+        Generation of the branch, which includes the generation of the base branch.
+        """
+        if self.base is None:
+            return self._version
+        return self._version + self.base.version
 
     def clone(self) -> 'ComponentTreeBranch':
         """
@@ -106,13 +160,32 @@ class ComponentTreeBranch:
         :return:
         """
         cloned = ComponentTreeBranch(self.component_tree_id, self.freeze)
-        cloned.components = copy.copy(self.components)
-        cloned.page_counter = self.page_counter
+        cloned._components = dict(self.components)
+        cloned._page_counter = self.page_counter
         return cloned
 
+    def overlay(self) -> 'ComponentTreeBranch':
+        """
+        Creates a branch overlaying this one, which is left unmodified.
+
+        Writer Framework uses this action when it instantiates the component tree attached to the session,
+        only the components modified by the session are stored in it.
+
+        >>> session_bmc_tree = bmc_tree.overlay()
+        """
+        return ComponentTreeBranch(self.component_tree_id, self.freeze, base=self)
 
     def get_component(self, component_id: str) -> Optional[Component]:
-        return self.components.get(component_id)
+        component = self._components.get(component_id)
+        if component is not None or self.base is None or component_id in self._removed_ids:
+            return component
+        return self.base.get_component(component_id)
+
+    def own_ids(self) -> List[str]:
+        """
+        Returns the IDs of the components stored or removed in this branch, rather than in its base.
+        """
+        return list(self._components) + list(self._removed_ids)
 
     def attach(self, component: Component) -> None:
         """
@@ -123,13 +196,13 @@ class ComponentTreeBranch:
         if self.freeze:
             raise UIError(f"Component tree {self.component_tree_id} is frozen and cannot be modified")
 
-        if (component.id in self.components):
+        if self.get_component(component.id) is not None:
             raise RuntimeWarning(f"Component with ID {component.id} already exists")
 
-        if component.type == "page" and component.id not in self.components:
-            self.page_counter += 1
+        if component.type == "page":
+            self._page_counter += 1
 
-        self.components[component.id] = component
+        self._set_component(component)
 
     def ingest(self, serialised_components: Dict[str, Any]) -> None:
         if self.freeze:
@@ -140,11 +213,27 @@ class ComponentTreeBranch:
         for component_id in removed_ids:
             if component_id == "root":
                 continue
-            self.components.pop(component_id)
+            self.remove(component_id)
 
         for component_id, sc in serialised_components.items():
             component = Component(**sc)
-            self.components[component_id] = component
+            if self.get_component(component_id) == component:
+                continue
+            self._set_component(component)
+
+    def remove(self, component_id: str) -> None:
+        """
+        Removes a component from the branch, if it's there.
+        """
+        is_removed = self._components.pop(component_id, None) is not None
+        if self.base is not None and component_id not in self._removed_ids \
+                and self.base.get_component(component_id) is not None:
+            self._removed_ids.add(component_id)
+            is_removed = True
+
+        if is_removed:
+            self.changed_ids[component_id] = None
+            self._version += 1
 
     def to_dict(self) -> Dict:
         active_components = {}
@@ -153,27 +242,81 @@ class ComponentTreeBranch:
 
         return active_components
 
+    def _set_component(self, component: Component) -> None:
+        self._components[component.id] = component
+        self._removed_ids.discard(component.id)
+        self.changed_ids[component.id] = None
+        self._version += 1
+
+
+class _OverlayComponents(collections.abc.Mapping):
+    """
+    Read-only view of the components of a branch overlaying a base branch.
+    """
+
+    def __init__(self, branch: ComponentTreeBranch) -> None:
+        self._branch = branch
+
+    def __getitem__(self, component_id: str) -> Component:
+        component = self._branch.get_component(component_id)
+        if component is None:
+            raise KeyError(component_id)
+        return component
+
+    def __iter__(self):
+        base = cast(ComponentTreeBranch, self._branch.base)
+        for component_id in base.components:
+            if component_id not in self._branch._removed_ids:
+                yield component_id
+        for component_id in self._branch._components:
+            if base.get_component(component_id) is None:
+                yield component_id
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
 
 
 class ComponentTree():
+    """
+    Merged view of the tree branches, the first branch taking precedence.
 
-    def __init__(self, tree_branches: List[ComponentTreeBranch]):
+    The tree indexes the merged components and the children of each component.
+    The indexes are kept up to date by the methods of the tree, and rebuilt
+    if a branch has been modified directly.
+
+    A tree whose branches overlay the branches of a base tree indexes only
+    the components which differ from the base tree.
+    """
+
+    def __init__(self, tree_branches: List[ComponentTreeBranch], base_tree: Optional['ComponentTree'] = None):
         assert len(tree_branches) > 0, "Component tree must have at least one tree branch"
         self.tree_branches = tree_branches
+        self.base_tree = base_tree
         self.updated = False
+        # Components which differ from the base tree, None if removed
+        self._components: Dict[str, Optional[Component]] = {}
+        # Children of the components whose children differ from the base tree
+        self._children: Dict[Optional[str], Dict[str, None]] = {}
+        self._indexed_versions: Tuple[int, ...] = ()
+        self._build_indexes()
 
     @property
-    def components(self) -> Dict[str, Component]:
-        trees = reversed(self.tree_branches)
-        all_components = {}
-        for tree in trees:
-            all_components.update(tree.components)
-        return all_components
+    def components(self) -> Mapping[str, Component]:
+        self._ensure_indexes()
+        return _MergedComponents(self)
 
     @property
     def page_counter(self) -> int:
         return sum([tree.page_counter for tree in self.tree_branches])
 
+    @property
+    def version(self) -> Tuple[int, ...]:
+        """
+        Generations of the branches, which change whenever a branch is modified.
+        Data derived from the tree can be cached against it.
+        """
+        return self._branch_versions()
+
     def get_component(self, component_id: str) -> Optional[Component]:
         for tree in self.tree_branches:
             component = tree.get_component(component_id)
@@ -202,7 +345,9 @@ class ComponentTree():
         if _branch is None:
             raise ValueError(f"Invalid tree branch : {tree}")
 
+        self._ensure_indexes()
         cast(ComponentTreeBranch, _branch).attach(component)
+        self._reindex([component.id])
 
     def ingest(self, serialised_components: Dict[str, Any], tree: Optional[Branch] = None) -> None:
         self.updated = True
@@ -210,13 +355,18 @@ class ComponentTree():
         if _branch is None:
             raise ValueError(f"Invalid tree branch : {tree}")
 
+        self._ensure_indexes()
+        previous_ids = list(_branch.components)
         cast(ComponentTreeBranch, _branch).ingest(serialised_components)
+        self._reindex(dict.fromkeys(list(_branch.components) + previous_ids))
 
     def delete_component(self, component_id: str) -> None:
+        self._ensure_indexes()
         for tree_branch in self.tree_branches:
             if component_id in tree_branch.components and not tree_branch.freeze:
                 self.updated = True
-                tree_branch.components.pop(component_id, None)
+                tree_branch.remove(component_id)
+                self._reindex([component_id])
                 return
             elif component_id in tree_branch.components and tree_branch.freeze:
                 raise UIError(
@@ -236,7 +386,7 @@ class ComponentTree():
                 self.updated = True
                 for tree in self.tree_branches:
                     if not tree.freeze:
-                        tree.components.pop(child.id, None)
+                        tree.remove(child.id)
 
             except UIError:
                 logger = logging.getLogger("writer")
@@ -247,15 +397,21 @@ class ComponentTree():
                 # This might result in multiple consecutive warnings
                 # for the same parent component, but we have to avoid "break"ing
                 # due to that the component might still have CMC children
-
+        self._reindex([child.id for child in children])
 
     def to_dict(self) -> Dict:
-        trees = reversed(self.tree_branches)
-        components = {}
-        for tree in trees:
-            components.update(tree.to_dict())
+        return {id: component.to_dict() for id, component in self.components.items()}
 
-        return components
+    def pop_changed_ids(self) -> List[str]:
+        """
+        Returns the IDs of the components added, changed or removed in any
+        branch since the last call, and clears the change journals.
+        """
+        changed_ids: Dict[str, None] = {}
+        for tree in self.tree_branches:
+            changed_ids.update(tree.changed_ids)
+            tree.changed_ids = {}
+        return list(changed_ids)
 
     def next_page_id(self) -> str:
         return f"page-{self.page_counter}"
@@ -281,11 +437,9 @@ class ComponentTree():
             return 0
 
     def get_descendents(self, parent_id: str) -> List[Component]:
-        children = self._get_direct_descendents(parent_id)
-        desc = children.copy()
-        for child in children:
-            desc += self.get_descendents(child.id)
-
+        self._ensure_indexes()
+        desc: List[Component] = []
+        self._collect_descendents(parent_id, desc)
         return desc
 
     def branch(self, branch_id: Branch) -> ComponentTreeBranch:
@@ -313,9 +467,21 @@ class ComponentTree():
         return branch.freeze
 
     def _get_direct_descendents(self, parent_id: str) -> List[Component]:
-        _all_components = self.components.values()
-        children = list(filter(lambda c: c.parentId == parent_id, _all_components))
-        return children
+        self._ensure_indexes()
+        return self._indexed_direct_descendents(parent_id)
+
+    def _indexed_direct_descendents(self, parent_id: str) -> List[Component]:
+        return [
+            cast(Component, self._indexed_component(child_id))
+            for child_id in self._indexed_children(parent_id)
+        ]
+
+    def _collect_descendents(self, parent_id: str, desc: List[Component]) -> None:
+        # Direct children come first, followed by the descendents of each of them
+        children = self._indexed_direct_descendents(parent_id)
+        desc += children
+        for child in children:
+            self._collect_descendents(child.id, desc)
 
     def _tree_branch(self, branch: Optional[Branch]) -> Optional[ComponentTreeBranch]:
         if branch is None:
@@ -327,6 +493,65 @@ class ComponentTree():
 
         return None
 
+    def _branch_versions(self) -> Tuple[int, ...]:
+        return tuple(tree.version for tree in self.tree_branches)
+
+    def _build_indexes(self) -> None:
+        self._components = {}
+        self._children = {}
+        if self.base_tree is not None:
+            self.base_tree._ensure_indexes()
+
+        component_ids: Dict[str, None] = {}
+        for tree in reversed(self.tree_branches):
+            component_ids.update(dict.fromkeys(tree.own_ids()))
+        self._reindex(component_ids)
+
+    def _ensure_indexes(self) -> None:
+        if self._indexed_versions != self._branch_versions():
+            self._build_indexes()
+
+    def _indexed_component(self, component_id: str) -> Optional[Component]:
+        if component_id in self._components:
+            return self._components[component_id]
+        if self.base_tree is not None:
+            return self.base_tree._indexed_component(component_id)
+        return None
+
+    def _indexed_children(self, parent_id: Optional[str]) -> Dict[str, None]:
+        if parent_id in self._children:
+            return self._children[parent_id]
+        if self.base_tree is not None:
+            return self.base_tree._indexed_children(parent_id)
+        return {}
+
+    def _own_children(self, parent_id: Optional[str]) -> Dict[str, None]:
+        # The children of the base tree are copied when they're first modified
+        if parent_id not in self._children:
+            self._children[parent_id] = dict(self._indexed_children(parent_id))
+        return self._children[parent_id]
+
+    def _reindex(self, component_ids: Iterable[str]) -> None:
+        """
+        Updates the indexes for components which have been added, replaced or
+        removed in a branch. Other changes must have been indexed beforehand.
+        """
+        for component_id in component_ids:
+            previous = self._indexed_component(component_id)
+            current = self.get_component(component_id)
+            if previous is current:
+                continue
+            if previous is not None:
+                self._own_children(previous.parentId).pop(component_id, None)
+            if current is not None:
+                self._own_children(current.parentId)[component_id] = None
+
+            base_component = self.base_tree._indexed_component(component_id) if self.base_tree is not None else None
+            if current is base_component:
+                self._components.pop(component_id, None)
+            else:
+                self._components[component_id] = current
+        self._indexed_versions = self._branch_versions()
 
     def get_parent(self, component_id: str) -> List[str]:
         """
@@ -335,20 +560,54 @@ class ComponentTree():
         :param component_id:
         :return:
         """
-        components = self.components.values()
+        self._ensure_indexes()
         parents = []
-        current_node: Optional[str] = component_id
-        while current_node is not None:
-            for component in components:
-                if component.id == current_node:
-                    if component.parentId is not None:
-                        parents.append(component.parentId)
-
-                    current_node = component.parentId
+        component = self._indexed_component(component_id)
+        while component is not None and component.parentId is not None:
+            parents.append(component.parentId)
+            component = self._indexed_component(component.parentId)
 
         return parents
 
 
+class _MergedComponents(collections.abc.Mapping):
+    """
+    Read-only view of the merged components of a component tree.
+    """
+
+    def __init__(self, tree: ComponentTree) -> None:
+        self._tree = tree
+
+    def __getitem__(self, component_id: str) -> Component:
+        component = self._tree._indexed_component(component_id)
+        if component is None:
+            raise KeyError(component_id)
+        return component
+
+    def __iter__(self):
+        for component_id, component in self._tree._components.items():
+            if component is not None:
+                yield component_id
+        if self._tree.base_tree is not None:
+            for component_id in self._tree.base_tree.components:
+                if component_id not in self._tree._components:
+                    yield component_id
+
+    def __len__(self) -> int:
+        base_tree = self._tree.base_tree
+        if base_tree is None:
+            return len(self._tree._components)
+
+        count = len(base_tree.components)
+        for component_id, component in self._tree._components.items():
+            is_in_base = base_tree._indexed_component(component_id) is not None
+            if component is not None and not is_in_base:
+                count += 1
+            elif component is None and is_in_base:
+                count -= 1
+        return count
+
+
 def build_base_component_tree() -> ComponentTree:
     """
     Create the base component tree. This tree is used when loading Writer Framework.
@@ -368,16 +627,16 @@ def build_session_component_tree(base_component_tree: ComponentTree) -> Componen
     The session component tree is associated with a user session, i.e. a browser tab.
     If the user refreshes the page, a new component tree for the session is created.
 
-    The builder managed component, copy from base component tree, can not be modified anymore.
-    The code managed component can be modified.
+    The builder managed and code managed branches overlay the ones of the base component tree,
+    they store only the components modified by the session.
     """
     session_tree_branch = ComponentTreeBranch(Branch.session_cmc)
 
-    cmc_tree_branch = base_component_tree.branch(Branch.initial_cmc).clone()
-    bmc_tree_branch = base_component_tree.branch(Branch.bmc).clone()
+    cmc_tree_branch = base_component_tree.branch(Branch.initial_cmc).overlay()
+    bmc_tree_branch = base_component_tree.branch(Branch.bmc).overlay()
     # bmc_tree_branch.freeze = True
 
-    return ComponentTree([session_tree_branch, cmc_tree_branch, bmc_tree_branch])
+    return ComponentTree([session_tree_branch, cmc_tree_branch, bmc_tree_branch], base_tree=base_component_tree)
 
 
 def ingest_bmc_component_tree(component_tree: ComponentTree, components: Dict[str, Any], ignore_freeze: bool = False):
@@ -457,9 +716,9 @@ def export_component_tree(component_tree: ComponentTree, mode: ServeMode, only_u
     if only_update is True and component_tree.updated is False:
         return None
 
-    roots = ['root']
-    if mode == "edit":
-        roots.append('blueprints_root')
+    # Everything is exported, the changes are included
+    component_tree.pop_changed_ids()
+    roots = _export_roots(mode)
 
     _components: List[Component] = []
     for root in roots:
@@ -473,6 +732,59 @@ def export_component_tree(component_tree: ComponentTree, mode: ServeMode, only_u
 
     return {c.id: c.to_dict() for c in _components}
 
+
+def export_component_tree_changes(component_tree: ComponentTree, mode: ServeMode) -> Optional[Tuple[Dict, List[str]]]:
+    """
+    Exports the components added, changed or removed since the last export of the component tree.
+
+    >>> changes = core_ui.export_component_tree_changes(session.session_component_tree, mode=writer.Config.mode)
+
+    Components which aren't exported by `export_component_tree`, and the descendents
+    of removed components, are reported as removed.
+
+    :param component_tree: the full component tree
+    :param mode: the mode of the application (edit, run)
+    :return: the changed components and the IDs of the removed ones, or None if nothing has changed
+    """
+    component_tree.updated = False
+    changed_ids = component_tree.pop_changed_ids()
+    if len(changed_ids) == 0:
+        return None
+
+    roots = _export_roots(mode)
+    components = component_tree.components
+    changed_components: Dict[str, Dict] = {}
+    removed_ids: Dict[str, None] = {}
+    for component_id in changed_ids:
+        component = components.get(component_id)
+        if component is not None and _is_exported(component_tree, component, roots, mode):
+            changed_components[component_id] = component.to_dict()
+            continue
+        removed_ids[component_id] = None
+        for descendent in component_tree.get_descendents(component_id):
+            removed_ids[descendent.id] = None
+
+    return changed_components, [component_id for component_id in removed_ids if component_id not in changed_components]
+
+
+def _export_roots(mode: ServeMode) -> List[str]:
+    roots = ['root']
+    if mode == "edit":
+        roots.append('blueprints_root')
+    return roots
+
+
+def _is_exported(component_tree: ComponentTree, component: Component, roots: List[str], mode: ServeMode) -> bool:
+    # filters notes in run mode
+    if mode == "run" and component.type == "note":
+        return False
+    if component.id in roots:
+        return True
+
+    parents = component_tree.get_parent(component.id)
+    return len(parents) > 0 and parents[-1] in roots and parents[-1] in component_tree.components
+
+
 class UIError(Exception):
     ...
 
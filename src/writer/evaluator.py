@@ -1,7 +1,8 @@
+import functools
 import json
 import os
 import re
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
 import writer.core
 import writer.core_ui
@@ -14,6 +15,11 @@ if TYPE_CHECKING:
     from writer.core import WriterState
     from writer.core_ui import ComponentTree
 
+# Literal text, or expression and whether it's surrounded by quotes
+TemplateSegment = Union[str, Tuple[str, bool]]
+# Accessor made of the expression between brackets, if any, followed by literal text
+ExpressionPart = Tuple[Optional[str], str]
+
 
 class Evaluator:
     """
@@ -23,6 +29,7 @@ class Evaluator:
 
     TEMPLATE_REGEX = re.compile(r"[\\]?@{([^{]*?)}")
     CONTROL_CHARS = re.compile(r"[\x00-\x1f\x7f]")
+    TEMPLATE_CACHE_SIZE = int(os.getenv("WRITER_TEMPLATE_CACHE_SIZE", "4096"))
 
     def __init__(self, state: "WriterState", component_tree: "ComponentTree"):
         self.state = state
@@ -55,40 +62,75 @@ class Evaluator:
             raise ValueError(f'Component with id "{component_id}" not found.')
 
         field_value = component.content.get(field_key) or default_field_value
-        replaced = None
-        full_match = self.TEMPLATE_REGEX.fullmatch(field_value)
-
-        def replacer(matched: re.Match):
-            if matched.string[0] == "\\":  # Escaped @, don't evaluate
-                return matched.string
-            expr = matched.group(1).strip()
-            expr_value = self.evaluate_expression(expr, instance_path, base_context)
-            if full_match is not None:
-                return expr_value
-            if as_json:
-                if field_value[matched.start(0)] == '"':
-                    return json.dumps(expr_value)
-                else:
-                    return expr_value
-            if not isinstance(expr_value, str):
-                return json.dumps(expr_value)
-            return expr_value
-
-        if full_match is None:
-            replaced = field_value
-            if as_json:
-                # First pass to remove quotes around @{my_var}
-                replaced = re.sub(r'"(@{\s*[^"]+?\s*})"', r"\1", field_value)
-            replaced = self.TEMPLATE_REGEX.sub(replacer, replaced)
-            if as_json:
-                replaced = decode_json(replaced)
+        (is_full_match, segments) = Evaluator._compile_template(field_value, as_json)
+
+        if is_full_match:
+            segment = segments[0]
+            if isinstance(segment, str):
+                replaced = segment
+            else:
+                replaced = self.evaluate_expression(segment[0], instance_path, base_context)
         else:
-            replaced = replacer(full_match)
-            if as_json:
-                replaced = decode_json(replaced)
+            parts = []
+            for segment in segments:
+                if isinstance(segment, str):
+                    parts.append(segment)
+                    continue
+                (expr, is_quoted) = segment
+                expr_value = self.evaluate_expression(expr, instance_path, base_context)
+                if as_json:
+                    parts.append(json.dumps(expr_value) if is_quoted else expr_value)
+                elif not isinstance(expr_value, str):
+                    parts.append(json.dumps(expr_value))
+                else:
+                    parts.append(expr_value)
+            replaced = "".join(parts)
+
+        if as_json:
+            replaced = decode_json(replaced)
 
         return replaced
 
+    @staticmethod
+    @functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+    def _compile_template(field_value: str, as_json: bool) -> Tuple[bool, Tuple[TemplateSegment, ...]]:
+        """
+        Splits a template into literal text and expressions, and returns whether
+        the template is made of a single expression, whose value is kept as is.
+        """
+
+        full_match = Evaluator.TEMPLATE_REGEX.fullmatch(field_value)
+        if full_match is not None:
+            if field_value[0] == "\\":  # Escaped @, don't evaluate
+                return True, (field_value,)
+            return True, ((full_match.group(1).strip(), False),)
+
+        text = field_value
+        if as_json:
+            # First pass to remove quotes around @{my_var}
+            text = re.sub(r'"(@{\s*[^"]+?\s*})"', r"\1", field_value)
+
+        segments: List[TemplateSegment] = []
+        position = 0
+        for matched in Evaluator.TEMPLATE_REGEX.finditer(text):
+            segments.append(text[position:matched.start(0)])
+            if text[0] == "\\":  # Escaped @, don't evaluate
+                segments.append(text)
+            else:
+                segments.append((matched.group(1).strip(), field_value[matched.start(0)] == '"'))
+            position = matched.end(0)
+        segments.append(text[position:])
+
+        return False, tuple(segment for segment in segments if segment != "")
+
+    @staticmethod
+    def clear_template_cache() -> None:
+        """
+        Clears the templates and expressions compiled, e.g. when components are updated.
+        """
+        Evaluator._compile_template.cache_clear()
+        Evaluator._compile_expression.cache_clear()
+
     def get_context_data(self, instance_path: InstancePath, base_context={}) -> Dict[str, Any]:
         context: Dict[str, Any] = base_context
         for i in range(len(instance_path)):
@@ -167,6 +209,27 @@ class Evaluator:
             )
 
         accessors: List[str] = []
+        parts = Evaluator._compile_expression(expr)
+        for i, (nested_expr, suffix) in enumerate(parts):
+            accessor = suffix
+            if nested_expr is not None:
+                accessor = str(self.evaluate_expression(nested_expr, instance_path, base_context)) + suffix
+            # The last accessor is omitted when empty
+            if accessor or i < len(parts) - 1:
+                accessors.append(accessor)
+
+        return accessors
+
+    @staticmethod
+    @functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+    def _compile_expression(expr: str) -> Tuple[ExpressionPart, ...]:
+        """
+        Splits an expression into its accessors. The expressions between
+        brackets are evaluated when the expression is.
+        """
+
+        parts: List[ExpressionPart] = []
+        nested_expr: Optional[str] = None
         s = ""
         level = 0
 
@@ -179,13 +242,15 @@ class Evaluator:
                     i += 1
             elif character == ".":
                 if level == 0:
-                    accessors.append(s)
+                    parts.append((nested_expr, s))
+                    nested_expr = None
                     s = ""
                 else:
                     s += character
             elif character == "[":
                 if level == 0:
-                    accessors.append(s)
+                    parts.append((nested_expr, s))
+                    nested_expr = None
                     s = ""
                 else:
                     s += character
@@ -193,7 +258,8 @@ class Evaluator:
             elif character == "]":
                 level -= 1
                 if level == 0:
-                    s = str(self.evaluate_expression(s, instance_path, base_context))
+                    nested_expr = s
+                    s = ""
                 else:
                     s += character
             else:
@@ -201,10 +267,8 @@ class Evaluator:
 
             i += 1
 
-        if s:
-            accessors.append(s)
-
-        return accessors
+        parts.append((nested_expr, s))
+        return tuple(parts)
 
     def get_env_variable_value(self, expr: str):
         return os.getenv(expr[1:])
@@ -3,6 +3,7 @@ import base64
 import html
 import importlib.util
 import io
+import itertools
 import json
 import logging
 import mimetypes
@@ -10,6 +11,7 @@ import os
 import os.path
 import pathlib
 import socket
+import struct
 import textwrap
 import time
 import typing
@@ -41,10 +43,13 @@ from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
 from writer import VERSION, abstract
 from writer.ai import Graph
 from writer.app_runner import AppRunner
+from writer.core import BinaryPayload
 from writer.ss_types import (
     AppProcessServerResponse,
     AutogenRequestBody,
     ComponentUpdateRequestPayload,
+    DataframeQueryRequestPayload,
+    DataframeQueryResponsePayload,
     EventResponsePayload,
     HashRequestPayload,
     HashRequestResponsePayload,
@@ -64,6 +69,7 @@ if typing.TYPE_CHECKING:
     from .auth import Auth, Unauthorized
 
 MAX_WEBSOCKET_MESSAGE_SIZE = 201 * 1024 * 1024
+BINARY_FRAME_REFERENCE_PREFIX = "wf-binary:"
 BLUEPRINT_API_EXECUTION_TIMEOUT_SECONDS = int(os.getenv("AGENT_BUILDER_BLUEPRINT_API_EXECUTION_TIMEOUT", "600"))
 BLUEPRINT_API_RETRY_TIMEOUT = int(os.getenv("AGENT_BUILDER_BLUEPRINT_API_RETRY_TIMEOUT", "10000"))
 logging.getLogger().setLevel(logging.INFO)
@@ -333,31 +339,6 @@ def get_asgi_app(
                 raise RuntimeError("Cannot initialize session.")
             return sid
 
-        # --- Blueprint discovery logic ---
-
-        def find_blueprint_id(app_runner: AppRunner, key: str) -> Optional[str]:
-            # Locate blueprint component by its key
-            if not app_runner.bmc_components:
-                return None
-            return next(
-                (
-                    comp["id"]
-                    for comp in app_runner.bmc_components.values()
-                    if comp["type"] == "blueprints_blueprint"
-                    and comp.get("content", {}).get("key") == key
-                ),
-                None
-            )
-
-        def has_api_trigger(app_runner: AppRunner, blueprint_id: str) -> bool:
-            # Check if blueprint has at least one API trigger component
-            if not app_runner.bmc_components:
-                return False
-            return any(
-                comp["type"] == "blueprints_apitrigger" and comp.get("parentId") == blueprint_id
-                for comp in app_runner.bmc_components.values()
-            )
-
         # --- Result serialization (recursive) ---
 
         def serialize_result(data: Any) -> Any:
@@ -400,7 +381,7 @@ def get_asgi_app(
                 if not app_runner.bmc_components:
                     raise RuntimeError("No blueprints defined in the agent.")
 
-                blueprint_id = find_blueprint_id(app_runner, blueprint_key)
+                blueprint_id = app_runner.find_blueprint_id(blueprint_key)
                 if not blueprint_id:
                     await queue.put(await format_event("error", {
                         "msg": f"Blueprint '{blueprint_key}' was not found.",
@@ -408,7 +389,7 @@ def get_asgi_app(
                     }))
                     return
 
-                if not has_api_trigger(app_runner, blueprint_id):
+                if not app_runner.has_api_trigger(blueprint_id):
                     await queue.put(await format_event("error", {
                         "msg": f"Blueprint '{blueprint_key}' lacks an API trigger.",
                         "finished_at": int(time.time())
@@ -568,6 +549,10 @@ def get_asgi_app(
                     new_task = asyncio.create_task(
                         _handle_state_enquiry_message(websocket, session_id, req_message)
                     )
+                elif req_message.type == "dataframeQuery":
+                    new_task = asyncio.create_task(
+                        _handle_dataframe_query(websocket, session_id, req_message)
+                    )
                 elif serve_mode == "edit" and req_message.type == "hashRequest":
                     new_task = asyncio.create_task(
                         _handle_hash_request(websocket, session_id, req_message)
@@ -594,6 +579,17 @@ def get_asgi_app(
                 except asyncio.CancelledError:
                     pass
 
+    async def _send_message(websocket: WebSocket, message: Dict[str, Any]) -> None:
+        """
+        Sends a message, preceded by the binary frames of the binary payloads it references.
+        """
+
+        frames: List[bytes] = []
+        message = _extract_binary_frames(message, frames)
+        for frame in frames:
+            await websocket.send_bytes(frame)
+        await websocket.send_json(message)
+
     async def _handle_incoming_event(
         websocket: WebSocket, session_id: str, req_message: WriterWebsocketIncoming
     ):
@@ -622,7 +618,7 @@ def get_asgi_app(
             res_payload = typing.cast(EventResponsePayload, apsr.payload).model_dump()
         if res_payload is not None:
             response.payload = res_payload
-        await websocket.send_json(response.model_dump())
+        await _send_message(websocket, response.model_dump())
 
     async def _handle_incoming_edit_message(
         websocket: WebSocket, session_id: str, req_message: WriterWebsocketIncoming
@@ -649,7 +645,8 @@ def get_asgi_app(
                 session_id, req_message.payload["code"], req_message.payload["path"]
             )
         elif req_message.type == "codeUpdate":
-            app_runner.update_code(session_id, req_message.payload["code"])
+            # The current AppProcess keeps serving from this loop while its replacement starts
+            await asyncio.to_thread(app_runner.update_code, session_id, req_message.payload["code"])
         elif req_message.type == "loadSourceFile":
             path = os.path.join(*req_message.payload["path"])
             try:
@@ -716,7 +713,26 @@ def get_asgi_app(
             res_payload = typing.cast(StateEnquiryResponsePayload, apsr.payload).model_dump()
         if res_payload is not None:
             response.payload = res_payload
-        await websocket.send_json(response.model_dump())
+        await _send_message(websocket, response.model_dump())
+
+    async def _handle_dataframe_query(
+        websocket: WebSocket, session_id: str, req_message: WriterWebsocketIncoming
+    ):
+        response = WriterWebsocketOutgoing(
+            messageType=f"{req_message.type}Response",
+            trackingId=req_message.trackingId,
+            payload=None,
+        )
+        try:
+            payload = DataframeQueryRequestPayload.model_validate(req_message.payload)
+        except ValidationError:
+            await _send_message(websocket, response.model_dump())
+            return
+        apsr: Optional[AppProcessServerResponse] = None
+        apsr = await app_runner.handle_dataframe_query(session_id, payload)
+        if apsr is not None and apsr.payload is not None:
+            response.payload = typing.cast(DataframeQueryResponsePayload, apsr.payload).model_dump()
+        await _send_message(websocket, response.model_dump())
 
     async def _handle_hash_request(
         websocket: WebSocket, session_id: str, req_message: WriterWebsocketIncoming
@@ -748,7 +764,7 @@ def get_asgi_app(
                 announcement = WriterWebsocketOutgoing(
                     messageType="announcement", trackingId=-1, payload=announcement_data
                 )
-                await websocket.send_json(announcement.dict())
+                await _send_message(websocket, announcement.dict())
                 if announcement_data.get("type") == "codeUpdate":
                     return
         except WebSocketDisconnect:
@@ -831,6 +847,29 @@ def get_asgi_app(
     return app
 
 
+_binary_frame_ids = itertools.count(1)
+
+
+def _extract_binary_frames(value: Any, frames: List[bytes]) -> Any:
+    """
+    Replaces the binary payloads contained in a message by references, and encodes
+    them as binary websocket frames. A frame starts with the id of the payload
+    (uint32) and the length of its MIME type (uint16), followed by the MIME type
+    and the data.
+    """
+
+    if isinstance(value, BinaryPayload):
+        frame_id = next(_binary_frame_ids)
+        mime_type = (value.mime_type or "").encode("utf-8")
+        frames.append(struct.pack(">IH", frame_id, len(mime_type)) + mime_type + bytes(value.data))
+        return f"{BINARY_FRAME_REFERENCE_PREFIX}{frame_id}"
+    if isinstance(value, dict):
+        return {k: _extract_binary_frames(v, frames) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_extract_binary_frames(v, frames) for v in value]
+    return value
+
+
 def print_init_message():
     print(f"""               
                                                                
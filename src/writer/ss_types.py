@@ -37,6 +37,9 @@ MessageType = Literal[
     "hashRequest",
     "listResources",
     "writerVaultUpdate",
+    "executorMetrics",
+    "cancel",
+    "dataframeQuery",
 ]
 
 
@@ -184,6 +187,33 @@ class HashRequest(AppProcessServerRequest):
     payload: HashRequestPayload
 
 
+class CancelRequestPayload(BaseModel):
+    messageId: int
+
+
+class CancelRequest(AppProcessServerRequest):
+    type: Literal["cancel"]
+    payload: CancelRequestPayload
+
+
+class DataframeQuerySort(BaseModel):
+    columnName: str
+    descending: bool = False
+
+
+class DataframeQueryRequestPayload(BaseModel):
+    id: str
+    offset: int
+    limit: int
+    sort: Optional[DataframeQuerySort] = None
+    search: Optional[str] = None
+
+
+class DataframeQueryRequest(AppProcessServerRequest):
+    type: Literal["dataframeQuery"]
+    payload: DataframeQueryRequestPayload
+
+
 AppProcessServerRequestPacket = Tuple[int, str, AppProcessServerRequest]
 
 # AppProcessServer Responses
@@ -214,7 +244,9 @@ class EventResponsePayload(BaseModel):
     result: Any
     mutations: Dict[str, Any]
     mail: List
+    # Components added or changed, and the IDs of the removed ones
     components: Optional[Dict] = None
+    removedComponentIds: Optional[List[str]] = None
 
 
 class StateEnquiryResponsePayload(BaseModel):
@@ -245,7 +277,15 @@ class HashRequestResponse(AppProcessServerRequest):
     payload: HashRequestResponsePayload
 
 
-AppProcessServerResponsePacket = Tuple[int, Optional[str], AppProcessServerResponse]
+class DataframeQueryResponsePayload(BaseModel):
+    rowCount: int
+    offset: int
+    # Arrow IPC file of the rows, as a data URL or binary payload
+    data: Any
+
+
+# Packets pushed by the AppProcess without being requested have no message id
+AppProcessServerResponsePacket = Tuple[Optional[int], Optional[str], AppProcessServerResponse]
 
 
 class DataFrameRecordAdded(TypedDict):
@@ -295,6 +335,9 @@ class ComponentDefinition(TypedDict):
 
 class BlueprintExecutionLog(BaseModel):
     summary: List[Dict]
+    # Whether the summary only holds the blocks changed since the previous
+    # log entry with the same id
+    isDelta: bool = False
 
 
 class BlueprintExecutionError(Exception):
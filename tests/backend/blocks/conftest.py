@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import pytest
 from writer.blueprints import BlueprintRunner
@@ -24,7 +24,12 @@ class BlockTesterMockBlueprintRunner(BlueprintRunner):
         super().__init__(session)
 
     def run_branch_pool(
-        self, base_component_id: str, base_outcome: str, execution_environments: List[Dict]
+        self,
+        base_component_id: str,
+        base_outcome: str,
+        execution_environments: List[Dict],
+        max_concurrency: Optional[int] = None,
+        chunk_size: int = 1,
     ):
         return len(execution_environments) * [4]
 
@@ -1,5 +1,17 @@
-from writer.blocks.base_block import BlueprintBlock
-from writer.core import WriterState
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import httpx
+import pytest
+import writer.core
+from writer.blocks.base_block import BlueprintBlock, block_map
+from writer.blueprints import BlueprintPlan, BlueprintRunner
+from writer.core import WriterState, use_request_context
+from writer.core_ui import Component
+from writer.ss_types import AppProcessServerRequest, BlueprintExecutionError
 
 
 def test_get_field(session, runner):
@@ -45,3 +57,306 @@ def test_set_state(session, runner):
     assert session.session_state["my_dict"]["animal"] == "cat"
     assert session.session_state["unchanged"] == "unchanged"
     assert block.outcome is None
+
+
+def test_cancelled_request_stops_http_calls(session, runner):
+    component = session.add_fake_component({})
+    block = BlueprintBlock(component, runner, {})
+    cancel_event = threading.Event()
+    cancel_event.set()
+    request = AppProcessServerRequest(type="event")
+    with use_request_context("session_id", request, cancel_event):
+        with pytest.raises(httpx.RequestError):
+            block.acquire_httpx_client().get("http://localhost:1")
+
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_stops_async_http_calls(session, runner):
+    component = session.add_fake_component({})
+    block = BlueprintBlock(component, runner, {})
+    cancel_event = threading.Event()
+    cancel_event.set()
+    request = AppProcessServerRequest(type="event")
+    with use_request_context("session_id", request, cancel_event):
+        with pytest.raises(httpx.RequestError):
+            async with block.acquire_async_httpx_client() as client:
+                await client.get("http://localhost:1")
+
+def test_cancelled_request_stops_blueprint(session):
+    session.session_id = "session_id"
+    component = session.add_fake_component(
+        {"element": "my_element", "value": "my_value"}, type="blueprints_setstate"
+    )
+    runner = BlueprintRunner(session)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    request = AppProcessServerRequest(type="event")
+    with use_request_context("session_id", request, cancel_event):
+        with pytest.raises(BlueprintExecutionError):
+            runner.execute_dag([component], {})
+    assert "my_element" not in session.session_state.to_dict()
+
+
+def _add_blueprint(session, key="my_blueprint"):
+    session.bmc_branch.attach(Component(id="bp", type="blueprints_blueprint", content={"key": key}))
+    session.bmc_branch.attach(Component(
+        id="set", type="blueprints_setstate", parentId="bp",
+        content={"element": "animal", "value": "rat"},
+        outs=[{"outId": "success", "toNodeId": "return"}]
+    ))
+    session.bmc_branch.attach(Component(
+        id="return", type="blueprints_returnvalue", parentId="bp", content={"value": "@{animal}"}
+    ))
+
+
+def test_blueprint_plan(session):
+    _add_blueprint(session)
+    plan = BlueprintPlan.build(session.session_component_tree.get_descendents("bp"))
+    assert plan.root_ids == ("set",)
+    assert plan.inputs == {"return": (("set", "success"),)}
+    assert plan.outputs == {"set": (("return", "success"),), "return": ()}
+    assert plan.in_degree == {"set": 0, "return": 1}
+    assert plan.block_classes["return"].__name__ == "ReturnValue"
+
+
+def test_blueprint_plan_is_cached_until_component_tree_changes(session):
+    session.session_id = "session_id"
+    _add_blueprint(session)
+    runner = BlueprintRunner(session)
+    assert runner.run_blueprint_by_key("my_blueprint", {}) == "rat"
+    plan = runner.get_blueprint_plan("bp")
+    assert runner.run_blueprint_by_key("my_blueprint", {}) == "rat"
+    assert runner.get_blueprint_plan("bp") is plan
+    assert runner.get_branch_plan("set", "success") is runner.get_branch_plan("set", "success")
+    assert runner.get_branch_plan("set", "success").node_ids == ("return",)
+
+    components = session.session_component_tree.to_dict()
+    components["return"]["content"] = {"value": "elephant"}
+    session.session_component_tree.ingest(components)
+    assert runner.get_blueprint_plan("bp") is not plan
+    assert runner.run_blueprint_by_key("my_blueprint", {}) == "elephant"
+
+
+
+def test_blueprint_triggers_are_indexed(session, monkeypatch):
+    session.bmc_branch.attach(Component(id="blueprints_root", type="blueprints_root", content={}))
+    session.bmc_branch.attach(Component(id="bp", type="blueprints_blueprint", parentId="blueprints_root", content={"key": "my_blueprint"}))
+    session.bmc_branch.attach(Component(
+        id="ui", type="blueprints_uieventtrigger", parentId="bp",
+        content={"refComponentId": "button", "refEventType": "wf-click"}
+    ))
+    session.bmc_branch.attach(Component(id="api", type="blueprints_apitrigger", parentId="bp", content={}))
+    runner = BlueprintRunner(session)
+    branches = []
+    monkeypatch.setattr(runner, "run_branch", lambda start_node_id, *args: branches.append(start_node_id))
+
+    assert runner.has_ui_triggers("button", "wf-click")
+    assert not runner.has_ui_triggers("button", "wf-change")
+    runner.execute_ui_trigger("button", "wf-change", {})
+    runner.execute_ui_trigger("button", "wf-click", {})
+    assert branches == ["ui"]
+    assert runner.api_blueprints == {"my_blueprint": "api"}
+    assert runner.api_blueprints is runner.api_blueprints
+
+    session.session_component_tree.delete_component("ui")
+    assert not runner.has_ui_triggers("button", "wf-click")
+
+
+class AsyncSleep(BlueprintBlock):
+    async def run_async(self):
+        await asyncio.sleep(0.2)
+        self.result = threading.current_thread().name
+        self.outcome = "success"
+
+
+def test_async_blocks_run_concurrently_on_event_loop(session, monkeypatch):
+    session.session_id = "session_id"
+    monkeypatch.setitem(block_map, "test_asyncsleep", AsyncSleep)
+    session.bmc_branch.attach(Component(id="bp", type="blueprints_blueprint", content={"key": "bp"}))
+    for i in range(100):
+        session.bmc_branch.attach(Component(
+            id=f"sleep{i}", type="test_asyncsleep", parentId="bp", content={},
+            outs=[{"outId": "success", "toNodeId": "return"}]
+        ))
+    session.bmc_branch.attach(Component(
+        id="return", type="blueprints_returnvalue", parentId="bp", content={"value": "@{result}"}
+    ))
+    runner = BlueprintRunner(session)
+
+    start = time.perf_counter()
+    assert runner.run_blueprint("bp", {}) == "blueprints-async-loop"
+    # In threads, a hundred blocks would hold the twenty workers of the executor for five rounds
+    assert time.perf_counter() - start < 0.8
+
+
+def test_run_pool(session):
+    runner = BlueprintRunner(session)
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def double(env):
+        with lock:
+            running.append(env["n"])
+            max_running.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(env["n"])
+        if env["n"] in (7, 3):
+            raise ValueError(env["n"])
+        return env["n"] * 2
+
+    environments = [{"n": n} for n in range(10)]
+    assert runner._run_pool(double, environments[:3], max_concurrency=2, chunk_size=2) == [0, 2, 4]
+    assert max(max_running) <= 2
+    with pytest.raises(ValueError, match="3"):
+        runner._run_pool(double, environments, chunk_size=3)
+    # All the calls run even though some of them fail
+    assert len(max_running) == 13
+
+
+def test_nested_pools_dont_exhaust_executor(session, monkeypatch):
+    session.session_id = "session_id"
+    session.bmc_branch.attach(Component(id="bp", type="blueprints_blueprint", content={"key": "bp"}))
+    session.bmc_branch.attach(Component(
+        id="outer", type="blueprints_foreach", parentId="bp", content={"items": "[1, 2, 3, 4]"},
+        outs=[{"outId": "loop", "toNodeId": "inner"}]
+    ))
+    session.bmc_branch.attach(Component(
+        id="inner", type="blueprints_foreach", parentId="bp", content={"items": "[1, 2, 3, 4]"},
+        outs=[{"outId": "loop", "toNodeId": "return"}]
+    ))
+    session.bmc_branch.attach(Component(
+        id="return", type="blueprints_returnvalue", parentId="bp", content={"value": "@{item}"}
+    ))
+    runner = BlueprintRunner(session)
+    executor = ThreadPoolExecutor(2)
+
+    @contextmanager
+    def get_executor():
+        yield executor
+
+    monkeypatch.setattr(runner, "_get_executor", get_executor)
+    outcomes = []
+
+    def run():
+        runner.run_blueprint("bp", {})
+        outcomes.append("completed")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    executor.shutdown(wait=False)
+    assert outcomes == ["completed"]
+
+
+def test_run_log_sends_changed_blocks(session, monkeypatch):
+    session.session_id = "session_id"
+    monkeypatch.setattr(writer.core.Config, "is_mail_enabled_for_log", True)
+    monkeypatch.setattr(BlueprintRunner, "LOG_UPDATE_INTERVAL", 0)
+    session.bmc_branch.attach(Component(id="bp", type="blueprints_blueprint", content={"key": "bp"}))
+    for i in range(5):
+        session.bmc_branch.attach(Component(
+            id=f"set{i}", type="blueprints_setstate", parentId="bp",
+            content={"element": f"e{i}", "value": "x"},
+            outs=[{"outId": "success", "toNodeId": f"set{i + 1}"}] if i < 4 else []
+        ))
+    runner = BlueprintRunner(session)
+    runner.run_blueprint("bp", {})
+
+    entries = [mail["payload"] for mail in session.session_state.mail if mail["type"] == "logEntry"]
+    assert len({entry["id"] for entry in entries}) == 1
+    first, *deltas = [entry["blueprintExecution"] for entry in entries]
+    assert not first.isDelta
+    assert {item["componentId"] for item in first.summary} == {f"set{i}" for i in range(5)}
+    assert all(delta.isDelta for delta in deltas)
+    # Each block is summarised when scheduled, started and finished
+    assert sum(len(delta.summary) for delta in deltas) <= 3 * 5
+    assert entries[-1]["message"] == "Execution completed."
+    outcomes = {}
+    for execution_log in [first, *deltas]:
+        outcomes |= {item["componentId"]: item.get("outcome") for item in execution_log.summary}
+    assert outcomes == {f"set{i}": "success" for i in range(5)}
+
+
+def test_summarize_data_for_log_is_bounded(session):
+    runner = BlueprintRunner(session)
+    nested: list = []
+    for _ in range(20):
+        nested = [nested]
+    summary = runner._summarize_data_for_log({
+        "text": "a" * 10_000,
+        "rows": tuple(range(1000)),
+        "nested": nested,
+        "big": {str(i): i for i in range(1000)},
+    })
+    assert len(summary["text"]) == 5003
+    assert summary["rows"] == list(range(100))
+    assert len(summary["big"]) == 100
+    assert "nested too deeply" in str(summary["nested"])
+
+class TimedSleep(BlueprintBlock):
+    times: dict = {}
+
+    def run(self):
+        start = time.perf_counter()
+        time.sleep(float(self.component.content["seconds"]))
+        TimedSleep.times[self.component.id] = (start, time.perf_counter())
+        self.outcome = "success"
+
+
+def test_waiting_thread_returns_to_scheduling_after_helping(session, monkeypatch):
+    session.session_id = "session_id"
+    monkeypatch.setitem(block_map, "test_timedsleep", TimedSleep)
+    session.bmc_branch.attach(Component(id="bp", type="blueprints_blueprint", content={"key": "bp"}))
+    session.bmc_branch.attach(Component(
+        id="fast", type="test_timedsleep", parentId="bp", content={"seconds": "0"},
+        outs=[{"outId": "success", "toNodeId": "next"}]
+    ))
+    session.bmc_branch.attach(Component(
+        id="slow", type="test_timedsleep", parentId="bp", content={"seconds": "0.5"}
+    ))
+    session.bmc_branch.attach(Component(
+        id="next", type="test_timedsleep", parentId="bp", content={"seconds": "0"}
+    ))
+    runner = BlueprintRunner(session)
+    executor = ThreadPoolExecutor(1)
+    # The only worker is busy at first, the waiting thread runs the blocks
+    executor.submit(time.sleep, 0.1)
+
+    @contextmanager
+    def get_executor():
+        yield executor
+
+    monkeypatch.setattr(runner, "_get_executor", get_executor)
+    runner.run_blueprint("bp", {})
+    executor.shutdown()
+    # The block following the fast one is scheduled without waiting for the slow one
+    assert TimedSleep.times["next"][0] < TimedSleep.times["slow"][1]
+
+
+@pytest.mark.explicit
+def test_benchmark_run_branch(session):
+    """
+    Measures the preparation of a branch of a large blueprint, as done by ForEach loops.
+
+    >>> pytest tests/backend/blocks/test_base_block.py -k benchmark_run_branch --full-run -s
+    """
+    import time
+
+    session.bmc_branch.attach(Component(id="bp", type="blueprints_blueprint", content={"key": "bp"}))
+    for i in range(500):
+        session.bmc_branch.attach(Component(
+            id=f"set{i}", type="blueprints_setstate", parentId="bp",
+            content={"element": f"e{i}", "value": "x"},
+            outs=[{"outId": "success", "toNodeId": f"set{i + 1}"}] if i < 499 else []
+        ))
+    runner = BlueprintRunner(session)
+
+    iterations = 1_000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        runner.get_branch_plan("set490", "success")
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed / iterations * 1e6:.1f} µs per branch plan")
@@ -120,3 +120,53 @@ def test_patched_request_with_json_and_bad_path(session, runner, monkeypatch):
         block.run()
     assert block.outcome == "responseError"  # due to not "ok"
     assert block.result.get("body").get("error_message") == "Page not found."
+
+
+async def fake_async_request(client, *args, **kwargs):
+    return fake_request(client, *args, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_patched_async_request(session, runner, monkeypatch):
+    monkeypatch.setattr("httpx.AsyncClient.request", fake_async_request)
+    component = session.add_fake_component({"url": "https://www.duck.com"})
+    block = HTTPRequest(component, runner, {})
+    assert block.is_async
+    await block.run_async()
+    assert block.outcome == "success"
+    assert block.result.get("body") == "Ducks are birds."
+
+
+@pytest.mark.asyncio
+async def test_patched_async_request_to_nowhere(session, runner, monkeypatch):
+    monkeypatch.setattr("httpx.AsyncClient.request", fake_async_request)
+    component = session.add_fake_component({"url": "https://www.cat.com"})
+    block = HTTPRequest(component, runner, {})
+    with pytest.raises(httpx.ConnectError):
+        await block.run_async()
+    assert block.outcome == "connectionError"
+
+
+def test_sync_subclass_and_custom_client_run_sync(session, runner):
+    class SyncHTTPRequest(HTTPRequest):
+        def run(self):
+            super().run()
+
+    class CustomClientHTTPRequest(HTTPRequest, custom_httpx_client=httpx.Client()):
+        pass
+
+    component = session.add_fake_component({"url": "https://www.duck.com"})
+    assert not SyncHTTPRequest(component, runner, {}).is_async
+    assert not CustomClientHTTPRequest(component, runner, {}).is_async
+
+
+def test_custom_async_client(session, runner):
+    custom_client = httpx.AsyncClient()
+
+    class CustomClientHTTPRequest(HTTPRequest, custom_async_httpx_client=custom_client):
+        pass
+
+    component = session.add_fake_component({"url": "https://www.duck.com"})
+    block = CustomClientHTTPRequest(component, runner, {})
+    assert block.is_async
+    assert block.acquire_async_httpx_client() is custom_client
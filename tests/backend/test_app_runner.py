@@ -1,12 +1,31 @@
 import asyncio
+import multiprocessing
+import os
+import pickle
+import shutil
 import threading
+import time
 
 import pytest
-from writer.app_runner import AppRunner
+import writer
+from writer.app_runner import (
+    AppProcess,
+    AppProcessListener,
+    AppRunner,
+    ExecutorLane,
+    MutationPusher,
+    SharedMemoryPacket,
+)
 from writer.ss_types import (
+    AppProcessServerRequest,
+    AppProcessServerResponse,
+    CancelRequest,
+    CancelRequestPayload,
+    ComponentUpdateRequestPayload,
     EventRequest,
     InitSessionRequest,
     InitSessionRequestPayload,
+    StateEnquiryResponsePayload,
     WriterEvent,
 )
 
@@ -113,7 +132,7 @@ class TestAppRunner:
 
     @pytest.mark.asyncio
     @pytest.mark.usefixtures("setup_app_runner")
-    async def test_backend_ui_event_should_load_blueprint_component_in_edit_mode(
+    async def test_backend_ui_event_should_send_only_changed_components_in_edit_mode(
         self, setup_app_runner
     ) -> None:
         ar: AppRunner
@@ -149,7 +168,10 @@ class TestAppRunner:
             )
 
             rev = await ar.dispatch_message(self.proposed_session_id, ev_req)
-            assert rev.payload.components.get("blueprints_root") is not None
+            # The blueprints are sent on initialisation, events send the text widget created
+            assert rev.payload.components.get("blueprints_root") is None
+            assert [c["type"] for c in rev.payload.components.values()] == ["text"]
+            assert rev.payload.removedComponentIds == []
 
     @pytest.mark.asyncio
     @pytest.mark.usefixtures("setup_app_runner")
@@ -317,6 +339,33 @@ class TestAppRunner:
 
             assert mail[0].get("payload").get("message") == "188542\n"
 
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("setup_app_runner")
+    async def test_code_update_keeps_serving_until_switch(self, setup_app_runner) -> None:
+        with setup_app_runner(test_app_dir, "edit") as ar:
+            ar.hook_to_running_event_loop()
+            ar.load()
+            session_id = await init_app_session(ar)
+            aq = asyncio.Queue()
+            ar.announcement_queues["dummy_session"] = aq
+            loader_thread = threading.Thread(
+                target=ar.update_code, args=(None, "import time\ntime.sleep(2)\n")
+            )
+            loader_thread.start()
+
+            # The standby AppProcess is still running the new code
+            await asyncio.sleep(0.5)
+            start = time.perf_counter()
+            assert await ar.check_session(session_id) is True
+            assert time.perf_counter() - start < 1
+
+            assert (await aq.get()).get("type") == "codeUpdate"
+            await asyncio.to_thread(loader_thread.join)
+            del ar.announcement_queues["dummy_session"]
+
+            # Sessions are re-initialised against the new AppProcess
+            assert await ar.check_session(session_id) is False
+
     @pytest.mark.asyncio
     @pytest.mark.usefixtures("setup_app_runner")
     async def test_handle_event_should_return_result_of_event_handler_execution(
@@ -345,3 +394,416 @@ class TestAppRunner:
 
             # Then
             assert res.payload.result["result"] is not None
+
+    def test_session_worker_routing(self) -> None:
+        ar = AppRunner(test_app_dir, "run", workers=4)
+        try:
+            si = InitSessionRequest(
+                type="sessionInit",
+                payload=InitSessionRequestPayload(
+                    cookies={}, headers={}, proposedSessionId=self.proposed_session_id
+                ),
+            )
+            er = EventRequest(
+                type="event",
+                payload=WriterEvent(type="click", instancePath=[], payload={}),
+            )
+            init_worker = ar._get_session_worker(None, si)
+            assert init_worker is ar._get_session_worker(self.proposed_session_id, er)
+            assert ar._get_session_worker(None, er) is ar.workers[0]
+        finally:
+            ar.shut_down()
+
+    def test_blueprint_index(self) -> None:
+        ar = AppRunner(test_app_dir, "run")
+        try:
+            ar.bmc_components = {
+                "bp1": {"id": "bp1", "type": "blueprints_blueprint", "content": {"key": "first"}},
+                "bp2": {"id": "bp2", "type": "blueprints_blueprint", "content": {"key": "second"}},
+                "api": {"id": "api", "type": "blueprints_apitrigger", "parentId": "bp2", "content": {}},
+            }
+            assert ar.find_blueprint_id("first") == "bp1"
+            assert ar.find_blueprint_id("ghost") is None
+            assert not ar.has_api_trigger("bp1")
+            assert ar.has_api_trigger("bp2")
+
+            ar.bmc_components = {
+                "bp1": {"id": "bp1", "type": "blueprints_blueprint", "content": {"key": "first"}},
+                "api": {"id": "api", "type": "blueprints_apitrigger", "parentId": "bp1", "content": {}},
+            }
+            assert ar.find_blueprint_id("second") is None
+            assert ar.has_api_trigger("bp1")
+        finally:
+            ar.shut_down()
+
+    def test_init_wrong_workers(self) -> None:
+        with pytest.raises(ValueError):
+            AppRunner(test_app_dir, "run", workers=0)
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("setup_app_runner")
+    async def test_sessions_across_workers(self, setup_app_runner, tmp_path) -> None:
+        # The component update is saved to the app folder
+        app_dir = shutil.copytree(test_app_dir, tmp_path / "app")
+        ar: AppRunner
+        with setup_app_runner(app_dir, "edit", load=True, workers=2) as ar:
+            session_ids = [f"{i:064x}" for i in range(8)]
+            for session_id in session_ids:
+                await init_app_session(ar, session_id=session_id)
+            ev_req = AppProcessServerRequest(type="checkSession", payload=None)
+            assert {ar._get_session_worker(s, ev_req) for s in session_ids} == set(ar.workers)
+            for session_id in session_ids:
+                assert await ar.check_session(session_id) is True
+
+            # Component updates reach the base tree of every worker
+            components = {
+                **ar.bmc_components,
+                "pool-text": {
+                    "id": "pool-text",
+                    "type": "text",
+                    "content": {"text": "Pooled"},
+                    "parentId": "bb4d0e86-619e-4367-a180-be28ab6059f4",
+                    "position": 0,
+                },
+            }
+            res = await ar.update_components(
+                session_ids[0], ComponentUpdateRequestPayload(components=components)
+            )
+            assert res.status == "ok"
+            for i in range(8, 16):
+                res = await ar.init_session(
+                    InitSessionRequestPayload(cookies={}, headers={}, proposedSessionId=f"{i:064x}")
+                )
+                assert res.payload.components.get("pool-text") is not None
+
+            # Lets the save go through before shutting down
+            page_file = "components-page-0-bb4d0e86-619e-4367-a180-be28ab6059f4.jsonl"
+            components_file = app_dir / ".wf" / page_file
+            for _ in range(100):
+                if "pool-text" in components_file.read_text():
+                    break
+                await asyncio.sleep(0.05)
+
+    def test_shared_memory_packet(self) -> None:
+        packet = (1, "session", {"data": "x" * 4096})
+        data = pickle.dumps(packet)
+        shm_packet = SharedMemoryPacket.write(data)
+
+        assert shm_packet.size == len(data)
+        assert shm_packet.read() == packet
+        with pytest.raises(FileNotFoundError):
+            shm_packet.read()
+
+        shm_packet = SharedMemoryPacket.write(data)
+        shm_packet.discard()
+        with pytest.raises(FileNotFoundError):
+            shm_packet.read()
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("setup_app_runner")
+    async def test_large_response_through_shared_memory(
+        self, setup_app_runner, monkeypatch
+    ) -> None:
+        # The class attribute reaches forked AppProcesses, the variable spawned ones
+        monkeypatch.setenv("WRITER_SHARED_MEMORY_THRESHOLD", "1")
+        monkeypatch.setattr(AppProcess, "SHARED_MEMORY_THRESHOLD", 1)
+        shm_reads = []
+        read = SharedMemoryPacket.read
+
+        def spy_read(shm_packet):
+            shm_reads.append(shm_packet.name)
+            return read(shm_packet)
+
+        monkeypatch.setattr(SharedMemoryPacket, "read", spy_read)
+        ar: AppRunner
+        with setup_app_runner(test_app_dir, "edit", load=True) as ar:
+            session_id = await init_app_session(ar, session_id=self.proposed_session_id)
+            assert session_id == self.proposed_session_id
+            assert await ar.check_session(session_id) is True
+            assert len(shm_reads) == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="Needs POSIX shared memory")
+    async def test_shared_memory_released_on_shutdown(self, monkeypatch) -> None:
+        monkeypatch.setenv("WRITER_SHARED_MEMORY_THRESHOLD", "1")
+        monkeypatch.setattr(AppProcess, "SHARED_MEMORY_THRESHOLD", 1)
+        blocks_before = set(os.listdir("/dev/shm"))
+        ar = AppRunner(test_app_dir, "edit")
+        try:
+            ar.load()
+            session_id = await init_app_session(ar)
+            # Responses in flight when the runner shuts down are never received
+            for _ in range(20):
+                asyncio.create_task(ar.check_session(session_id))
+            await asyncio.sleep(0)
+        finally:
+            ar.shut_down()
+        await asyncio.sleep(0)
+
+        assert set(os.listdir("/dev/shm")) - blocks_before == set()
+
+    @pytest.mark.explicit
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("setup_app_runner")
+    async def test_benchmark_round_trip(self, setup_app_runner) -> None:
+        """
+        Measures the round-trip latency of checkSession and event messages.
+
+        >>> pytest tests/backend/test_app_runner.py -k benchmark --full-run -s
+        """
+        rounds = 1000
+        with setup_app_runner(test_app_dir, "run", load=True) as ar:
+            session_id = await init_app_session(ar)
+            event = WriterEvent(
+                type="wf-number-change",
+                instancePath=self.numberinput_instance_path,
+                payload="129673",
+            )
+            messages = {
+                "checkSession": lambda: ar.check_session(session_id),
+                "event": lambda: ar.handle_event(session_id, event),
+            }
+            for name, send in messages.items():
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    await send()
+                elapsed = time.perf_counter() - start
+                print(f"{name}: {elapsed / rounds * 1e6:.1f} µs per round-trip")
+
+    @pytest.mark.explicit
+    @pytest.mark.usefixtures("setup_app_runner")
+    @pytest.mark.parametrize("mode", ["run", "edit"])
+    @pytest.mark.parametrize("start_method", ["fork", "spawn", "forkserver"])
+    def test_benchmark_startup(self, setup_app_runner, monkeypatch, mode, start_method) -> None:
+        """
+        Measures the time it takes to start the AppProcess and run the app, per start method.
+
+        >>> pytest tests/backend/test_app_runner.py -k benchmark_startup --full-run -s
+        """
+        if start_method not in multiprocessing.get_all_start_methods():
+            pytest.skip(f"{start_method} isn't available on this platform.")
+        monkeypatch.setattr(AppProcess, "START_METHOD", start_method)
+        rounds = 5
+        timings = []
+        for _ in range(rounds):
+            with setup_app_runner(test_app_dir, mode) as ar:
+                start = time.perf_counter()
+                ar.load()
+                timings.append(time.perf_counter() - start)
+        print(
+            f"{start_method} ({mode}): first start {timings[0] * 1e3:.0f} ms, "
+            f"then {min(timings[1:]) * 1e3:.0f} ms"
+        )
+
+    @pytest.mark.usefixtures("setup_app_runner")
+    def test_forkserver_start_method(self, setup_app_runner, monkeypatch) -> None:
+        if "forkserver" not in multiprocessing.get_all_start_methods():
+            pytest.skip("forkserver isn't available on this platform.")
+        monkeypatch.setattr(AppProcess, "START_METHOD", "forkserver")
+        with setup_app_runner(test_app_dir, "edit", load=True) as ar:
+            assert ar.is_app_process_server_ready.is_set()
+            assert ar.workers[0].app_process.is_alive()
+
+    def test_unavailable_start_method(self, monkeypatch) -> None:
+        monkeypatch.setattr(AppProcess, "START_METHOD", "teleport")
+        with pytest.raises(ValueError):
+            AppRunner(test_app_dir, "edit")
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("setup_app_runner")
+    async def test_init_session_keeps_payload_untouched(self, setup_app_runner) -> None:
+        ar: AppRunner
+        with setup_app_runner(test_app_dir, "edit", load=True, workers=2) as ar:
+            payload = InitSessionRequestPayload(cookies={}, headers={}, proposedSessionId=None)
+            res = await ar.init_session(payload)
+
+            assert payload.proposedSessionId is None
+            assert res.payload.sessionId is not None
+            assert await ar.check_session(res.payload.sessionId) is True
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("setup_app_runner")
+    async def test_cancelled_dispatch(self, setup_app_runner, caplog) -> None:
+        ar: AppRunner
+        with setup_app_runner(test_app_dir, "edit", load=True) as ar:
+            cancelled_message_ids = []
+            cancel_message = ar._cancel_message
+
+            def _cancel_message_spy(worker, message_id, session_id):
+                cancelled_message_ids.append(message_id)
+                cancel_message(worker, message_id, session_id)
+
+            ar._cancel_message = _cancel_message_spy
+            task = asyncio.create_task(
+                ar.init_session(
+                    InitSessionRequestPayload(
+                        cookies={}, headers={}, proposedSessionId=self.proposed_session_id
+                    )
+                )
+            )
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert len(cancelled_message_ids) == 1
+
+            # The late response is dropped without disturbing the following messages
+            assert await ar.check_session(self.proposed_session_id) in (True, False)
+            session_id = await init_app_session(ar)
+            assert await ar.check_session(session_id) is True
+            assert not [r for r in caplog.records if r.name == "asyncio"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("setup_app_runner")
+    async def test_dispatch_to_dead_app_process(self, setup_app_runner) -> None:
+        ar: AppRunner
+        with setup_app_runner(test_app_dir, "edit", load=True) as ar:
+            session_id = await init_app_session(ar)
+            app_process = ar.workers[0].app_process
+            app_process.kill()
+            app_process.join()
+
+            with pytest.raises(ConnectionError):
+                await asyncio.wait_for(ar.check_session(session_id), timeout=5)
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("setup_app_runner")
+    async def test_set_userinfo_from_serve_loop(self, setup_app_runner) -> None:
+        ar: AppRunner
+        with setup_app_runner(test_app_dir, "edit") as ar:
+            ar.hook_to_running_event_loop()
+            ar.load()
+            session_id = await init_app_session(ar)
+            pending_check = asyncio.create_task(ar.check_session(session_id))
+
+            start = time.perf_counter()
+            ar.set_userinfo(session_id, {"email": "user@example.com"})
+            assert time.perf_counter() - start < 5
+            assert await asyncio.wait_for(pending_check, timeout=5) is True
+
+    def test_executor_lane_metrics(self) -> None:
+        lane = ExecutorLane("test", 1)
+        release = threading.Event()
+        try:
+            blocking = lane.submit(release.wait)
+            queued = lane.submit(lambda: 1)
+            time.sleep(0.1)
+            metrics = lane.get_metrics()
+            assert metrics["maxWorkers"] == 1
+            assert metrics["queued"] == 1
+            assert metrics["maxQueued"] >= 1
+            assert metrics["running"] == 1
+            assert metrics["completed"] == 0
+            release.set()
+            assert blocking.result(timeout=5) is True
+            assert queued.result(timeout=5) == 1
+            metrics = lane.get_metrics()
+            assert metrics["queued"] == 0
+            assert metrics["running"] == 0
+            assert metrics["completed"] == 2
+        finally:
+            release.set()
+            lane.shutdown()
+
+    @pytest.mark.asyncio
+    @pytest.mark.usefixtures("setup_app_runner")
+    async def test_control_messages_not_starved_by_events(
+        self, setup_app_runner, monkeypatch
+    ) -> None:
+        monkeypatch.setattr(AppProcess, "EVENT_LANE_WORKERS", 1)
+        ar: AppRunner
+        with setup_app_runner(test_app_dir, "edit", load=True) as ar:
+            session_id = await init_app_session(ar)
+            # The async handler occupies the only thread of the events lane for 3 seconds
+            ev_req = EventRequest(
+                type="event",
+                payload=WriterEvent(type="wf-click", instancePath=self.async_handler_click_path),
+            )
+            pending_event = asyncio.create_task(ar.dispatch_message(session_id, ev_req))
+            await asyncio.sleep(0.5)
+
+            start = time.perf_counter()
+            assert await ar.check_session(session_id) is True
+            assert time.perf_counter() - start < 1
+            metrics = await ar.get_executor_metrics()
+            assert (await pending_event).status == "ok"
+
+        assert len(metrics) == 1
+        assert set(metrics[0]) == {"control", "events", "blueprints"}
+        assert metrics[0]["events"]["maxWorkers"] == 1
+        assert metrics[0]["events"]["running"] == 1
+
+    def test_cancel_message(self) -> None:
+        app_process = AppProcess(
+            None, None, test_app_dir, "edit", "", {}, None, None  # type: ignore
+        )
+        app_process.cancel_events[1] = ("session_a", threading.Event())
+        request = CancelRequest(type="cancel", payload=CancelRequestPayload(messageId=1))
+
+        # Only the session that sent a message can cancel it
+        (_, _, response) = app_process._handle_message_and_get_packet(2, "session_b", request)
+        assert response.status == "ok"
+        assert not app_process.cancel_events[1][1].is_set()
+        app_process._handle_message_and_get_packet(3, "session_a", request)
+        assert app_process.cancel_events[1][1].is_set()
+
+        # Cancelled before being picked up
+        event_request = EventRequest(type="event", payload=WriterEvent(type="wf-click"))
+        (_, _, response) = app_process._handle_message_and_get_packet(
+            1, "session_a", event_request
+        )
+        assert response.status == "error"
+        assert "cancelled" in response.status_message
+        assert app_process.cancel_events == {}
+
+    def test_push_mutations(self) -> None:
+        client_conn, server_conn = multiprocessing.Pipe(duplex=True)
+        app_process = AppProcess(
+            client_conn, server_conn, test_app_dir, "edit", "", {}, None, None  # type: ignore
+        )
+        app_process.server_conn_lock = threading.Lock()
+        app_process.mutation_pusher = MutationPusher(app_process, threading.Event())
+        session = writer.session_manager.get_new_session()
+        try:
+            session.session_state.user_state.get_mutations_as_dict()
+            app_process._push_mutations(session.session_id)
+            assert not client_conn.poll(0.1)
+
+            session.session_state["pushed_counter"] = 1
+            app_process._push_mutations(session.session_id)
+            pushed = []
+            listener = AppProcessListener(client_conn, on_push=pushed.append)
+            assert client_conn.poll(1)
+            listener._handle_readable()
+            assert len(pushed) == 1
+            (message_id, session_id, response) = pushed[0]
+            assert message_id is None
+            assert session_id == session.session_id
+            assert response.payload.mutations == {"+pushed_counter": 1}
+
+            # Nothing is pushed once the server is terminating
+            app_process.mutation_pusher.is_mutation_pusher_terminated.set()
+            session.session_state["pushed_counter"] = 2
+            app_process._push_mutations(session.session_id)
+            assert not client_conn.poll(0.1)
+        finally:
+            writer.session_manager.close_session(session.session_id)
+            client_conn.close()
+            server_conn.close()
+
+    @pytest.mark.asyncio
+    async def test_pushed_mutations_announced(self) -> None:
+        ar = AppRunner(test_app_dir, "edit")
+        try:
+            aq = asyncio.Queue()
+            ar.announcement_queues["session_a"] = aq
+            payload = StateEnquiryResponsePayload(mutations={"+counter": 2}, mail=[])
+            response = AppProcessServerResponse(status="ok", payload=payload)
+            ar._handle_push((None, "session_a", response))
+            ar._handle_push((None, "session_b", response))
+            announcement = aq.get_nowait()
+            assert announcement["type"] == "stateMutations"
+            assert announcement["payload"]["mutations"] == {"+counter": 2}
+            assert aq.empty()
+        finally:
+            ar.shut_down()
@@ -1,5 +1,8 @@
+import copy
 import json
 import math
+import threading
+import time
 import typing
 import unittest
 import urllib
@@ -17,10 +20,14 @@ import pytest
 import writer as wf
 from writer import audit_and_fix, wf_project
 from writer.core import (
+    BinaryPayload,
     BytesWrapper,
     EventDeserialiser,
     FileWrapper,
+    MutableDict,
+    MutableList,
     MutableValue,
+    SerialisationCache,
     SessionManager,
     State,
     StateSerialiser,
@@ -28,8 +35,11 @@ from writer.core import (
     WriterState,
     import_failure,
     parse_state_variable_expression,
+    state_serialiser,
+    use_binary_payloads,
 )
-from writer.ss_types import WriterEvent
+from writer.core_df import find_windowed_dataframe
+from writer.ss_types import DataframeQuerySort, WriterEvent
 
 from tests.backend import test_app_dir
 from tests.backend.fixtures import (
@@ -254,6 +264,108 @@ class TestStateProxy(unittest.TestCase):
         assert a == {}
 
 
+    def test_state_diffs(self) -> None:
+        wf.Config.is_state_diff_enabled = True
+        try:
+            s = WriterState({"items": list(range(1000)), "chat": [{"content": "Hello"}], "flag": 1})
+            # The first mutation of a value carries it whole
+            m = s._state_proxy.get_mutations_as_dict()
+            assert m["+items"] == list(range(1000))
+
+            s["items"] = s["items"] + [1000]
+            s["flag"] = 2
+            m = s._state_proxy.get_mutations_as_dict()
+            assert m == {
+                "~items": [
+                    {"op": "splice", "path": [], "start": 1000, "deleteCount": 0, "values": [1000]}
+                ],
+                # Patches aren't used when they're not much smaller than the value
+                "+flag": 2,
+            }
+
+            s["chat"] = [{"content": "Hello" + " world" * 50}]
+            s._state_proxy.get_mutations_as_dict()
+            s["chat"] = [{"content": "Hello" + " world" * 51}]
+            m = s._state_proxy.get_mutations_as_dict()
+            assert m == {"~chat": [{"op": "append", "path": [0, "content"], "value": " world"}]}
+
+            # The full state is sent on initialisation, the next mutation carries the whole value
+            s._state_proxy.to_dict()
+            s["items"] = s["items"] + [1002]
+            assert "+items" in s._state_proxy.get_mutations_as_dict()
+        finally:
+            wf.Config.is_state_diff_enabled = False
+
+    def test_state_diffs_disabled(self) -> None:
+        s = WriterState({"items": list(range(1000))})
+        s._state_proxy.get_mutations_as_dict()
+        s["items"] = s["items"] + [1000]
+        s._state_proxy.get_mutations_as_dict()
+        s["items"] = s["items"] + [1001]
+        assert s._state_proxy.get_mutations_as_dict() == {"+items": list(range(1002))}
+
+    def test_mutable_list_operations(self) -> None:
+        s = WriterState({"items": MutableList(range(10))})
+        s._state_proxy.get_mutations_as_dict()
+        s["items"].append(10)
+        s["items"].insert(0, -1)
+        del s["items"][-1]
+        s["items"][1] = "zero"
+        s["items"].pop(2)
+        assert s._state_proxy.get_mutations_as_dict() == {
+            "~items": [
+                {"op": "splice", "path": [], "start": 10, "deleteCount": 0, "values": [10]},
+                {"op": "splice", "path": [], "start": 0, "deleteCount": 0, "values": [-1]},
+                {"op": "splice", "path": [], "start": 11, "deleteCount": 1, "values": []},
+                {"op": "set", "path": [1], "value": "zero"},
+                {"op": "splice", "path": [], "start": 2, "deleteCount": 1, "values": []},
+            ]
+        }
+        assert s._state_proxy.get_mutations_as_dict() == {}
+
+        s["items"].sort(key=str)
+        assert s._state_proxy.get_mutations_as_dict() == {"+items": sorted([-1, "zero", *range(2, 10)], key=str)}
+
+    def test_mutable_dict_operations(self) -> None:
+        class DictSchema(WriterState):
+            options: dict
+
+        s = DictSchema({"options": MutableDict({"a": 1, "b": 2})})
+        s._state_proxy.get_mutations_as_dict()
+        s["options"]["c"] = 3
+        del s["options"]["a"]
+        s["options"].pop("missing", None)
+        assert s._state_proxy.get_mutations_as_dict() == {
+            "~options": [
+                {"op": "set", "path": ["c"], "value": 3},
+                {"op": "delete", "path": ["a"]},
+            ]
+        }
+
+    def test_mutable_list_reassigned(self) -> None:
+        s = WriterState({"items": MutableList([1, 2])})
+        s._state_proxy.get_mutations_as_dict()
+        s["items"] += [3]
+        assert s._state_proxy.get_mutations_as_dict() == {"+items": [1, 2, 3]}
+        assert s._state_proxy.get_mutations_as_dict() == {}
+
+    def test_plain_list_keeps_identity(self) -> None:
+        s = WriterState()
+        items: list = []
+        s["items"] = items
+        items.append("x")
+        assert s["items"] is items
+        assert s._state_proxy.get_mutations_as_dict() == {"+items": ["x"]}
+
+    def test_mutable_list_copy_drops_operations(self) -> None:
+        items = MutableList([1])
+        items.append(2)
+        cloned = copy.deepcopy(items)
+        assert cloned == [1, 2]
+        assert cloned.get_patch() == []
+        assert not cloned.mutated()
+
+
 class TestState:
     def test_state_shema_set_dictionary_in_a_state_should_transform_it_in_state_proxy_and_trigger_mutation(
         self,
@@ -693,6 +805,69 @@ class TestWriterState:
         json.dumps(cloned_s.user_state.to_dict())
         json.dumps(cloned_s.mail)
 
+    def test_get_clone_shares_values(self) -> None:
+        base_s = WriterState(
+            {"items": [1, 2], "df": pd.DataFrame({"a": [1, 2]}), "nested": {"items": [3]}, "name": "a"}
+        )
+        cloned_s = base_s.get_clone()
+        assert cloned_s.user_state.state["df"].value is base_s.user_state.state["df"]
+        assert cloned_s.user_state.state["name"] is base_s.user_state.state["name"]
+
+        cloned_s["items"].append(3)
+        cloned_s["nested"]["items"].append(4)
+        cloned_s["df"].loc[0, "a"] = 10
+        assert base_s["items"] == [1, 2]
+        assert base_s["nested"]["items"] == [3]
+        assert base_s["df"]["a"].tolist() == [1, 2]
+        assert cloned_s.user_state.to_dict()["items"] == [1, 2, 3]
+
+    def test_get_clone_copies_value_once(self) -> None:
+        copies = []
+
+        class SlowCopy:
+            def __deepcopy__(self, memo):
+                copies.append(self)
+                time.sleep(0.05)
+                return SlowCopy()
+
+        cloned_s = WriterState({"value": SlowCopy()}).get_clone()
+        values = []
+        threads = [threading.Thread(target=lambda: values.append(cloned_s["value"])) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(copies) == 1
+        assert all(value is values[0] for value in values)
+
+    @pytest.mark.explicit
+    def test_benchmark_session_memory(self) -> None:
+        """
+        Measures the memory used by 1,000 session states cloned from an initial state.
+
+        >>> pytest tests/backend/test_core.py -k benchmark_session_memory --full-run -s
+        """
+        import tracemalloc
+
+        base_s = WriterState(
+            {
+                "df": pd.DataFrame({"a": range(100_000), "b": ["text"] * 100_000}),
+                "items": [{"id": i, "label": f"Item {i}"} for i in range(10_000)],
+                "settings": {"theme": "dark", "page": 0},
+            }
+        )
+        sessions = 1000
+        tracemalloc.start()
+        start = time.perf_counter()
+        clones = [base_s.get_clone() for _ in range(sessions)]
+        elapsed = time.perf_counter() - start
+        (size, _) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{size / sessions / 1024:.1f} KiB and {elapsed / sessions * 1e6:.0f} µs per session "
+            f"({len(clones)} sessions)"
+        )
+
     def test_mail(self) -> None:
         self.base_s.set_page("my_page_key")
         self.base_s.add_mail("my_own_mail", 2)
@@ -1091,6 +1266,49 @@ class TestStateSerialiser:
         assert table.column("name")[0].as_py() == "Byte"
         assert table.column("length_cm")[2].as_py() == 32
 
+    def test_dataframe_serialisation_cache(self, monkeypatch) -> None:
+        sts = StateSerialiser()
+        calls = []
+        serialise_table = sts._serialise_pyarrow_table
+        monkeypatch.setattr(sts, "_serialise_pyarrow_table", lambda t: calls.append(t) or serialise_table(t))
+        df = pd.read_csv(self.df_path)
+
+        first = sts.serialise(df)
+        assert sts.serialise(copy.deepcopy(df)) == first
+        assert len(calls) == 1
+
+        df.loc[0, "name"] = "Changed"
+        assert sts.serialise(df) != first
+        assert len(calls) == 2
+
+        table = pa.table({"a": [1, 2, 3]})
+        sts.serialise(table)
+        sts.serialise(pa.table({"a": [1, 2, 3]}))
+        assert len(calls) == 3
+
+    def test_binary_payloads(self) -> None:
+        sts = StateSerialiser()
+        d = {"file": BytesWrapper(b"data", "text/plain"), "df": pd.read_csv(self.df_path)}
+        with use_binary_payloads():
+            s = sts.serialise(d)
+        assert s["file"] == BinaryPayload(b"data", "text/plain")
+        assert s["df"].mime_type == "application/vnd.apache.arrow.file"
+        table = pa.ipc.open_file(pa.BufferReader(s["df"].data)).read_all()
+        assert table.column("name")[0].as_py() == "Byte"
+        assert sts.serialise(d)["file"] == "data:text/plain;base64,ZGF0YQ=="
+
+    def test_serialisation_cache_eviction(self) -> None:
+        cache = SerialisationCache(max_size=10)
+        cache.put("a", "aaaa")
+        cache.put("b", "bbbb")
+        cache.get("a")
+        cache.put("c", "cccc")
+        assert cache.get("b") is None
+        assert cache.get("a") == "aaaa"
+        assert cache.size == 8
+        cache.put("d", "d" * 11)
+        assert cache.get("d") is None
+
 
 class TestSessionManager:
     sm = SessionManager()
@@ -1483,6 +1701,59 @@ class TestEditableDataFrame:
         # Then
         assert len(table) == 3
 
+    def test_editable_dataframe_should_buffer_added_and_removed_records(self) -> None:
+        df = pandas.DataFrame({"name": ["Alice", "Bob", "Charlie"], "age": [25, 30, 35]})
+        edf = wf.EditableDataFrame(df)
+
+        # When
+        edf.record_add({"record": {"name": "David", "age": 40}})
+        edf.record_remove({"record_index": 0})
+        edf.record_remove({"record_index": 1})
+        edf.record_update({"record_index": 1, "record": {"name": "Dave", "age": 41}})
+
+        # Then
+        assert len(edf._added_records) == 1
+        assert edf._removed_indexes == [0, 2]
+        assert edf.record(0)["name"] == "Bob"
+        assert edf.record(1) == {"name": "Dave", "age": 41}
+        assert edf.df["name"].tolist() == ["Bob", "Dave"]
+        assert edf._added_records == []
+        with pytest.raises(IndexError):
+            edf.record(2)
+
+    def test_editable_dataframe_should_send_row_deltas(self) -> None:
+        df = pandas.DataFrame({"name": ["Alice", "Bob"], "age": [25, 30]})
+        s = WriterState({"edf": wf.EditableDataFrame(df)})
+        m = s._state_proxy.get_mutations_as_dict()
+        assert m["+edf"]["type"] == "editableDataframe"
+        assert m["+edf"]["version"] == 0
+
+        # When
+        s["edf"].record_add({"record": {"name": "Charlie", "age": 35}})
+        s["edf"].record_remove({"record_index": 0})
+        m = s._state_proxy.get_mutations_as_dict()
+
+        # Then
+        assert m == {
+            "~edf": [{"op": "splice", "path": ["deltas"], "start": 0, "deleteCount": 0, "values": [
+                {"version": 1, "op": "add", "record": {"name": "Charlie", "age": 35}},
+                {"version": 2, "op": "remove", "index": 0},
+            ]}]
+        }
+        s["edf"].record_update({"record_index": 0, "record": {"name": "Bob", "age": 31}})
+        m = s._state_proxy.get_mutations_as_dict()
+        assert m["~edf"][0]["start"] == 2
+
+        # The whole table is sent again after MAX_DELTAS deltas, or when the dataframe is replaced
+        for _ in range(wf.EditableDataFrame.MAX_DELTAS):
+            s["edf"].record_update({"record_index": 0, "record": {"name": "Bob", "age": 32}})
+        m = s._state_proxy.get_mutations_as_dict()
+        assert m["+edf"]["version"] == wf.EditableDataFrame.MAX_DELTAS + 3
+        s["edf"].record_update({"record_index": 0, "record": {"name": "Bob", "age": 33}})
+        assert "~edf" in s._state_proxy.get_mutations_as_dict()
+        s["edf"].df = df
+        assert "+edf" in s._state_proxy.get_mutations_as_dict()
+
 
 def test_import_failure_returns_expected_value_when_import_fails():
     """
@@ -1510,6 +1781,37 @@ def test_import_failure_do_nothing_when_import_go_well():
     assert myfunc() == 2
 
 
+class TestWindowedDataFrame:
+    def test_query_should_sort_search_and_slice_in_the_backend(self) -> None:
+        df = pd.DataFrame({"name": ["Byte", "Bit", "Nibble", "Word"], "size": [8, 1, 4, 16]})
+        wdf = wf.WindowedDataFrame(df)
+        assert state_serialiser.serialise(wdf) == {
+            "type": "windowedDataframe",
+            "id": wdf.id,
+            "version": 1,
+            "rowCount": 4,
+            "columns": ["name", "size", "__index_level_0__"],
+        }
+
+        (rows, row_count) = wdf.query(1, 2, DataframeQuerySort(columnName="size", descending=True))
+        assert row_count == 4
+        assert rows.column("name").to_pylist() == ["Byte", "Nibble"]
+
+        (rows, row_count) = wdf.query(0, 10, DataframeQuerySort(columnName="size"), "^b")
+        assert row_count == 2
+        assert rows.column("name").to_pylist() == ["Bit", "Byte"]
+
+        (rows, row_count) = wdf.query(0, 10, search="1[")
+        assert row_count == 0
+
+    def test_windowed_dataframe_should_be_found_in_the_state(self) -> None:
+        wdf = wf.WindowedDataFrame(pa.table({"a": [1, 2]}))
+        s = WriterState({"nested": {"df": wdf}})
+        cloned_s = s.get_clone()
+        assert find_windowed_dataframe(cloned_s.user_state, wdf.id).pyarrow_table() is wdf.pyarrow_table()
+        assert find_windowed_dataframe(cloned_s.user_state, "unknown") is None
+
+
 class TestCalculatedProperty:
     def test_calculated_property_should_be_triggered_when_dependent_property_is_changing(self):
         # Assign
@@ -1,5 +1,7 @@
+import time
 from typing import List
 
+import pytest
 from writer import core_ui
 from writer.ss_types import ComponentDefinition
 
@@ -16,3 +18,181 @@ def test_filter_components_by_should_retrieve_a_list_of_components_that_fit_the_
 
     # Then
     assert '23bc1387-26ed-4ff2-8565-b027c2960c3c' in components_filtered
+
+
+def test_component_should_cache_its_serialised_form():
+    # Given
+    component = core_ui.Component(id="c1", type="text", content={"text": "Hello"})
+    serialised = component.to_dict()
+
+    # When
+    serialised["type"] = "button"
+
+    # Then
+    assert component.to_dict() == {"id": "c1", "type": "text", "content": {"text": "Hello"}, "isCodeManaged": False, "position": 0}
+    assert component._serialised is not None
+    component.position = 2
+    assert component._serialised is None
+    assert component.to_dict()["position"] == 2
+    assert component == core_ui.Component(id="c1", type="text", content={"text": "Hello"}, position=2)
+
+
+def _build_session_tree(count: int) -> core_ui.ComponentTree:
+    base_tree = core_ui.build_base_component_tree()
+    components = {"root": {"id": "root", "type": "root"}}
+    for i in range(count):
+        parent_id = "root" if i < 10 else f"c{(i - 10) // 10}"
+        components[f"c{i}"] = {"id": f"c{i}", "type": "text", "parentId": parent_id}
+    core_ui.ingest_bmc_component_tree(base_tree, components)
+    return core_ui.build_session_component_tree(base_tree)
+
+
+def test_component_tree_should_keep_its_indexes_up_to_date():
+    # Given
+    tree = _build_session_tree(100)
+    bmc_branch = tree.branch(core_ui.Branch.bmc)
+
+    # When
+    tree.attach(core_ui.Component(id="s1", type="section", parentId="c3"))
+    tree.attach(core_ui.Component(id="s2", type="text", parentId="s1"))
+    # Components of the session branch take precedence
+    tree.attach(core_ui.Component(id="c99", type="button", parentId="s1"))
+
+    # Then
+    assert [c.id for c in tree._get_direct_descendents("c3")] == [f"c{i}" for i in range(40, 50)] + ["s1"]
+    assert [c.id for c in tree.get_descendents("s1")] == ["s2", "c99"]
+    assert "c99" not in [c.id for c in tree._get_direct_descendents("c8")]
+    assert tree.get_parent("c99") == ["s1", "c3", "root"]
+    assert tree.components["c99"].type == "button"
+
+    tree.delete_component("c99")
+    assert tree.components["c99"].type == "text"
+    assert tree.get_parent("c99") == ["c8", "root"]
+
+    tree.clear_children("s1")
+    assert "s2" not in tree.components
+    assert len(tree.components) == 102
+
+    # Branches modified directly are indexed again
+    bmc_branch.attach(core_ui.Component(id="b1", type="text", parentId="s1"))
+    assert [c.id for c in tree.get_descendents("s1")] == ["b1"]
+
+
+def test_export_component_tree_changes_should_send_only_changed_components():
+    # Given
+    tree = _build_session_tree(100)
+    assert len(core_ui.export_component_tree(tree, mode="run")) == 101
+    assert core_ui.export_component_tree_changes(tree, mode="run") is None
+
+    # When
+    tree.attach(core_ui.Component(id="s1", type="section", parentId="c3"))
+    tree.attach(core_ui.Component(id="s2", type="text", parentId="s1"))
+    tree.attach(core_ui.Component(id="n1", type="note", parentId="c3"))
+    tree.attach(core_ui.Component(id="o1", type="text", parentId="missing"))
+
+    # Then
+    components, removed_ids = core_ui.export_component_tree_changes(tree, mode="run")
+    assert list(components) == ["s1", "s2"]
+    assert removed_ids == ["n1", "o1"]
+
+    tree.delete_component("s1")
+    assert core_ui.export_component_tree_changes(tree, mode="run") == ({}, ["s1", "s2"])
+
+    # Components which are ingested again unchanged aren't sent
+    bmc_components = tree.branch(core_ui.Branch.bmc).to_dict()
+    bmc_components["c7"]["content"] = {"text": "Changed"}
+    core_ui.ingest_bmc_component_tree(tree, bmc_components)
+    components, removed_ids = core_ui.export_component_tree_changes(tree, mode="run")
+    assert list(components) == ["c7"]
+    assert removed_ids == []
+
+
+def test_session_component_tree_should_overlay_the_base_component_tree():
+    # Given
+    base_tree = core_ui.build_base_component_tree()
+    core_ui.ingest_bmc_component_tree(base_tree, {
+        "root": {"id": "root", "type": "root"},
+        "c1": {"id": "c1", "type": "text", "parentId": "root"},
+        "c2": {"id": "c2", "type": "text", "parentId": "root"},
+    })
+    session_tree = core_ui.build_session_component_tree(base_tree)
+    session_bmc_branch = session_tree.branch(core_ui.Branch.bmc)
+
+    # When
+    session_tree.delete_component("c1")
+    session_tree.attach(core_ui.Component(id="c3", type="text", parentId="c2"), tree=core_ui.Branch.bmc)
+
+    # Then
+    assert session_bmc_branch.own_ids() == ["c3", "c1"]
+    assert list(session_tree.components) == ["c3", "root", "c2"]
+    assert list(base_tree.components) == ["root", "c1", "c2"]
+
+    # The updates of the base tree show through
+    core_ui.ingest_bmc_component_tree(base_tree, {
+        "root": {"id": "root", "type": "root"},
+        "c1": {"id": "c1", "type": "text", "parentId": "root"},
+        "c2": {"id": "c2", "type": "button", "parentId": "root"},
+    })
+    assert session_tree.components["c2"].type == "button"
+    assert [c.id for c in session_tree.get_descendents("root")] == ["c2", "c3"]
+    assert len(session_tree.components) == 3
+
+
+@pytest.mark.explicit
+def test_benchmark_session_component_tree():
+    """
+    Measures the memory and time used to create 1,000 session component trees
+    overlaying a base component tree of 10,000 components.
+
+    >>> pytest tests/backend/test_core_ui.py -k benchmark_session_component_tree --full-run -s
+    """
+    import tracemalloc
+
+    base_tree = _build_session_tree(10_000).base_tree
+    sessions = 1000
+    tracemalloc.start()
+    start = time.perf_counter()
+    trees = [core_ui.build_session_component_tree(base_tree) for _ in range(sessions)]
+    elapsed = time.perf_counter() - start
+    (size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{size / sessions / 1024:.1f} KiB and {elapsed / sessions * 1e6:.0f} µs per session "
+        f"({len(trees)} sessions)"
+    )
+
+
+@pytest.mark.explicit
+def test_benchmark_component_tree():
+    """
+    Measures the operations run on the component tree on each event, on a tree of 10,000 components.
+
+    >>> pytest tests/backend/test_core_ui.py -k benchmark_component_tree --full-run -s
+    """
+    tree = _build_session_tree(10_000)
+
+    start = time.perf_counter()
+    core_ui.export_component_tree(tree, mode="run")
+    export_elapsed = time.perf_counter() - start
+
+    # The components serialised are cached
+    start = time.perf_counter()
+    core_ui.export_component_tree(tree, mode="run")
+    cached_export_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(1000):
+        tree.get_parent(f"c{9_999 - i}")
+    parent_elapsed = (time.perf_counter() - start) / 1000
+
+    start = time.perf_counter()
+    for i in range(1000):
+        tree.attach(core_ui.Component(id=f"s{i}", type="text", parentId="c10"))
+        len(tree.components)
+    attach_elapsed = (time.perf_counter() - start) / 1000
+
+    print(
+        f"export: {export_elapsed * 1000:.1f} ms, cached: {cached_export_elapsed * 1000:.1f} ms, "
+        f"get_parent: {parent_elapsed * 1e6:.0f} µs, "
+        f"attach and read: {attach_elapsed * 1e6:.0f} µs"
+    )
@@ -1,6 +1,7 @@
 import json
 
 import numpy as np
+import pytest
 import writer as wf
 from writer import audit_and_fix, evaluator, wf_project
 from writer.core import (
@@ -116,6 +117,56 @@ class TestEvaluator:
         assert e.evaluate_expression("features[best_feature]", instance_path) == "green"
         assert e.evaluate_expression("a\.b", instance_path) == 3
 
+    def test_evaluate_field_compiled_template(self) -> None:
+        session.session_state = WriterState(raw_state_dict)
+        session.session_component_tree.attach(
+            Component(id="compiled-text", type="text", content={
+                "text": "Hello @{name} @{features[best_feature]} @{counter}",
+                "json": '{"name": "@{name}", "interests": ["lamps"]}',
+            })
+        )
+        instance_path = [{"componentId": "compiled-text", "instanceNumber": 0}]
+        e = evaluator.Evaluator(session.session_state, session.session_component_tree)
+        evaluator.Evaluator.clear_template_cache()
+
+        assert e.evaluate_field(instance_path, "json", as_json=True) == {"name": "Robert", "interests": ["lamps"]}
+        assert e.evaluate_field(instance_path, "json", as_json=True) == {"name": "Robert", "interests": ["lamps"]}
+        assert evaluator.Evaluator._compile_template.cache_info().hits == 1
+        assert e.evaluate_field(instance_path, "text") == "Hello Robert green 4"
+        assert evaluator.Evaluator._compile_expression("features[best_feature].x") == (
+            (None, "features"), ("best_feature", ""), (None, "x")
+        )
+
+        evaluator.Evaluator.clear_template_cache()
+        assert evaluator.Evaluator._compile_template.cache_info().currsize == 0
+        session.session_component_tree.delete_component("compiled-text")
+
+    @pytest.mark.explicit
+    def test_benchmark_evaluate_field(self) -> None:
+        """
+        Measures the evaluation of a field in a loop, as done by blocks in ForEach loops.
+
+        >>> pytest tests/backend/test_evaluator.py -k benchmark_evaluate_field --full-run -s
+        """
+        import time
+
+        session.session_state = WriterState(raw_state_dict)
+        session.session_component_tree.attach(
+            Component(id="benchmark-text", type="text", content={
+                "text": "Hello @{name}, your @{features[best_feature]} are @{features.eyes} (@{counter})",
+            })
+        )
+        instance_path = [{"componentId": "benchmark-text", "instanceNumber": 0}]
+        e = evaluator.Evaluator(session.session_state, session.session_component_tree)
+
+        iterations = 10_000
+        start = time.perf_counter()
+        for _ in range(iterations):
+            e.evaluate_field(instance_path, "text")
+        elapsed = time.perf_counter() - start
+        print(f"{elapsed / iterations * 1e6:.1f} µs per evaluation")
+        session.session_component_tree.delete_component("benchmark-text")
+
     def test_get_context_data_should_return_the_target_of_event(self) -> None:
         """
         Test that the target of the event is correctly returned by the get_context_data method
@@ -321,3 +321,23 @@ class TestServe:
                 if event_type == "error":
                     assert "msg" in final_payload
                     assert "finished_at" in final_payload
+
+    def test_extract_binary_frames(self):
+        import struct
+
+        frames = []
+        message = {
+            "payload": {
+                "mutations": {"+image": writer.core.BinaryPayload(b"\x89PNG", "image/png"), "+name": "a"}
+            }
+        }
+        extracted = writer.serve._extract_binary_frames(message, frames)
+
+        reference = extracted["payload"]["mutations"]["+image"]
+        assert reference.startswith(writer.serve.BINARY_FRAME_REFERENCE_PREFIX)
+        assert extracted["payload"]["mutations"]["+name"] == "a"
+        assert len(frames) == 1
+        (frame_id, mime_type_length) = struct.unpack(">IH", frames[0][:6])
+        assert reference == f"{writer.serve.BINARY_FRAME_REFERENCE_PREFIX}{frame_id}"
+        assert frames[0][6 : 6 + mime_type_length] == b"image/png"
+        assert frames[0][6 + mime_type_length :] == b"\x89PNG"
@@ -1,5 +1,5 @@
 import contextlib
-from typing import Literal
+from typing import Literal, Optional
 
 import pytest
 from writer.app_runner import AppRunner
@@ -26,7 +26,7 @@ def pytest_addoption(parser):
 @pytest.fixture
 def setup_app_runner():
     @contextlib.contextmanager
-    def _manage_launch_args(app_dir: str, app_command: Literal["run", "edit"], load: bool = False):
+    def _manage_launch_args(app_dir: str, app_command: Literal["run", "edit"], load: bool = False, workers: Optional[int] = None):
         """
         Fixture to instantiate a writer application for testing.
 
@@ -41,8 +41,9 @@ def setup_app_runner():
         :param app_dir: the folder that contains the application
         :param app_command: the execution mode of the application, either edit or run
         :param load: load the application if True
+        :param workers: number of AppProcess workers, defaults to the AppRunner setting
         """
-        ar = AppRunner(app_dir, app_command)
+        ar = AppRunner(app_dir, app_command, workers=workers)
         try:
             if load is True:
                 ar.load()